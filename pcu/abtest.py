@@ -0,0 +1,180 @@
+import math
+import pathlib
+import statistics
+import sys
+import tempfile
+from typing import List, Optional, Tuple
+
+from . import color_utils
+from . import problem
+from . import runner
+from . import testcase_store
+
+
+_PASSING_RESULTS = (
+    runner.TestCaseResult.CORRECT,
+    runner.TestCaseResult.NO_ANSWER_FILE_PROVIDED,
+)
+
+# Two-sided 95% critical values of Student's t distribution, by degrees of
+# freedom; beyond the table the normal approximation is close enough.
+_T_CRITICAL_95 = [
+    12.706, 4.303, 3.182, 2.776, 2.571, 2.447, 2.365, 2.306, 2.262, 2.228,
+    2.201, 2.179, 2.160, 2.145, 2.131, 2.120, 2.110, 2.101, 2.093, 2.086,
+    2.080, 2.074, 2.069, 2.064, 2.060, 2.056, 2.052, 2.048, 2.045, 2.042,
+]
+
+
+def _t_critical_95(df: int) -> float:
+    return _T_CRITICAL_95[df - 1] if df <= len(_T_CRITICAL_95) else 1.96
+
+
+def speedup_interval(log_ratios: List[float],
+) -> Tuple[float, Optional[Tuple[float, float]]]:
+    # log_ratios holds log(time_a / time_b) for paired runs. Returns the
+    # geometric mean speedup of B over A, with a 95% confidence interval if
+    # there are enough pairs to estimate one.
+    mean = statistics.mean(log_ratios)
+    if len(log_ratios) < 2:
+        return math.exp(mean), None
+    margin = (_t_critical_95(len(log_ratios) - 1) *
+              statistics.stdev(log_ratios) / math.sqrt(len(log_ratios)))
+    return math.exp(mean), (math.exp(mean - margin), math.exp(mean + margin))
+
+
+def _format_speedup(speedup: float,
+                    interval: Optional[Tuple[float, float]],
+) -> str:
+    if interval is None:
+        return '{:.3f}x'.format(speedup)
+    significant = interval[0] > 1 or interval[1] < 1
+    return '{:.3f}x [{:.3f}, {:.3f}]{}'.format(
+        speedup, interval[0], interval[1], ' *' if significant else '')
+
+
+# A version's problem, working directory and directory for its outputs
+_Version = Tuple[problem.Problem, pathlib.Path, pathlib.Path]
+
+
+def _describe(prob: problem.Problem) -> str:
+    return '{} ({} environment)'.format(prob.source_file, prob.env.name)
+
+
+def abtest(prob_a: problem.Problem,
+           working_dir_a: pathlib.Path,
+           prob_b: problem.Problem,
+           working_dir_b: pathlib.Path,
+           test_ids: List[str],
+           warmups: int,
+           runs: int,
+           descriptions: Optional[Tuple[str, str]] = None,
+) -> bool:
+    prob_test_ids = set(prob_a.get_test_ids())
+    for test_id in test_ids:
+        if test_id not in prob_test_ids:
+            with color_utils.ColorizeStderrError():
+                print('ERROR: Test case', test_id, 'not found for problem',
+                      prob_a.name,
+                      file=sys.stderr)
+            return False
+
+    with color_utils.ColorizeStderrBar1():
+        print('=' * 20, 'Comparing', prob_a.name, '=' * 20,
+              file=sys.stderr)
+    if descriptions is None:
+        descriptions = (_describe(prob_a), _describe(prob_b))
+    print('A:', descriptions[0],
+          file=sys.stderr)
+    print('B:', descriptions[1],
+          file=sys.stderr)
+    print('Timed runs per test case and version:', runs,
+          '(interleaved; * marks a speedup significant at 95%)',
+          file=sys.stderr)
+    print('{:20} {:>10} {:>10}   {}'.format(
+              'Wall time (s)', 'A median', 'B median',
+              'speedup of B [95% CI]'),
+          file=sys.stderr)
+
+    # The mean log ratio of each test case: the runs of one case aren't
+    # independent samples of the speedup over all of them.
+    case_log_ratios = []  # type: List[float]
+    num_disagreeing = 0
+    with tempfile.TemporaryDirectory() as temp_dir:
+        # Each version's output goes to a directory of its own, leaving the
+        # test cases' saved outputs alone.
+        versions = []  # type: List[_Version]
+        for prob, working_dir, name in [(prob_a, working_dir_a, 'a'),
+                                        (prob_b, working_dir_b, 'b')]:
+            outputs_path = pathlib.Path(temp_dir) / name
+            outputs_path.mkdir()
+            versions.append((prob, working_dir, outputs_path))
+
+        for test_id in test_ids:
+            times = ([], [])  # type: Tuple[List[float], List[float]]
+            results = [set(), set()]  # type: List[set]
+            for i in range(warmups + runs):
+                # Alternate the order (ABBA...), so that drifts in machine
+                # load hit both versions alike.
+                order = (0, 1) if i % 2 == 0 else (1, 0)
+                for version in order:
+                    prob, working_dir, outputs_path = versions[version]
+                    report = runner.run_case(prob, working_dir, test_id,
+                                             outputs_path=outputs_path)
+                    assert report is not None
+                    assert report.exec_result is not None
+                    results[version].add(report.result)
+                    if i >= warmups:
+                        times[version].append(report.exec_result.wall_time)
+
+            log_ratios = [math.log(max(a, 1e-9) / max(b, 1e-9))
+                          for a, b in zip(*times)]
+            case_log_ratios.append(statistics.mean(log_ratios))
+            speedup, interval = speedup_interval(log_ratios)
+            line = '{:20} {:10.3f} {:10.3f}   {}'.format(
+                test_id, statistics.median(times[0]),
+                statistics.median(times[1]),
+                _format_speedup(speedup, interval))
+
+            problems = []  # type: List[str]
+            for version, name in enumerate('AB'):
+                failed = results[version] - set(_PASSING_RESULTS)
+                if failed:
+                    problems.append('{}: {}'.format(name, ', '.join(
+                        runner.humanize(result) for result in failed)))
+            if not problems and not _outputs_agree(prob_a, test_id,
+                                                   versions):
+                problems.append('outputs differ')
+
+            if problems:
+                num_disagreeing += 1
+                with color_utils.ColorizeStderrWarning():
+                    print(line, '  ', '; '.join(problems),
+                          file=sys.stderr)
+            else:
+                print(line,
+                      file=sys.stderr)
+
+    speedup, interval = speedup_interval(case_log_ratios)
+    with color_utils.ColorizeStderrBar2():
+        print('Overall speedup of B over A (across test cases):',
+              _format_speedup(speedup, interval),
+              file=sys.stderr)
+    if num_disagreeing:
+        with color_utils.ColorizeStderrWarning():
+            print('Warning:', num_disagreeing, 'of', len(test_ids),
+                  'test cases failed or had different outputs',
+                  file=sys.stderr)
+    return True
+
+
+def _outputs_agree(prob: problem.Problem,
+                   test_id: str,
+                   versions: List[_Version],
+) -> bool:
+    output_a_path = versions[0][2] / (test_id + testcase_store.OUTPUT)
+    output_b_path = versions[1][2] / (test_id + testcase_store.OUTPUT)
+    if not output_a_path.is_file() or not output_b_path.is_file():
+        return output_a_path.is_file() == output_b_path.is_file()
+    result, _ = runner.check_output(prob.env.format_strictness,
+                                    output_a_path, output_b_path)
+    return result == runner.TestCaseResult.CORRECT
@@ -1,16 +1,35 @@
 import argparse
-import importlib.metadata
+import os
 import pathlib
 import string
 import sys
+from typing import Optional
 
 from . import color_utils
 from . import config
+from . import testcase_store
 
 
 Args = argparse.Namespace
 
 
+class _VersionAction(argparse.Action):
+    # Like action='version', but only looks up the installed version (which
+    # is slow) when it's actually asked for.
+    def __init__(self, option_strings, dest=argparse.SUPPRESS,
+                 default=argparse.SUPPRESS, help=None):  # type: ignore
+        super().__init__(option_strings=option_strings,
+                         dest=dest,
+                         default=default,
+                         nargs=0,
+                         help=help or "show program's version number and exit")
+
+    def __call__(self, parser, namespace, values, option_string=None):  # type: ignore
+        import importlib.metadata
+        parser.exit(message='{} {}\n'.format(
+            parser.prog, importlib.metadata.version('pcu')))
+
+
 def _get_parser() -> argparse.ArgumentParser:
     settings = config.get_settings()
 
@@ -20,8 +39,7 @@ def _get_parser() -> argparse.ArgumentParser:
         epilog='Copyright 2017, Jerry Ma. https://github.com/jma127/pcu')
     parser.add_argument(
         '-v', '--version',
-        action='version',
-        version=f'%(prog)s {importlib.metadata.version("pcu")}')
+        action=_VersionAction)
 
     subparsers = parser.add_subparsers(
         title='command',
@@ -41,6 +59,12 @@ def _get_parser() -> argparse.ArgumentParser:
         help="don't clean problem data (e.g. config, test cases) beforehand",
         dest='clean',
         action='store_false')
+    make.add_argument(
+        '--storage',
+        help='how to store test cases: one file each (the default for new '
+             'problems), or packed into a single database, which scales to '
+             'many thousands of cases. With -C, converts existing test cases',
+        choices=testcase_store.STORAGES)
 
     comp = subparsers.add_parser('comp',
         help='compile problem source file')
@@ -52,6 +76,10 @@ def _get_parser() -> argparse.ArgumentParser:
 
     run = subparsers.add_parser('run', help='run problem against test cases')
 
+    watch = subparsers.add_parser('watch',
+        help='recompile and rerun test cases whenever the source file '
+             'is saved')
+
     getin = subparsers.add_parser('getin',
         help='get test case input')
     getans = subparsers.add_parser('getans',
@@ -91,11 +119,157 @@ def _get_parser() -> argparse.ArgumentParser:
         help='number of tests to generate',
         type=int,
         default=16)
+    testgen.add_argument(
+        '-s', '--seed',
+        help='master seed to derive the per-test seeds from, for '
+             'regenerating the same tests (default: random)',
+        type=int)
+    testgen.add_argument(
+        '-r', '--reference',
+        help='compute the answers with this solution (an executable, or the '
+             'name of a pcu problem) instead of taking them from the '
+             "generator's stderr")
+
+    stress = subparsers.add_parser('stress',
+        help='compare against a reference solution on generated tests until '
+             'a difference is found')
+    stress.add_argument(
+        '-p', '--prefix',
+        help='prefix for the id of the saved failing test case',
+        default='stress')
+    stress.add_argument(
+        '-n', '--numcases',
+        help='stop after this many tests (default: keep going until a '
+             'difference is found)',
+        type=int,
+        default=0)
+    stress.add_argument(
+        '-s', '--seed',
+        help='master seed to derive the per-test seeds from (default: '
+             'random)',
+        type=int)
+
+    shrink = subparsers.add_parser('shrink',
+        help='find a smaller input on which a failing test case still fails '
+             'against a reference solution, and save it as TEST_ID_min')
+
+    bench = subparsers.add_parser('bench',
+        help='time test cases over repeated runs')
+    bench.add_argument(
+        '-w', '--warmups',
+        help='number of untimed runs of each test case (default: 1)',
+        type=int,
+        default=1)
+    bench.add_argument(
+        '-k', '--runs',
+        help='number of timed runs of each test case (default: 10)',
+        type=int,
+        default=10)
+    bench.add_argument(
+        '-m', '--margin',
+        help='flag test cases whose 95th percentile wall time is within this '
+             'many percent of the time limit (default: 10)',
+        type=float,
+        default=10.0)
+
+    abtest = subparsers.add_parser('abtest',
+        help='compare the speed and output of two versions of a solution')
+    abtest.add_argument(
+        '-a', '--source-a',
+        help='source file of version A (default: the problem\'s)')
+    abtest.add_argument(
+        '-b', '--source-b',
+        help='source file of version B (default: the problem\'s)')
+    abtest.add_argument(
+        '-w', '--warmups',
+        help='number of untimed runs of each version per test case '
+             '(default: 1)',
+        type=int,
+        default=1)
+    abtest.add_argument(
+        '-k', '--runs',
+        help='number of timed runs of each version per test case '
+             '(default: 5)',
+        type=int,
+        default=5)
+
+    complexity = subparsers.add_parser('complexity',
+        help='estimate the time complexity of a solution by timing it on '
+             'generated inputs of increasing size')
+    complexity.add_argument(
+        '-n', '--max-size',
+        help="the problem's maximum input size, to predict the running time "
+             'at',
+        type=int,
+        required=True)
+    complexity.add_argument(
+        '-l', '--largest',
+        help='largest size to actually run; smaller sizes halve down from '
+             'it (default: the maximum size)',
+        type=int)
+    complexity.add_argument(
+        '-t', '--steps',
+        help='number of sizes to run (default: 8)',
+        type=int,
+        default=8)
+    complexity.add_argument(
+        '-k', '--runs',
+        help='number of timed runs at each size (default: 3)',
+        type=int,
+        default=3)
+    complexity.add_argument(
+        '-s', '--seed',
+        help='master seed to derive the per-size seeds from (default: '
+             'random)',
+        type=int)
+    complexity.add_argument(
+        '-j', '--jobs',
+        help='number of sizes to run in parallel (default: half the CPU '
+             'cores, so that they don\'t slow each other down)',
+        type=int,
+        default=max(1, (os.cpu_count() or 1) // 2))
+
+    history = subparsers.add_parser('history',
+        help='list recorded runs, and compare two of them for verdict '
+             'changes and slowdowns')
+    history.add_argument(
+        '-t', '--threshold',
+        help='flag test cases that got more than this many percent slower '
+             '(default: 20)',
+        type=float,
+        default=20.0)
+
+    calibrate = subparsers.add_parser('calibrate',
+        help="time a fixed benchmark, and set the speed factor that time "
+             "limits are scaled by from the judge's time for it")
+    calibrate.add_argument(
+        '--judge-msec',
+        help='running time of the benchmark on the judge, in milliseconds',
+        type=float)
+    calibrate.add_argument(
+        '-k', '--runs',
+        help='number of timed runs of the benchmark (default: 5)',
+        type=int,
+        default=5)
+    calibrate.add_argument(
+        '--source',
+        help='just print the benchmark\'s C source, e.g. to submit it to '
+             'the judge',
+        action='store_true')
+
+    daemon = subparsers.add_parser('daemon',
+        help='manage a background pcu server that makes commands start '
+             'faster')
+    daemon.add_argument(
+        'action',
+        help='start, stop or check on the server',
+        choices=['start', 'stop', 'status'])
 
     problem_commands = [
         make,
         comp,
         run,
+        watch,
         getin,
         getans,
         getout,
@@ -108,8 +282,15 @@ def _get_parser() -> argparse.ArgumentParser:
         chgenv,
         envoverride,
         testgen,
+        stress,
+        shrink,
+        bench,
+        abtest,
+        complexity,
+        history,
     ]
     test_id_commands = [
+        shrink,
         getans,
         getin,
         getout,
@@ -119,13 +300,34 @@ def _get_parser() -> argparse.ArgumentParser:
     ]
     test_ids_commands = [
         run,
+        watch,
         delcases,
+        bench,
+        abtest,
+    ]
+    cache_commands = [
+        comp,
+        run,
+        watch,
+        stress,
+        shrink,
+        bench,
+        abtest,
+        complexity,
     ]
     env_commands = [
         (chgenv, True),
         (make, False),
     ]
 
+    for name in ['a', 'b']:
+        abtest.add_argument(
+            '--env-' + name,
+            help='environment of version {} (default: the problem\'s)'.format(
+                name.upper()),
+            metavar='env',
+            choices=settings.get_env_names_and_aliases())
+
     for command in problem_commands:
         command.add_argument('problem',
             help='problem name')
@@ -141,6 +343,29 @@ def _get_parser() -> argparse.ArgumentParser:
                  'run all cases.',
             nargs='*')
 
+    for command in [comp, run]:
+        command.add_argument(
+            '--pgo',
+            help='build with profile-guided optimization, training on all '
+                 'the test cases, and compare the speed with a plain build',
+            action='store_true')
+
+    for command in [comp, run, watch, testgen, stress, shrink]:
+        command.add_argument(
+            '-j', '--jobs',
+            help='number of test cases to run or generate in parallel '
+                 '(default: half the CPU cores, so that they don\'t slow '
+                 'each other down)',
+            type=int,
+            default=max(1, (os.cpu_count() or 1) // 2))
+
+    for command in cache_commands:
+        command.add_argument(
+            '-N', '--no-cache',
+            help="don't reuse (or save) cached compiler output",
+            dest='use_cache',
+            action='store_false')
+
     for command, required in env_commands:
         names = ['env'] if required else ['-e', '--env']
         command.add_argument(*names,
@@ -163,11 +388,56 @@ def _get_parser() -> argparse.ArgumentParser:
         help='executable (.sh, .py, .exe, etc.) that generates test data',
         type=pathlib.Path)
 
+    stress.add_argument(
+        'executable',
+        help='executable (.sh, .py, .exe, etc.) that generates test inputs',
+        type=pathlib.Path)
+    stress.add_argument(
+        'reference',
+        help='solution to compare against: an executable, or the name of a '
+             'pcu problem')
+
+    shrink.add_argument(
+        'reference',
+        help='solution to compare against: an executable, or the name of a '
+             'pcu problem')
+
+    complexity.add_argument(
+        'executable',
+        help='executable (.sh, .py, .exe, etc.) that generates an input of '
+             'the size given as its third argument',
+        type=pathlib.Path)
+
+    history.add_argument(
+        'old_run',
+        help='run to compare from: a run number, or a negative number to '
+             'count back from the latest run (default: -2)',
+        type=int,
+        nargs='?')
+    history.add_argument(
+        'new_run',
+        help='run to compare to (default: -1, the latest run)',
+        type=int,
+        nargs='?')
+
     return parser
 
 
+_cached_parser = None  # type: Optional[argparse.ArgumentParser]
+def get_parser() -> argparse.ArgumentParser:
+    global _cached_parser
+    if _cached_parser is None:
+        _cached_parser = _get_parser()
+    return _cached_parser
+
+
+def reset_parser() -> None:
+    global _cached_parser
+    _cached_parser = None
+
+
 def parse() -> Args:
-    parser = _get_parser()
+    parser = get_parser()
     args = parser.parse_args()
 
     if not args.command:
@@ -0,0 +1,204 @@
+import datetime
+import math
+import pathlib
+import statistics
+import sys
+from typing import Dict, List
+
+from . import color_utils
+from . import compile_cache
+from . import environment
+from . import problem
+from . import runner
+from . import yaml_util
+
+
+_PASSING_RESULTS = (
+    runner.TestCaseResult.CORRECT,
+    runner.TestCaseResult.NO_ANSWER_FILE_PROVIDED,
+)
+
+
+def percentile(sorted_values: List[float], fraction: float) -> float:
+    # Linear interpolation between closest ranks.
+    position = (len(sorted_values) - 1) * fraction
+    lower = math.floor(position)
+    upper = math.ceil(position)
+    return (sorted_values[lower] +
+            (sorted_values[upper] - sorted_values[lower]) * (position - lower))
+
+
+class TimingStats(object):
+    def __init__(self, values: List[float]) -> None:
+        values = sorted(values)
+        self.min = values[0]
+        self.median = statistics.median(values)
+        self.p95 = percentile(values, 0.95)
+        self.max = values[-1]
+        # Relative spread of the runs, as a coefficient of variation.
+        self.spread = (statistics.stdev(values) / statistics.mean(values)
+                       if len(values) > 1 and statistics.mean(values) else 0.0)
+
+    def to_dict(self) -> Dict:
+        return {
+            'min': round(self.min, 6),
+            'median': round(self.median, 6),
+            'p95': round(self.p95, 6),
+            'max': round(self.max, 6),
+            'spread': round(self.spread, 6),
+        }
+
+
+class CaseBench(object):
+    def __init__(self,
+                 result: runner.TestCaseResult,
+                 wall: TimingStats,
+                 cpu: TimingStats,
+                 max_rss: int,
+    ) -> None:
+        self.result = result
+        self.wall = wall
+        self.cpu = cpu
+        self.max_rss = max_rss
+
+    def to_dict(self) -> Dict:
+        return {
+            'result': self.result.name,
+            'wall_time': self.wall.to_dict(),
+            'cpu_time': self.cpu.to_dict(),
+            'max_rss': self.max_rss,
+        }
+
+
+def _bench_case(prob: problem.Problem,
+                working_dir: pathlib.Path,
+                test_id: str,
+                warmups: int,
+                runs: int,
+) -> CaseBench:
+    reports = []  # type: List[runner.CaseReport]
+    for i in range(warmups + runs):
+        report = runner.run_case(prob, working_dir, test_id)
+        assert report is not None and report.exec_result is not None
+        if report.result not in _PASSING_RESULTS:
+            # No point timing a wrong (or timed out) solution further.
+            return CaseBench(report.result,
+                             TimingStats([report.exec_result.wall_time]),
+                             TimingStats([report.exec_result.cpu_time]),
+                             report.exec_result.max_rss)
+        if i >= warmups:
+            reports.append(report)
+
+    return CaseBench(reports[0].result,
+                     TimingStats([r.exec_result.wall_time for r in reports]),
+                     TimingStats([r.exec_result.cpu_time for r in reports]),
+                     max(r.exec_result.max_rss for r in reports))
+
+
+def _limited_p95(prob: problem.Problem, case: CaseBench) -> float:
+    # Of whichever time the time limit applies to.
+    if prob.env.timelimit_mode == environment.TimelimitMode.CPU:
+        return case.cpu.p95
+    return case.wall.p95
+
+
+def bench(prob: problem.Problem,
+          working_dir: pathlib.Path,
+          test_ids: List[str],
+          warmups: int,
+          runs: int,
+          margin_percent: float,
+) -> bool:
+    prob_test_ids = set(prob.get_test_ids())
+    for test_id in test_ids:
+        if test_id not in prob_test_ids:
+            with color_utils.ColorizeStderrError():
+                print('ERROR: Test case', test_id, 'not found for problem',
+                      prob.name,
+                      file=sys.stderr)
+            return False
+
+    with color_utils.ColorizeStderrBar1():
+        print('=' * 20, 'Benchmarking', prob.name, '=' * 20,
+              file=sys.stderr)
+    print('Command:', prob.run_command,
+          file=sys.stderr)
+    print('Warmup runs per test case:', warmups,
+          file=sys.stderr)
+    print('Timed runs per test case:', runs,
+          file=sys.stderr)
+
+    timelimit = runner.timelimit(prob)
+    threshold = timelimit * (1 - margin_percent / 100)
+    print('{:20} {:>8} {:>8} {:>8} {:>8} {:>7}   {:>8}'.format(
+              'Wall time (s)', 'min', 'median', 'p95', 'max', 'spread',
+              'cpu p95'),
+          file=sys.stderr)
+
+    cases = {}  # type: Dict[str, CaseBench]
+    num_flagged = 0
+    for test_id in test_ids:
+        case = _bench_case(prob, working_dir, test_id, warmups, runs)
+        cases[test_id] = case
+
+        line = '{:20} {:8.3f} {:8.3f} {:8.3f} {:8.3f} {:6.1f}%   {:8.3f}'
+        line = line.format(test_id, case.wall.min, case.wall.median,
+                           case.wall.p95, case.wall.max,
+                           case.wall.spread * 100, case.cpu.p95)
+        if case.result not in _PASSING_RESULTS:
+            num_flagged += 1
+            with color_utils.ColorizeStderr(
+                    *case.result.get_colorize_colors()):
+                print(line, ' ', runner.humanize(case.result),
+                      file=sys.stderr)
+        elif _limited_p95(prob, case) >= threshold:
+            num_flagged += 1
+            with color_utils.ColorizeStderrWarning():
+                print(line, '  within {:g}% of the time limit'.format(
+                          margin_percent),
+                      file=sys.stderr)
+        else:
+            print(line,
+                  file=sys.stderr)
+
+    results_path = _save_results(prob, cases, warmups, runs)
+    print('Saved results to', results_path,
+          file=sys.stderr)
+
+    if num_flagged:
+        with color_utils.ColorizeStderrWarning():
+            print(num_flagged, 'of', len(test_ids), 'test cases failed or',
+                  'came within {:g}% of the {:.3f} s time limit'.format(
+                      margin_percent, timelimit),
+                  file=sys.stderr)
+    else:
+        with color_utils.ColorizeStderrGood():
+            print('All test cases passed with at least {:g}% to spare'.format(
+                      margin_percent),
+                  file=sys.stderr)
+    return True
+
+
+def _save_results(prob: problem.Problem,
+                  cases: Dict[str, CaseBench],
+                  warmups: int,
+                  runs: int,
+) -> pathlib.Path:
+    now = datetime.datetime.now(datetime.timezone.utc).astimezone()
+    results = {
+        'datetime': now.isoformat(timespec='seconds'),
+        'source_sha256': compile_cache.file_hash(
+            pathlib.Path.cwd() / prob.source_file),
+        'env_name': prob.env.name,
+        'run_timelimit_msec': prob.env.run_timelimit_msec,
+        'warmups': warmups,
+        'runs': runs,
+        'cases': {test_id: case.to_dict() for test_id, case in cases.items()},
+    }
+
+    prob.bench_path.mkdir(parents=True, exist_ok=True)
+    results_path = prob.bench_path / '{}.yaml'.format(
+        now.strftime('%Y%m%d-%H%M%S'))
+    with open(results_path, 'w') as outfile:
+        yaml_util.write_dict(results, outfile)
+    return results_path
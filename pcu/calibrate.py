@@ -0,0 +1,149 @@
+import pathlib
+import re
+import shlex
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+from typing import List, Optional
+
+from . import color_utils
+from . import config
+from . import defaults
+from . import execution
+from . import paths
+
+
+_BENCHMARK_SOURCE = 'calibrate/pcu_calibrate.c'
+_COMPILERS = ('gcc', 'cc', 'clang')
+_COMPILE_TIMEOUT_SEC = 60.0
+
+_SPEED_FACTOR_RE = re.compile(r'^speed_factor\s*:.*$', re.MULTILINE)
+
+
+def benchmark_source() -> bytes:
+    return defaults.load_static(_BENCHMARK_SOURCE)
+
+
+def _compile_benchmark(temp_path: pathlib.Path) -> Optional[pathlib.Path]:
+    compiler = next((name for name in _COMPILERS if shutil.which(name)),
+                    None)
+    if compiler is None:
+        with color_utils.ColorizeStderrError():
+            print('ERROR: no C compiler found (tried',
+                  ', '.join(_COMPILERS) + ')',
+                  file=sys.stderr)
+        return None
+
+    source_path = temp_path / 'pcu_calibrate.c'
+    with open(source_path, 'wb') as outfile:
+        outfile.write(benchmark_source())
+    executable_path = temp_path / 'pcu_calibrate'
+    exec_result = execution.run_process(
+        ' '.join(shlex.quote(arg) for arg in [
+            compiler, '-O2', '-o', str(executable_path), str(source_path),
+            '-lm']),
+        cwd=temp_path,
+        stdin=subprocess.DEVNULL,
+        stdout=None,
+        stderr=None,
+        timeout=_COMPILE_TIMEOUT_SEC)
+    if exec_result.timed_out or exec_result.returncode != 0:
+        with color_utils.ColorizeStderrError():
+            print('ERROR: failed to compile the benchmark with', compiler,
+                  file=sys.stderr)
+        return None
+    return executable_path
+
+
+def measure(runs: int) -> Optional[float]:
+    # Median CPU time of the benchmark, in seconds: CPU time rather than
+    # wall time, so that other load on the machine matters less.
+    with tempfile.TemporaryDirectory() as temp_dir:
+        temp_path = pathlib.Path(temp_dir)
+        executable_path = _compile_benchmark(temp_path)
+        if executable_path is None:
+            return None
+
+        cpu_times = []  # type: List[float]
+        for i in range(runs):
+            exec_result = execution.run_process(
+                shlex.quote(str(executable_path)),
+                cwd=temp_path,
+                stdin=subprocess.DEVNULL,
+                stdout=subprocess.DEVNULL,
+                stderr=None)
+            if exec_result.returncode != 0:
+                with color_utils.ColorizeStderrError():
+                    print('ERROR: the benchmark failed with exit code',
+                          exec_result.returncode,
+                          file=sys.stderr)
+                return None
+            print('Run {}/{}: {:.3f} s cpu, {:.3f} s wall'.format(
+                      i + 1, runs, exec_result.cpu_time,
+                      exec_result.wall_time),
+                  file=sys.stderr)
+            cpu_times.append(exec_result.cpu_time)
+        return statistics.median(cpu_times)
+
+
+def write_speed_factor(speed_factor: float) -> None:
+    # Edits just the one line, so that the rest of the user's settings file
+    # (comments included) stays as it was.
+    settings_path = paths.settings_path()
+    data = ''
+    if settings_path.is_file():
+        with open(settings_path, 'r') as infile:
+            data = infile.read()
+
+    line = 'speed_factor: {:.3f}'.format(speed_factor)
+    if _SPEED_FACTOR_RE.search(data):
+        data = _SPEED_FACTOR_RE.sub(line, data, count=1)
+    else:
+        if data and not data.endswith('\n'):
+            data += '\n'
+        data += line + '\n'
+    with open(settings_path, 'w') as outfile:
+        outfile.write(data)
+
+
+def calibrate(judge_msec: Optional[float], runs: int) -> bool:
+    with color_utils.ColorizeStderrBar1():
+        print('=' * 20, 'Calibrating', '=' * 20,
+              file=sys.stderr)
+    local_sec = measure(runs)
+    if local_sec is None:
+        return False
+    print('Benchmark: {:.0f} ms cpu here (median of {} runs)'.format(
+              local_sec * 1000, runs),
+          file=sys.stderr)
+
+    if judge_msec is None:
+        print('Current speed factor:', config.get_settings().speed_factor,
+              file=sys.stderr)
+        print('To calibrate against a judge, submit the benchmark there',
+              '(see "pcu calibrate --source") and pass its running time',
+              'with --judge-msec',
+              file=sys.stderr)
+        return True
+
+    if judge_msec <= 0:
+        with color_utils.ColorizeStderrError():
+            print('ERROR: --judge-msec must be positive',
+                  file=sys.stderr)
+        return False
+    speed_factor = local_sec * 1000 / judge_msec
+    write_speed_factor(speed_factor)
+    with color_utils.ColorizeStderrGood():
+        print('Speed factor: {:.3f} (this machine is {:.2f}x {} than the '
+              'judge) -- saved to'.format(
+                  speed_factor,
+                  max(speed_factor, 1 / speed_factor),
+                  'slower' if speed_factor >= 1 else 'faster'),
+              paths.settings_path(),
+              file=sys.stderr)
+    print('Time limits are now multiplied by the speed factor when running',
+          'test cases',
+          file=sys.stderr)
+    return True
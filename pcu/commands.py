@@ -1,18 +1,37 @@
+import importlib
 import pathlib
 import shutil
 import sys
 import tempfile
-from typing import Callable, Dict
+import threading
+import time
+from typing import Callable, Dict, List
 
 from . import arg_parser
 from . import color_utils
-from . import compiler
 from . import config
+from . import daemon
 from . import defaults
 from . import paths
 from . import problem
-from . import runner
-from . import testgen
+from . import testcase_store
+
+
+_WATCH_SETTLE_SEC = 0.1
+
+# Imported by the commands that use them, so that cheap commands don't load
+# all of them.
+_FEATURE_MODULES = [
+    'abtest', 'bench', 'calibrate', 'compiler', 'complexity', 'history',
+    'pgo', 'runner', 'shrink', 'solution', 'stress', 'testgen', 'watcher',
+]
+
+
+def preload() -> None:
+    # For the daemon, whose forked workers then start with every feature
+    # module loaded.
+    for name in _FEATURE_MODULES:
+        importlib.import_module('.' + name, __package__)
 
 
 CommandFn = Callable[[arg_parser.Args], bool]
@@ -36,7 +55,8 @@ def _make(args: arg_parser.Args) -> bool:
 
     with problem.Problem(args.problem,
                          settings.get_env(args.env),
-                         args.clean) as prob:
+                         args.clean,
+                         storage=args.storage) as prob:
         env = prob.env
 
         if args.create_source:
@@ -76,6 +96,9 @@ def _make(args: arg_parser.Args) -> bool:
 
 @register_command
 def _comp(args: arg_parser.Args) -> bool:
+    from . import compiler
+    from . import pgo
+
     settings = config.get_settings()
 
     with problem.Problem(args.problem) as prob:
@@ -91,28 +114,92 @@ def _comp(args: arg_parser.Args) -> bool:
                         shutil.rmtree(working_dir)
                 working_dir.mkdir()
 
-            return compiler.compile(prob, working_dir)
+            if args.pgo:
+                return pgo.build(prob, working_dir, args.jobs,
+                                 use_cache=args.use_cache)
+            return compiler.compile(prob, working_dir,
+                                    use_cache=args.use_cache)
 
 
 @register_command
 def _run(args: arg_parser.Args) -> bool:
+    from . import compiler
+    from . import history
+    from . import pgo
+    from . import runner
+
     with problem.Problem(args.problem) as prob:
         with tempfile.TemporaryDirectory() as temp_dir:
             working_dir = pathlib.Path(temp_dir)
 
-            if not compiler.compile(prob, working_dir):
+            if args.pgo:
+                if not pgo.build(prob, working_dir, args.jobs,
+                                 use_cache=args.use_cache):
+                    return False
+            elif not compiler.compile(prob, working_dir,
+                                      use_cache=args.use_cache):
                 return False
 
             test_ids = args.test_ids or prob.get_test_ids()
-            return runner.run_cases(prob, working_dir, test_ids)
+            report = runner.run_cases(prob, working_dir, test_ids, args.jobs)
+            if report is None:
+                return False
+            history.record_run(prob, report)
+            return True
+
+
+@register_command
+def _watch(args: arg_parser.Args) -> bool:
+    from . import compiler
+    from . import history
+    from . import runner
+    from . import watcher
+
+    with problem.Problem(args.problem) as prob:
+        source_path = pathlib.Path.cwd() / prob.source_file
+        changed = threading.Event()
+        watcher.FileWatcher(source_path).watch_in_background(changed)
+
+        failed_test_ids = []  # type: List[str]
+        try:
+            while True:
+                changed.clear()
+                with tempfile.TemporaryDirectory() as temp_dir:
+                    working_dir = pathlib.Path(temp_dir)
+                    # A save while compiling or running kills the compiler
+                    # or the program, and starts over with the new source.
+                    if (compiler.compile(prob, working_dir,
+                                         use_cache=args.use_cache,
+                                         cancel=changed) and
+                            not changed.is_set()):
+                        test_ids = args.test_ids or prob.get_test_ids()
+                        report = runner.run_cases(
+                            prob, working_dir, test_ids, args.jobs,
+                            cancel=changed,
+                            priority_test_ids=set(failed_test_ids))
+                        if report is not None and not report.cancelled:
+                            failed_test_ids = report.get_failed_test_ids()
+                            history.record_run(prob, report)
+
+                if not changed.is_set():
+                    with color_utils.ColorizeStderrGood():
+                        print('Watching', source_path, 'for changes',
+                              '(Ctrl-C to quit)',
+                              file=sys.stderr)
+                    changed.wait()
+                # Let a burst of writes from a single save settle.
+                time.sleep(_WATCH_SETTLE_SEC)
+
+        except KeyboardInterrupt:
+            return True
 
 
 @register_command
 def _getin(args: arg_parser.Args) -> bool:
     with problem.Problem(args.problem) as prob:
-        path = prob.get_test_input_path(args.test_id)
-        if path.is_file():
-            with open(path, 'rb') as infile:
+        if prob.store.exists(args.test_id, testcase_store.INPUT):
+            with prob.store.open(args.test_id,
+                                 testcase_store.INPUT) as infile:
                 shutil.copyfileobj(infile, sys.stdout.buffer)
             return True
         else:
@@ -126,9 +213,9 @@ def _getin(args: arg_parser.Args) -> bool:
 @register_command
 def _getans(args: arg_parser.Args) -> bool:
     with problem.Problem(args.problem) as prob:
-        path = prob.get_test_answer_path(args.test_id)
-        if path.is_file():
-            with open(path, 'rb') as infile:
+        if prob.store.exists(args.test_id, testcase_store.ANSWER):
+            with prob.store.open(args.test_id,
+                                 testcase_store.ANSWER) as infile:
                 shutil.copyfileobj(infile, sys.stdout.buffer)
             return True
         else:
@@ -142,9 +229,9 @@ def _getans(args: arg_parser.Args) -> bool:
 @register_command
 def _getout(args: arg_parser.Args) -> bool:
     with problem.Problem(args.problem) as prob:
-        path = prob.get_test_output_path(args.test_id)
-        if path.is_file():
-            with open(path, 'rb') as infile:
+        if prob.store.exists(args.test_id, testcase_store.OUTPUT):
+            with prob.store.open(args.test_id,
+                                 testcase_store.OUTPUT) as infile:
                 shutil.copyfileobj(infile, sys.stdout.buffer)
             return True
         else:
@@ -158,9 +245,9 @@ def _getout(args: arg_parser.Args) -> bool:
 @register_command
 def _geterr(args: arg_parser.Args) -> bool:
     with problem.Problem(args.problem) as prob:
-        path = prob.get_test_error_path(args.test_id)
-        if path.is_file():
-            with open(path, 'rb') as infile:
+        if prob.store.exists(args.test_id, testcase_store.ERROR):
+            with prob.store.open(args.test_id,
+                                 testcase_store.ERROR) as infile:
                 shutil.copyfileobj(infile, sys.stdout.buffer)
             return True
         else:
@@ -174,8 +261,8 @@ def _geterr(args: arg_parser.Args) -> bool:
 @register_command
 def _setin(args: arg_parser.Args) -> bool:
     with problem.Problem(args.problem) as prob:
-        path = prob.get_test_input_path(args.test_id)
-        with open(path, 'wb') as outfile:
+        with prob.store.open(args.test_id, testcase_store.INPUT,
+                             'wb') as outfile:
             if sys.stdin.isatty():
                 print('Enter the input for test case', args.test_id, 'below,',
                       'terminated by Ctrl-D',
@@ -193,8 +280,8 @@ def _setin(args: arg_parser.Args) -> bool:
 @register_command
 def _setans(args: arg_parser.Args) -> bool:
     with problem.Problem(args.problem) as prob:
-        path = prob.get_test_answer_path(args.test_id)
-        with open(path, 'wb') as outfile:
+        with prob.store.open(args.test_id, testcase_store.ANSWER,
+                             'wb') as outfile:
             if sys.stdin.isatty():
                 print('Enter the answer for test case', args.test_id, 'below,',
                       'terminated by Ctrl-D',
@@ -223,16 +310,8 @@ def _delcases(args: arg_parser.Args) -> bool:
                     return False
 
         for test_id in test_ids:
-            paths = [
-                prob.get_test_input_path(test_id),
-                prob.get_test_answer_path(test_id),
-                prob.get_test_output_path(test_id),
-                prob.get_test_error_path(test_id),
-            ]
-            for path in paths:
-                if path.exists():
-                    assert path.is_file()
-                    path.unlink()
+            for suffix in testcase_store.SUFFIXES:
+                prob.store.delete(test_id, suffix)
 
     with color_utils.ColorizeStderrGood():
         print('Deleted', len(test_ids), 'test cases for',
@@ -259,6 +338,50 @@ def _delprobs(args: arg_parser.Args) -> bool:
     return True
 
 
+@register_command
+def _daemon(args: arg_parser.Args) -> bool:
+    if args.action == 'start':
+        if not daemon.start():
+            with color_utils.ColorizeStderrError():
+                print('ERROR: pcu daemon failed to start',
+                      file=sys.stderr)
+            return False
+        with color_utils.ColorizeStderrGood():
+            print('pcu daemon is running',
+                  file=sys.stderr)
+
+    elif args.action == 'stop':
+        if daemon.stop():
+            with color_utils.ColorizeStderrGood():
+                print('Stopped pcu daemon',
+                      file=sys.stderr)
+        else:
+            print('pcu daemon is not running',
+                  file=sys.stderr)
+
+    else:
+        status = daemon.status()
+        if status is None:
+            print('pcu daemon is not running',
+                  file=sys.stderr)
+        else:
+            print('pcu daemon is running with pid', status['pid'],
+                  '(up for {:.0f} seconds)'.format(status['uptime_sec']),
+                  file=sys.stderr)
+
+    return True
+
+
+@register_command
+def _calibrate(args: arg_parser.Args) -> bool:
+    from . import calibrate
+
+    if args.source:
+        sys.stdout.buffer.write(calibrate.benchmark_source())
+        return True
+    return calibrate.calibrate(args.judge_msec, args.runs)
+
+
 @register_command
 def _info(args: arg_parser.Args) -> bool:
     with problem.Problem(args.problem) as prob:
@@ -313,6 +436,167 @@ def _envoverride(args: arg_parser.Args) -> bool:
 
 @register_command
 def _testgen(args: arg_parser.Args) -> bool:
+    from . import solution
+    from . import testgen
+
+    with problem.Problem(args.problem) as prob:
+        if args.reference is None:
+            return testgen.generate_tests(
+                prob, args.executable, args.prefix, args.numcases, args.jobs,
+                args.seed)
+
+        with solution.open_solution(args.reference, args.jobs) as reference:
+            if reference is None:
+                return False
+            return testgen.generate_tests(
+                prob, args.executable, args.prefix, args.numcases, args.jobs,
+                args.seed, reference)
+
+
+@register_command
+def _stress(args: arg_parser.Args) -> bool:
+    from . import solution
+    from . import stress
+    from . import testgen
+
+    if not testgen.check_executable(args.executable):
+        return False
+
+    with problem.Problem(args.problem) as prob, \
+            solution.open_solution(args.reference, args.jobs,
+                                   args.use_cache) as reference:
+        if reference is None:
+            return False
+        with solution.compiled_problem(prob, args.jobs,
+                                       args.use_cache) as candidate:
+            if candidate is None:
+                return False
+            return stress.stress(prob, candidate, reference,
+                                 args.executable, args.prefix, args.jobs,
+                                 args.seed, args.numcases)
+
+
+@register_command
+def _shrink(args: arg_parser.Args) -> bool:
+    from . import shrink
+    from . import solution
+
+    with problem.Problem(args.problem) as prob, \
+            solution.open_solution(args.reference, args.jobs,
+                                   args.use_cache) as reference:
+        if reference is None:
+            return False
+        if args.test_id not in prob.get_test_ids():
+            with color_utils.ColorizeStderrError():
+                print('ERROR: Test case', args.test_id, 'not found for problem',
+                      prob.name,
+                      file=sys.stderr)
+            return False
+        with solution.compiled_problem(prob, args.jobs,
+                                       args.use_cache) as candidate:
+            if candidate is None:
+                return False
+            return shrink.shrink(prob, candidate, reference, args.test_id,
+                                 args.jobs)
+
+
+@register_command
+def _bench(args: arg_parser.Args) -> bool:
+    from . import bench
+    from . import compiler
+
+    if args.runs < 1 or args.warmups < 0:
+        with color_utils.ColorizeStderrError():
+            print('ERROR: need at least one timed run and no negative warmups',
+                  file=sys.stderr)
+        return False
+
+    with problem.Problem(args.problem) as prob:
+        with tempfile.TemporaryDirectory() as temp_dir:
+            working_dir = pathlib.Path(temp_dir)
+
+            if not compiler.compile(prob, working_dir,
+                                    use_cache=args.use_cache):
+                return False
+
+            test_ids = args.test_ids or prob.get_test_ids()
+            return bench.bench(prob, working_dir, test_ids, args.warmups,
+                               args.runs, args.margin)
+
+
+@register_command
+def _abtest(args: arg_parser.Args) -> bool:
+    from . import abtest
+    from . import compiler
+
+    settings = config.get_settings()
+
+    if args.runs < 1 or args.warmups < 0:
+        with color_utils.ColorizeStderrError():
+            print('ERROR: need at least one timed run and no negative warmups',
+                  file=sys.stderr)
+        return False
+    if (args.source_a == args.source_b and args.env_a == args.env_b):
+        with color_utils.ColorizeStderrError():
+            print('ERROR: versions A and B are the same -- give a different '
+                  'source file or environment for at least one of them',
+                  file=sys.stderr)
+        return False
+
+    with problem.Problem(args.problem) as prob:
+        variants = []
+        for source_file, env_name in [(args.source_a, args.env_a),
+                                      (args.source_b, args.env_b)]:
+            env = settings.get_env(env_name) if env_name else None
+            variants.append(prob.variant(env, source_file))
+
+        with tempfile.TemporaryDirectory() as temp_dir:
+            working_dirs = []
+            for name, variant in zip('ab', variants):
+                working_dir = pathlib.Path(temp_dir) / name
+                working_dir.mkdir()
+                if not compiler.compile(variant, working_dir,
+                                        use_cache=args.use_cache):
+                    return False
+                working_dirs.append(working_dir)
+
+            test_ids = args.test_ids or prob.get_test_ids()
+            return abtest.abtest(variants[0], working_dirs[0],
+                                 variants[1], working_dirs[1],
+                                 test_ids, args.warmups, args.runs)
+
+
+@register_command
+def _complexity(args: arg_parser.Args) -> bool:
+    from . import complexity
+    from . import solution
+    from . import testgen
+
+    if args.max_size < 1 or args.steps < 3 or args.runs < 1:
+        with color_utils.ColorizeStderrError():
+            print('ERROR: need a positive maximum size, at least 3 steps and',
+                  'at least one run per step',
+                  file=sys.stderr)
+        return False
+    if not testgen.check_executable(args.executable):
+        return False
+
+    with problem.Problem(args.problem) as prob:
+        with solution.compiled_problem(prob, args.jobs,
+                                       args.use_cache) as candidate:
+            if candidate is None:
+                return False
+            return complexity.estimate(prob, candidate, args.executable,
+                                       args.max_size,
+                                       args.largest or args.max_size,
+                                       args.steps, args.runs, args.jobs,
+                                       args.seed)
+
+
+@register_command
+def _history(args: arg_parser.Args) -> bool:
+    from . import history
+
     with problem.Problem(args.problem) as prob:
-        return testgen.generate_tests(
-            prob, args.executable, args.prefix, args.numcases)
+        return history.history(prob, args.old_run, args.new_run,
+                               args.threshold)
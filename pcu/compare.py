@@ -0,0 +1,293 @@
+import collections
+import itertools
+import pathlib
+import re
+from typing import IO, Iterator, List, Optional, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    import difflib
+
+
+_CHUNK_SIZE = 1 << 20
+
+# Upper bound on how far windowed_diff grows its window, relative to the
+# number of lines it has to produce.
+_MAX_WINDOW_FACTOR = 16
+
+# bytes.split() whitespace, i.e. what Python considers ASCII whitespace.
+_WHITESPACE = b' \t\n\r\x0b\x0c'
+_TOKEN_RE = re.compile(rb'\S+')
+# Maps whitespace to b' ' and everything else to b'x', so that token starts
+# can be counted with bytes.count rather than a Python-level loop.
+_TOKEN_MAP = bytes(ord(' ') if bytes([i]) in _WHITESPACE else ord('x')
+                   for i in range(256))
+
+
+class Mismatch(object):
+    def __init__(self,
+                 byte_offset: int,
+                 line: int,
+                 token: int,
+    ) -> None:
+        # Position of the first difference in the expected output. Offsets
+        # count a '\r\n' line ending as one byte; token is the 1-based index
+        # of the token containing (or following) the difference.
+        self.byte_offset = byte_offset
+        self.line = line
+        self.token = token
+
+
+class Comparison(object):
+    def __init__(self,
+                 match_exact: bool,
+                 match_minus_whitespace: bool,
+                 exact_mismatch: Optional[Mismatch] = None,
+                 whitespace_mismatch: Optional[Mismatch] = None,
+    ) -> None:
+        self.match_exact = match_exact
+        self.match_minus_whitespace = match_minus_whitespace
+        self.exact_mismatch = exact_mismatch
+        self.whitespace_mismatch = whitespace_mismatch
+
+
+def _read_chunks(path: pathlib.Path) -> Iterator[bytes]:
+    # Mirrors universal newlines in text mode: '\r\n' and '\r' become '\n'.
+    carry = b''
+    with open(path, 'rb') as infile:
+        while True:
+            chunk = infile.read(_CHUNK_SIZE)
+            if not chunk:
+                break
+            chunk = carry + chunk
+            carry = b''
+            if chunk.endswith(b'\r'):
+                chunk, carry = chunk[:-1], b'\r'
+            if b'\r' in chunk:
+                chunk = chunk.replace(b'\r\n', b'\n').replace(b'\r', b'\n')
+            if chunk:
+                yield chunk
+    if carry:
+        yield b'\n'
+
+
+def _read_stripped_chunks(path: pathlib.Path) -> Iterator[bytes]:
+    for chunk in _read_chunks(path):
+        chunk = chunk.translate(None, _WHITESPACE)
+        if chunk:
+            yield chunk
+
+
+def _first_difference(chunks_a: Iterator[bytes],
+                      chunks_b: Iterator[bytes],
+) -> Optional[int]:
+    # Only ever holds one chunk from each side, whatever the input sizes.
+    offset = 0
+    buf_a = b''
+    buf_b = b''
+    while True:
+        if not buf_a:
+            buf_a = next(chunks_a, b'')
+        if not buf_b:
+            buf_b = next(chunks_b, b'')
+        if not buf_a and not buf_b:
+            return None
+        if not buf_a or not buf_b:
+            return offset
+
+        n = min(len(buf_a), len(buf_b))
+        if buf_a[:n] != buf_b[:n]:
+            i = 0
+            while buf_a[i] == buf_b[i]:
+                i += 1
+            return offset + i
+
+        offset += n
+        buf_a = buf_a[n:]
+        buf_b = buf_b[n:]
+
+
+def _count_token_starts(chunk: bytes, in_token: bool) -> int:
+    shape = chunk.translate(_TOKEN_MAP)
+    count = shape.count(b' x')
+    if shape[:1] == b'x' and not in_token:
+        count += 1
+    return count
+
+
+def _locate(path: pathlib.Path,
+            target: int,
+            skip_whitespace: bool,
+) -> Mismatch:
+    # target counts every byte, or only non-whitespace bytes if
+    # skip_whitespace is set.
+    byte_offset = 0
+    line = 1
+    tokens = 0
+    in_token = False
+    consumed = 0
+
+    for chunk in _read_chunks(path):
+        size = (len(chunk.translate(None, _WHITESPACE))
+                if skip_whitespace else len(chunk))
+        if consumed + size <= target:
+            consumed += size
+            byte_offset += len(chunk)
+            line += chunk.count(b'\n')
+            tokens += _count_token_starts(chunk, in_token)
+            in_token = not chunk[-1:].isspace()
+            continue
+
+        remaining = target - consumed
+        if skip_whitespace:
+            index = len(chunk)
+            for match in _TOKEN_RE.finditer(chunk):
+                length = match.end() - match.start()
+                if remaining < length:
+                    index = match.start() + remaining
+                    break
+                remaining -= length
+        else:
+            index = remaining
+
+        head = chunk[:index + 1]
+        tokens += _count_token_starts(head, in_token)
+        if chunk[index:index + 1].isspace():
+            tokens += 1
+        return Mismatch(byte_offset + index,
+                        line + chunk[:index].count(b'\n'),
+                        tokens)
+
+    # The difference is past the end of the file (it's a prefix of the
+    # other one).
+    return Mismatch(byte_offset, line, tokens + 1)
+
+
+def compare_files(expected_path: pathlib.Path,
+                  actual_path: pathlib.Path,
+) -> Comparison:
+    exact_offset = _first_difference(_read_chunks(expected_path),
+                                     _read_chunks(actual_path))
+    if exact_offset is None:
+        return Comparison(True, True)
+    exact_mismatch = _locate(expected_path, exact_offset, False)
+
+    stripped_offset = _first_difference(_read_stripped_chunks(expected_path),
+                                        _read_stripped_chunks(actual_path))
+    if stripped_offset is None:
+        return Comparison(False, True, exact_mismatch)
+    return Comparison(False, False, exact_mismatch,
+                      _locate(expected_path, stripped_offset, True))
+
+
+class WindowedDiff(object):
+    def __init__(self,
+                 lines: List[str],
+                 further_differences: int,
+    ) -> None:
+        self.lines = lines
+        # Number of line positions past the window at which the files differ.
+        # Not a diff: a line inserted or deleted before them makes every
+        # later position differ, which is why it's cheap to count.
+        self.further_differences = further_differences
+
+
+def _format_range(start: int, stop: int) -> str:
+    # Same as difflib's unified range format.
+    beginning = start + 1
+    length = stop - start
+    if length == 1:
+        return '{}'.format(beginning)
+    if not length:
+        beginning -= 1
+    return '{},{}'.format(beginning, length)
+
+
+def _skip_lines(infile: IO, num_lines: int) -> None:
+    collections.deque(itertools.islice(infile, num_lines), maxlen=0)
+
+
+def _format_hunks(matcher: 'difflib.SequenceMatcher',
+                  start: int,
+                  context_lines: int,
+                  include_open: bool,
+) -> List[str]:
+    expected, actual = matcher.a, matcher.b
+    lines = []  # type: List[str]
+    for group in matcher.get_grouped_opcodes(context_lines):
+        first, last = group[0], group[-1]
+        # A hunk running into the end of the window may change once more
+        # lines are read.
+        if not include_open and (last[2] == len(expected) or
+                                 last[4] == len(actual)):
+            break
+
+        lines.append('@@ -{} +{} @@\n'.format(
+            _format_range(start + first[1], start + last[2]),
+            _format_range(start + first[3], start + last[4])))
+        for tag, i1, i2, j1, j2 in group:
+            if tag == 'equal':
+                lines.extend(' ' + line for line in expected[i1:i2])
+                continue
+            if tag in ('replace', 'delete'):
+                lines.extend('-' + line for line in expected[i1:i2])
+            if tag in ('replace', 'insert'):
+                lines.extend('+' + line for line in actual[j1:j2])
+    return lines
+
+
+def windowed_diff(expected_path: pathlib.Path,
+                  actual_path: pathlib.Path,
+                  max_lines: int,
+                  context_lines: int = 1,
+                  fromfile: str = 'expected output',
+                  tofile: str = 'actual output',
+) -> WindowedDiff:
+    # Diffing whole files is quadratic in the worst case, so find the first
+    # differing line cheaply and only diff a window of lines from there,
+    # growing it until it yields the max_lines lines that will be shown.
+    import difflib
+
+    offset = _first_difference(_read_chunks(expected_path),
+                               _read_chunks(actual_path))
+    if offset is None:
+        return WindowedDiff([], 0)
+    first_line = _locate(expected_path, offset, False).line
+    start = max(0, first_line - 1 - context_lines)
+
+    header = [
+        '--- {}\n'.format(fromfile),
+        '+++ {}\n'.format(tofile),
+    ]
+    expected = []  # type: List[str]
+    actual = []  # type: List[str]
+    # Start with some slack: matching is global, so lines past the ones
+    # shown can still sway how the shown ones get aligned.
+    window = (max_lines + context_lines + 1) * 4
+    max_window = window * _MAX_WINDOW_FACTOR
+
+    with open(expected_path, 'r', errors='replace') as expected_file, \
+            open(actual_path, 'r', errors='replace') as actual_file:
+        _skip_lines(expected_file, start)
+        _skip_lines(actual_file, start)
+
+        while True:
+            expected.extend(itertools.islice(expected_file,
+                                             window - len(expected)))
+            actual.extend(itertools.islice(actual_file,
+                                           window - len(actual)))
+            final = ((len(expected) < window and len(actual) < window) or
+                     window >= max_window)
+
+            matcher = difflib.SequenceMatcher(None, expected, actual)
+            lines = header + _format_hunks(matcher, start, context_lines,
+                                           include_open=final)
+            if final or len(lines) >= max_lines:
+                break
+            window *= 4
+
+        further_differences = sum(
+            1 for expected_line, actual_line
+            in itertools.zip_longest(expected_file, actual_file)
+            if expected_line != actual_line)
+
+    return WindowedDiff(lines, further_differences)
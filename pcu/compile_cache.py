@@ -0,0 +1,116 @@
+import contextlib
+import hashlib
+import os
+import pathlib
+import shlex
+import shutil
+import uuid
+from typing import List, Tuple
+
+from . import config
+from . import paths
+from . import problem
+
+
+def compiler_identity(compile_command: str) -> str:
+    # Fingerprint the compiler binary rather than asking it for its version:
+    # `javac -version` alone can take longer than a cache hit saves.
+    try:
+        program = shlex.split(compile_command)[0]
+    except (ValueError, IndexError):
+        return ''
+
+    program_path = shutil.which(program)
+    if program_path is None:
+        return program
+
+    resolved_path = pathlib.Path(program_path).resolve()
+    stat = resolved_path.stat()
+    return '{}:{}:{}'.format(resolved_path, stat.st_size, stat.st_mtime_ns)
+
+
+def file_hash(path: pathlib.Path) -> str:
+    hasher = hashlib.sha256()
+    with open(path, 'rb') as infile:
+        for chunk in iter(lambda: infile.read(1 << 16), b''):
+            hasher.update(chunk)
+    return hasher.hexdigest()
+
+
+def cache_key(prob: problem.Problem, source_path: pathlib.Path) -> str:
+    hasher = hashlib.sha256()
+    hasher.update(file_hash(source_path).encode())
+    for part in (prob.compile_command,
+                 compiler_identity(prob.compile_command)):
+        hasher.update(b'\0')
+        hasher.update(part.encode())
+    return hasher.hexdigest()
+
+
+def _entry_path(key: str) -> pathlib.Path:
+    return paths.compile_cache_path() / key
+
+
+def restore(key: str, working_dir: pathlib.Path) -> bool:
+    entry_path = _entry_path(key)
+    if not entry_path.is_dir():
+        return False
+
+    try:
+        shutil.copytree(entry_path, working_dir,
+                        symlinks=True,
+                        dirs_exist_ok=True)
+        os.utime(entry_path)  # mark as recently used
+    except OSError:
+        # e.g. evicted by a concurrent pcu process halfway through
+        return False
+    return True
+
+
+def store(key: str, working_dir: pathlib.Path) -> None:
+    cache_path = paths.compile_cache_path()
+    cache_path.mkdir(parents=True, exist_ok=True)
+
+    # Populate a scratch entry and rename it into place, so concurrent
+    # readers never see a partial entry.
+    temp_path = cache_path / '.tmp-{}'.format(uuid.uuid4().hex)
+    try:
+        shutil.copytree(working_dir, temp_path, symlinks=True)
+        try:
+            os.rename(temp_path, _entry_path(key))
+        except OSError:
+            pass  # somebody else stored the same entry first
+    finally:
+        if temp_path.exists():
+            shutil.rmtree(temp_path, ignore_errors=True)
+
+    _evict(config.get_settings().compile_cache_mb * 1024 * 1024)
+
+
+def _dir_size(path: pathlib.Path) -> int:
+    size = 0
+    for dirpath, _, filenames in os.walk(path):
+        for filename in filenames:
+            with contextlib.suppress(OSError):
+                size += os.lstat(os.path.join(dirpath, filename)).st_size
+    return size
+
+
+def _evict(max_size: int) -> None:
+    entries = []  # type: List[Tuple[float, int, pathlib.Path]]
+    for entry_path in paths.compile_cache_path().iterdir():
+        if entry_path.name.startswith('.') or not entry_path.is_dir():
+            continue
+        with contextlib.suppress(OSError):
+            entries.append((entry_path.stat().st_mtime,
+                            _dir_size(entry_path),
+                            entry_path))
+
+    # Least recently used first
+    entries.sort()
+    total_size = sum(size for _, size, _ in entries)
+    for _, size, entry_path in entries:
+        if total_size <= max_size:
+            break
+        shutil.rmtree(entry_path, ignore_errors=True)
+        total_size -= size
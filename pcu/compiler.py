@@ -1,15 +1,23 @@
+import os
 import pathlib
 import shutil
 import subprocess
 import sys
+import threading
+from typing import Optional
 
 from . import color_utils
+from . import compile_cache
+from . import execution
+from . import pch
 from . import problem
 
 
 def compile(prob: problem.Problem,
             working_dir: pathlib.Path,
             copy_source:bool = True,
+            use_cache: bool = True,
+            cancel: Optional[threading.Event] = None,
 ) -> bool:
     assert(working_dir.is_dir())
 
@@ -36,30 +44,74 @@ def compile(prob: problem.Problem,
     print('Command:', prob.compile_command,
           file=sys.stderr)
 
-    try:
-        # typeshed currently says cwd can't be path-like (must be str/bytes)
-        sp_result = subprocess.run(prob.compile_command,  # type: ignore
-            cwd=working_dir,
-            stdin=subprocess.DEVNULL,
-            stdout=None,
-            stderr=None,
-            timeout=prob.env.compile_timelimit_msec * 0.001,
-            shell=True)
-
-    except subprocess.TimeoutExpired:
+    cache_key = None
+    if use_cache:
+        cache_key = compile_cache.cache_key(prob, source_path)
+        if compile_cache.restore(cache_key, working_dir):
+            with color_utils.ColorizeStderrGood():
+                print('Source is unchanged -- reused cached compile output',
+                      file=sys.stderr)
+            return True
+
+    compile_command = prob.compile_command
+    if prob.env.precompiled_header:
+        header_path = pch.prepare(prob, source_path)
+        if header_path is not None:
+            compile_command = pch.command_with_header(prob, header_path)
+            print('Using precompiled header', header_path,
+                  file=sys.stderr)
+
+    exec_result = execution.run_process(compile_command,
+        cwd=working_dir,
+        stdin=subprocess.DEVNULL,
+        stdout=None,
+        stderr=None,
+        timeout=prob.env.compile_timelimit_msec * 0.001,
+        cancel=cancel)
+
+    if exec_result.cancelled:
+        with color_utils.ColorizeStderrWarning():
+            print('Compile cancelled.',
+                  file=sys.stderr)
+        return False
+
+    if exec_result.timed_out:
         with color_utils.ColorizeStderrError():
             print('ERROR: Compile timelimit ({} msec) exceeded'.format(
                       prob.env.compile_timelimit_msec),
                   file=sys.stderr)
         return False
 
-    if sp_result.returncode != 0:
+    if exec_result.returncode != 0:
         with color_utils.ColorizeStderrError():
-            print('ERROR: Compile failed with exit code', sp_result.returncode,
+            print('ERROR: Compile failed with exit code',
+                  exec_result.returncode,
                   file=sys.stderr)
         return False
 
+    if cache_key is not None:
+        compile_cache.store(cache_key, working_dir)
+
     with color_utils.ColorizeStderrGood():
         print('Compile was successful!',
               file=sys.stderr)
     return True
+
+
+def clone_working_dir(working_dir: pathlib.Path,
+                      clone_dir: pathlib.Path,
+) -> None:
+    # Hardlink where possible -- compiled binaries can be large, and the
+    # clones are only ever read from (or have files replaced wholesale).
+    def link_or_copy(src: str, dst: str) -> None:
+        try:
+            os.link(src, dst)
+        except OSError:
+            shutil.copy2(src, dst)
+
+    # The .pcu_* scratch files of runs are rewritten in place, so those are
+    # left out.
+    shutil.copytree(working_dir, clone_dir,
+                    symlinks=True,
+                    ignore=shutil.ignore_patterns('.pcu_*'),
+                    copy_function=link_or_copy)
@@ -0,0 +1,292 @@
+import concurrent.futures
+import math
+import pathlib
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+from typing import Callable, List, Optional, Tuple
+
+from . import color_utils
+from . import execution
+from . import problem
+from . import runner
+from . import solution
+from . import testgen
+
+
+# (name, f) pairs: the time at size n is fitted as a + b * f(n).
+_CLASSES = [
+    ('O(1)', None),
+    ('O(log n)', lambda n: math.log2(n)),
+    ('O(sqrt n)', lambda n: math.sqrt(n)),
+    ('O(n)', lambda n: n),
+    ('O(n log n)', lambda n: n * math.log2(n)),
+    ('O(n sqrt n)', lambda n: n * math.sqrt(n)),
+    ('O(n^2)', lambda n: n ** 2),
+    ('O(n^2 log n)', lambda n: n ** 2 * math.log2(n)),
+    ('O(n^3)', lambda n: n ** 3),
+]  # type: List[Tuple[str, Optional[Callable[[float], float]]]]
+
+# Fits weigh each size by 1 / time^2 (i.e. they minimize relative error), so
+# that the largest sizes don't drown out the rest. Timings are clamped to
+# this before weighing, so that near-zero ones don't dominate instead.
+_MIN_FIT_TIME_SEC = 1e-3
+
+
+class Fit(object):
+    def __init__(self,
+                 name: str,
+                 f: Optional[Callable[[float], float]],
+                 constant: float,
+                 coefficient: float,
+                 rss: float,
+                 num_params: int,
+    ) -> None:
+        self.name = name
+        self.f = f
+        self.constant = constant
+        self.coefficient = coefficient
+        self.rss = rss  # weighted residual sum of squares
+        self.num_params = num_params
+        self.weight = 0.0  # Akaike weight among all the fits
+
+    def predict(self, size: int) -> float:
+        if self.f is None:
+            return self.constant
+        return self.constant + self.coefficient * self.f(size)
+
+    def relative_error(self, num_points: int) -> float:
+        return math.sqrt(self.rss / num_points)
+
+
+def _fit_class(name: str,
+               f: Optional[Callable[[float], float]],
+               sizes: List[int],
+               times: List[float],
+) -> Fit:
+    weights = [1 / max(t, _MIN_FIT_TIME_SEC) ** 2 for t in times]
+
+    def rss(a: float, b: float) -> float:
+        return sum(w * (t - a - b * (f(n) if f else 0)) ** 2
+                   for n, t, w in zip(sizes, times, weights))
+
+    s = sum(weights)
+    st = sum(w * t for w, t in zip(weights, times))
+    constant_fit = Fit(name, f, st / s, 0.0, rss(st / s, 0.0), 1)
+    if f is None:
+        return constant_fit
+
+    fs = [f(n) for n in sizes]
+    sf = sum(w * x for w, x in zip(weights, fs))
+    sff = sum(w * x * x for w, x in zip(weights, fs))
+    sft = sum(w * x * t for w, x, t in zip(weights, fs, times))
+    det = s * sff - sf * sf
+    if det <= 0:
+        return constant_fit
+
+    a = (sff * st - sf * sft) / det
+    b = (s * sft - sf * st) / det
+    if b <= 0:
+        # Not growing at all: as good as a constant, and no better.
+        return Fit(name, f, constant_fit.constant, 0.0, constant_fit.rss, 2)
+    if a < 0:
+        # Negative startup time isn't meaningful; go through the origin.
+        a, b = 0.0, sft / sff
+    return Fit(name, f, a, b, rss(a, b), 2)
+
+
+def fit_classes(sizes: List[int], times: List[float]) -> List[Fit]:
+    # Best fit first. Classes are compared by AIC (weighted residuals, with
+    # a penalty per parameter), which also gives each class a weight: its
+    # relative likelihood of being the best model among those tried.
+    fits = [_fit_class(name, f, sizes, times) for name, f in _CLASSES]
+    num_points = len(sizes)
+    aics = [num_points * math.log(max(fit.rss / num_points, 1e-12)) +
+            2 * fit.num_params for fit in fits]
+    best_aic = min(aics)
+    likelihoods = [math.exp((best_aic - aic) / 2) for aic in aics]
+    for fit, likelihood in zip(fits, likelihoods):
+        fit.weight = likelihood / sum(likelihoods)
+    return sorted(fits, key=lambda fit: fit.weight, reverse=True)
+
+
+def step_sizes(largest: int, num_steps: int) -> List[int]:
+    # Halving down from the largest size, so that each step is a doubling.
+    return sorted(set(max(1, largest >> i) for i in range(num_steps)))
+
+
+class _SizeResult(object):
+    def __init__(self,
+                 size: int,
+                 exec_results: List[execution.ExecResult],
+                 error: Optional[str] = None,
+    ) -> None:
+        self.size = size
+        self.exec_results = exec_results
+        self.error = error
+
+    def median_cpu_time(self) -> float:
+        return statistics.median(r.cpu_time for r in self.exec_results)
+
+    def median_wall_time(self) -> float:
+        return statistics.median(r.wall_time for r in self.exec_results)
+
+    def max_rss(self) -> int:
+        return max(r.max_rss for r in self.exec_results)
+
+
+def _time_size(candidate: solution.Solution,
+               executable_path: pathlib.Path,
+               master_seed: int,
+               seq_num: int,
+               size: int,
+               runs: int,
+               give_up: Callable[[int], bool],
+) -> Optional[_SizeResult]:
+    if give_up(size):
+        return None
+    with tempfile.TemporaryDirectory() as temp_dir:
+        input_path = pathlib.Path(temp_dir) / 'input'
+        output_path = pathlib.Path(temp_dir) / 'output'
+        with open(input_path, 'wb') as input_file:
+            if not testgen.run_generator(
+                    seq_num, testgen.case_seed(master_seed, seq_num),
+                    executable_path, input_file, subprocess.DEVNULL,
+                    size=size):
+                return _SizeResult(size, [], 'generator failed')
+
+        exec_results = []  # type: List[execution.ExecResult]
+        for _ in range(runs):
+            if give_up(size):
+                return None
+            exec_result = candidate.run(input_path, output_path)
+            if exec_result.timed_out:
+                return _SizeResult(size, [exec_result], runner.humanize(
+                    runner.TestCaseResult.TIME_LIMIT_EXCEEDED))
+            if exec_result.returncode != 0:
+                return _SizeResult(size, [exec_result], runner.humanize(
+                    runner.TestCaseResult.RUNTIME_ERROR))
+            exec_results.append(exec_result)
+        return _SizeResult(size, exec_results)
+
+
+def estimate(prob: problem.Problem,
+             candidate: solution.Solution,
+             executable_path: pathlib.Path,
+             max_size: int,
+             largest: int,
+             num_steps: int,
+             runs: int,
+             jobs: int = 1,
+             master_seed: Optional[int] = None,
+) -> bool:
+    if master_seed is None:
+        master_seed = testgen.random_master_seed()
+    sizes = step_sizes(largest, num_steps)
+
+    with color_utils.ColorizeStderrBar1():
+        print('=' * 20, 'Estimating the complexity of', prob.name, '=' * 20,
+              file=sys.stderr)
+    print('Sizes:', ', '.join(str(size) for size in sizes),
+          file=sys.stderr)
+    print('Using master seed', master_seed, 'and', jobs, 'parallel jobs',
+          file=sys.stderr)
+
+    # Once a size fails (e.g. times out), larger ones are only slower.
+    lock = threading.Lock()
+    smallest_failed = None  # type: Optional[int]
+
+    def give_up(size: int) -> bool:
+        with lock:
+            return smallest_failed is not None and size > smallest_failed
+
+    def time_size(seq_num: int, size: int) -> Optional[_SizeResult]:
+        nonlocal smallest_failed
+        result = _time_size(candidate, executable_path, master_seed,
+                            seq_num, size, runs, give_up)
+        if result is not None and result.error is not None:
+            with lock:
+                if smallest_failed is None or size < smallest_failed:
+                    smallest_failed = size
+        return result
+
+    print('{:>12} {:>10} {:>10} {:>10}'.format(
+              'Size', 'cpu (s)', 'wall (s)', 'memory'),
+          file=sys.stderr)
+    measured = []  # type: List[_SizeResult]
+    pool = concurrent.futures.ThreadPoolExecutor(max_workers=jobs)
+    try:
+        futures = [pool.submit(time_size, i, size)
+                   for i, size in enumerate(sizes)]
+        for future in futures:
+            result = future.result()
+            if result is None:
+                continue
+            if result.error is not None:
+                with color_utils.ColorizeStderrWarning():
+                    print('{:12} {}'.format(result.size, result.error),
+                          file=sys.stderr)
+                continue
+            measured.append(result)
+            print('{:12} {:10.3f} {:10.3f} {:>10}'.format(
+                      result.size, result.median_cpu_time(),
+                      result.median_wall_time(),
+                      '{:.1f} MB'.format(result.max_rss() / (1024 * 1024))),
+                  file=sys.stderr)
+    finally:
+        pool.shutdown(wait=True, cancel_futures=True)
+
+    if len(measured) < 3:
+        with color_utils.ColorizeStderrError():
+            print('ERROR: need timings for at least 3 sizes to fit, but only',
+                  'got', len(measured),
+                  file=sys.stderr)
+        return False
+
+    measured_sizes = [result.size for result in measured]
+    fits = fit_classes(measured_sizes,
+                       [result.median_cpu_time() for result in measured])
+    _print_fits(prob, fits, len(measured), max_size)
+    return True
+
+
+def _print_fits(prob: problem.Problem,
+                fits: List[Fit],
+                num_points: int,
+                max_size: int,
+) -> None:
+    timelimit = runner.timelimit(prob)
+    with color_utils.ColorizeStderrBar2():
+        print('-' * 16, 'Fits to the median CPU time', '-' * 16,
+              file=sys.stderr)
+    print('{:14} {:>10} {:>10}   {}'.format(
+              'Class', 'rel. error', 'weight',
+              'predicted at n={}'.format(max_size)),
+          file=sys.stderr)
+    for fit in fits:
+        print('{:14} {:9.1f}% {:9.1f}%   {:.3f} s'.format(
+                  fit.name, fit.relative_error(num_points) * 100,
+                  fit.weight * 100, fit.predict(max_size)),
+              file=sys.stderr)
+
+    best = fits[0]
+    formula = '{:.3g} s'.format(best.constant)
+    if best.f is not None:
+        formula += ' + {:.3g} s * f(n)'.format(best.coefficient)
+    print('Best fit: {} ({:.0f}% weight), about {}'.format(
+              best.name, best.weight * 100, formula),
+          file=sys.stderr)
+    predicted = best.predict(max_size)
+    if predicted > timelimit:
+        color_cls = color_utils.ColorizeStderrError
+    elif predicted > timelimit / 2:
+        color_cls = color_utils.ColorizeStderrWarning
+    else:
+        color_cls = color_utils.ColorizeStderrGood
+    with color_cls():
+        print('Predicted time at n={}: {:.3f} s ({:.0f}% of the {:.3f} s '
+              'time limit)'.format(max_size, predicted,
+                                   predicted / timelimit * 100, timelimit),
+              file=sys.stderr)
@@ -1,10 +1,13 @@
 import getpass
-from typing import Dict, List
+import hashlib
+import os
+from typing import Dict, List, Optional
 
 from . import defaults
 from . import environment
 from . import yaml_util
 from . import paths
+from . import snapshot
 
 
 class Settings(object):
@@ -14,6 +17,11 @@ class Settings(object):
                  datetime_format: str,
                  max_lines_output: int,
                  max_lines_error: int,
+                 compile_cache_mb: int,
+                 speed_factor: float,
+                 helper_timelimit_msec: int,
+                 helper_memlimit_mb: int,
+                 helper_output_limit_mb: int,
                  envs: List[environment.Environment],
     ) -> None:
         self.user = user
@@ -21,6 +29,12 @@ class Settings(object):
         self.datetime_format = datetime_format
         self.max_lines_output = max_lines_output
         self.max_lines_error = max_lines_error
+        self.compile_cache_mb = compile_cache_mb
+        self.speed_factor = speed_factor
+        # For generators and reference executables; 0 means unlimited
+        self.helper_timelimit_msec = helper_timelimit_msec
+        self.helper_memlimit_mb = helper_memlimit_mb
+        self.helper_output_limit_mb = helper_output_limit_mb
         self.envs = envs
 
         self._envs_dict = {}  # type: Dict[str, environment.Environment]
@@ -55,6 +69,11 @@ class Settings(object):
             datetime_format=str(d['datetime_format']),
             max_lines_output=int(d['max_lines_output']),
             max_lines_error=int(d['max_lines_error']),
+            compile_cache_mb=int(d['compile_cache_mb']),
+            speed_factor=float(d['speed_factor']),
+            helper_timelimit_msec=int(d['helper_timelimit_msec']),
+            helper_memlimit_mb=int(d['helper_memlimit_mb']),
+            helper_output_limit_mb=int(d['helper_output_limit_mb']),
             envs=envs,
         )
         return settings
@@ -77,6 +96,21 @@ def _update_dict(d: Dict, u: Dict) -> Dict:
     return d
 
 
+def _snapshot_key(default_data: str,
+                  settings_data: str,
+                  settings_mtime: int,
+) -> str:
+    hasher = hashlib.sha256()
+    # The modules defining the pickled classes are part of the key, so that
+    # upgrading pcu doesn't unpickle stale objects.
+    module_mtimes = [os.stat(module_file).st_mtime_ns
+                     for module_file in (__file__, environment.__file__)]
+    for part in [default_data, settings_data, settings_mtime] + module_mtimes:
+        hasher.update(str(part).encode())
+        hasher.update(b'\0')
+    return hasher.hexdigest()
+
+
 def _load_settings() -> Settings:
     default_data = defaults.default_settings_data()
     settings_path = paths.settings_path()
@@ -87,8 +121,16 @@ def _load_settings() -> Settings:
 
     with open(settings_path, 'r') as infile:
         settings_data = infile.read()
+        settings_mtime = os.fstat(infile.fileno()).st_mtime_ns
 
-    return Settings.from_yaml(default_data, settings_data)
+    # Parsing YAML and building every environment dominates the startup time
+    # of cheap commands, so keep the result around until either file changes.
+    key = _snapshot_key(default_data, settings_data, settings_mtime)
+    settings = snapshot.load(paths.settings_snapshot_path(), key, Settings)
+    if settings is None:
+        settings = Settings.from_yaml(default_data, settings_data)
+        snapshot.store(paths.settings_snapshot_path(), key, settings)
+    return settings
 
 
 _cached_settings = None  # type: Settings
@@ -97,3 +139,9 @@ def get_settings() -> Settings:
     if not _cached_settings:
         _cached_settings = _load_settings()
     return _cached_settings
+
+
+def reload_settings() -> Settings:
+    global _cached_settings
+    _cached_settings = None
+    return get_settings()
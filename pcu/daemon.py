@@ -0,0 +1,338 @@
+import json
+import os
+import pathlib
+import selectors
+import signal
+import socket
+import subprocess
+import sys
+import time
+from typing import Dict, List, Optional
+
+# Keep imports light: forward() runs on every pcu invocation, before (and
+# hopefully instead of) importing the rest of pcu.
+
+
+_MAX_MESSAGE_SIZE = 1 << 20
+_START_TIMEOUT_SEC = 10.0
+# How long a client gets to send its whole request. Requests are read on
+# the daemon's only thread, so one that stalls holds up everyone else.
+_REQUEST_TIMEOUT_SEC = 2.0
+
+
+def _socket_path() -> pathlib.Path:
+    # Mirrors paths.base_path(), which we don't want to import here.
+    return pathlib.Path.home() / '.pcu' / '.daemon.sock'
+
+
+def _connect() -> Optional[socket.socket]:
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(str(_socket_path()))
+    except OSError:
+        sock.close()
+        return None
+    return sock
+
+
+def _read_line(sock_file) -> Optional[List[str]]:  # type: ignore
+    line = sock_file.readline()
+    if not line:
+        return None
+    return line.decode().split()
+
+
+def forward(argv: List[str]) -> Optional[int]:
+    # Returns the command's exit code if a daemon ran it, or None if the
+    # command should run in this process.
+    if os.environ.get('PCU_NO_DAEMON') or argv[:1] == ['daemon']:
+        return None
+    if not _socket_path().exists():
+        return None
+    sock = _connect()
+    if sock is None:
+        return None
+
+    with sock:
+        request = json.dumps({
+            'argv': argv,
+            'cwd': os.getcwd(),
+            'environ': dict(os.environ),
+        }).encode()
+        # Hand over our stdin/stdout/stderr, so the daemon's worker reads and
+        # writes them directly (terminal included).
+        socket.send_fds(sock, [request], [0, 1, 2])
+        sock.shutdown(socket.SHUT_WR)
+
+        sock_file = sock.makefile('rb')
+        child_pid = None
+        while True:
+            try:
+                message = _read_line(sock_file)
+            except KeyboardInterrupt:
+                if child_pid is not None:
+                    os.kill(child_pid, signal.SIGINT)
+                continue
+
+            if message is None:
+                # The daemon went away mid-command
+                return 1
+            if message[0] == 'pid':
+                child_pid = int(message[1])
+            elif message[0] == 'exit':
+                return int(message[1])
+
+
+def _send_control(command: str) -> Optional[Dict]:
+    sock = _connect()
+    if sock is None:
+        return None
+    with sock:
+        sock.sendall(json.dumps({'control': command}).encode())
+        sock.shutdown(socket.SHUT_WR)
+        data = sock.makefile('rb').read()
+    return json.loads(data.decode()) if data else None
+
+
+def status() -> Optional[Dict]:
+    return _send_control('status')
+
+
+def stop() -> bool:
+    return _send_control('stop') is not None
+
+
+def start() -> bool:
+    if status() is not None:
+        return True
+
+    subprocess.Popen([sys.executable, '-m', 'pcu.daemon'],
+        stdin=subprocess.DEVNULL,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+        start_new_session=True)
+
+    deadline = time.monotonic() + _START_TIMEOUT_SEC
+    while time.monotonic() < deadline:
+        if status() is not None:
+            return True
+        time.sleep(0.05)
+    return False
+
+
+class _Server(object):
+    def __init__(self) -> None:
+        self._start_time = time.time()
+        self._children = {}  # type: Dict[int, socket.socket]
+        self._settings_mtime = None  # type: Optional[int]
+        self._running = True
+
+        # Warm up: everything a command needs is imported and parsed once
+        # here, then inherited by every forked worker.
+        from . import commands
+        from . import main
+        main.prepare()
+        commands.preload()
+        self._settings_mtime = self._get_settings_mtime()
+
+        socket_path = _socket_path()
+        if socket_path.exists():
+            socket_path.unlink()  # stale; start() checked nobody answers
+        self._listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._listener.bind(str(socket_path))
+        self._listener.listen()
+
+        # SIGCHLD wakes up the selector, so finished workers are reaped and
+        # reported without any extra threads (we fork, so we stay
+        # single-threaded).
+        self._wakeup_read, self._wakeup_write = socket.socketpair()
+        self._wakeup_read.setblocking(False)
+        self._wakeup_write.setblocking(False)
+        signal.set_wakeup_fd(self._wakeup_write.fileno())
+        signal.signal(signal.SIGCHLD, lambda signum, frame: None)
+
+        self._selector = selectors.DefaultSelector()
+        self._selector.register(self._listener, selectors.EVENT_READ)
+        self._selector.register(self._wakeup_read, selectors.EVENT_READ)
+
+    def _get_settings_mtime(self) -> Optional[int]:
+        from . import paths
+        try:
+            return paths.settings_path().stat().st_mtime_ns
+        except OSError:
+            return None
+
+    def _refresh_settings(self) -> None:
+        from . import arg_parser
+        from . import config
+
+        settings_mtime = self._get_settings_mtime()
+        if settings_mtime != self._settings_mtime:
+            config.reload_settings()
+            arg_parser.reset_parser()
+            self._settings_mtime = settings_mtime
+
+    def serve(self) -> None:
+        try:
+            while self._running:
+                for key, _ in self._selector.select():
+                    if key.fileobj is self._listener:
+                        conn, _ = self._listener.accept()
+                        self._handle(conn)
+                    else:
+                        while True:
+                            try:
+                                if not self._wakeup_read.recv(4096):
+                                    break
+                            except BlockingIOError:
+                                break
+                        self._reap()
+        finally:
+            self._listener.close()
+            try:
+                _socket_path().unlink()
+            except OSError:
+                pass
+
+    def _reap(self) -> None:
+        while self._children:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                return
+            if pid == 0:
+                return
+            conn = self._children.pop(pid, None)
+            if conn is None:
+                continue
+            returncode = os.waitstatus_to_exitcode(status)
+            if returncode < 0:
+                returncode = 128 - returncode  # killed by a signal
+            try:
+                conn.sendall('exit {}\n'.format(returncode).encode())
+            except OSError:
+                pass
+            conn.close()
+
+    def _handle(self, conn: socket.socket) -> None:
+        data = b''
+        fds = []  # type: List[int]
+        deadline = time.monotonic() + _REQUEST_TIMEOUT_SEC
+        try:
+            while True:
+                conn.settimeout(max(0.0, deadline - time.monotonic()))
+                chunk, chunk_fds, _, _ = socket.recv_fds(
+                    conn, _MAX_MESSAGE_SIZE, 3)
+                fds.extend(chunk_fds)
+                if not chunk:
+                    break
+                data += chunk
+        except OSError:  # including timeouts
+            for fd in fds:
+                os.close(fd)
+            conn.close()
+            return
+        conn.settimeout(None)
+
+        try:
+            request = json.loads(data.decode())
+        except ValueError:
+            request = {}
+
+        if 'control' in request:
+            for fd in fds:
+                os.close(fd)
+            self._handle_control(conn, request['control'])
+            return
+        if len(fds) != 3 or 'argv' not in request:
+            for fd in fds:
+                os.close(fd)
+            conn.close()
+            return
+
+        self._refresh_settings()
+        pid = os.fork()
+        if pid == 0:
+            self._run_child(conn, fds, request)  # never returns
+
+        for fd in fds:
+            os.close(fd)
+        self._children[pid] = conn
+        try:
+            conn.sendall('pid {}\n'.format(pid).encode())
+        except OSError:
+            pass
+
+    def _handle_control(self, conn: socket.socket, command: str) -> None:
+        reply = {
+            'pid': os.getpid(),
+            'uptime_sec': time.time() - self._start_time,
+        }
+        if command == 'stop':
+            self._running = False
+        try:
+            conn.sendall(json.dumps(reply).encode())
+        except OSError:
+            pass
+        conn.close()
+
+    def _run_child(self,
+                   conn: socket.socket,
+                   fds: List[int],
+                   request: Dict,
+    ) -> None:
+        returncode = 1
+        try:
+            signal.set_wakeup_fd(-1)
+            signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+            self._selector.close()
+            self._listener.close()
+            self._wakeup_read.close()
+            self._wakeup_write.close()
+            conn.close()
+            for other_conn in self._children.values():
+                other_conn.close()
+
+            for target_fd, fd in enumerate(fds):
+                os.dup2(fd, target_fd)
+                os.close(fd)
+            sys.stdin = open(0, 'r', closefd=False)
+            sys.stdout = open(1, 'w', closefd=False)
+            sys.stderr = open(2, 'w', buffering=1, closefd=False)
+
+            os.environ.clear()
+            os.environ.update(request.get('environ', {}))
+            os.chdir(request['cwd'])
+            sys.argv = ['pcu'] + request['argv']
+
+            from . import main
+            main.run()
+            returncode = 0
+
+        except SystemExit as e:
+            if e.code is None:
+                returncode = 0
+            elif isinstance(e.code, int):
+                returncode = e.code
+            else:
+                print(e.code, file=sys.stderr)
+                returncode = 1
+
+        except BaseException:
+            import traceback
+            traceback.print_exc()
+
+        finally:
+            try:
+                sys.stdout.flush()
+                sys.stderr.flush()
+            finally:
+                os._exit(returncode)
+
+
+def serve() -> None:
+    _Server().serve()
+
+
+if __name__ == '__main__':
+    serve()
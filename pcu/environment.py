@@ -1,5 +1,5 @@
 import enum
-from typing import Dict, Iterable
+from typing import Any, Dict, Iterable
 
 
 class FormatStrictness(enum.Enum):
@@ -7,6 +7,24 @@ class FormatStrictness(enum.Enum):
     STRICT = enum.auto()
 
 
+class TimelimitMode(enum.Enum):
+    WALL = enum.auto()
+    CPU = enum.auto()
+
+
+class RunMode(enum.Enum):
+    PROCESS = enum.auto()  # a fresh run_command for each test case
+    JVM = enum.auto()  # main() of a Java program in a resident JVM
+    FORKSERVER = enum.auto()  # a Python script forked off a warm interpreter
+
+
+def _parse_bool(value: Any) -> bool:
+    # Overrides from "pcu envoverride" arrive as strings.
+    if isinstance(value, str):
+        return value.lower() in ('true', 'yes', 'on', '1')
+    return bool(value)
+
+
 class Environment(object):
     def __init__(self,
                  name: str,
@@ -18,7 +36,14 @@ class Environment(object):
                  output_file: str,
                  compile_timelimit_msec: int,
                  run_timelimit_msec: int,
+                 run_memlimit_mb: int,
+                 output_limit_mb: int,
                  format_strictness: FormatStrictness,
+                 timelimit_mode: TimelimitMode,
+                 run_mode: RunMode,
+                 precompiled_header: bool,
+                 pgo_instrument_flags: str,
+                 pgo_use_flags: str,
                  aliases: Iterable[str],
     ) -> None:
         self.name = name
@@ -34,7 +59,15 @@ class Environment(object):
 
         self.compile_timelimit_msec = compile_timelimit_msec
         self.run_timelimit_msec = run_timelimit_msec
+        self.run_memlimit_mb = run_memlimit_mb  # 0 means unlimited
+        self.output_limit_mb = output_limit_mb  # 0 means unlimited
         self.format_strictness = format_strictness
+        self.timelimit_mode = timelimit_mode
+        self.run_mode = run_mode
+        self.precompiled_header = precompiled_header
+        # Added to compile_command for profile-guided optimization builds
+        self.pgo_instrument_flags = pgo_instrument_flags
+        self.pgo_use_flags = pgo_use_flags
         self.aliases = aliases or []
 
     @classmethod
@@ -49,8 +82,17 @@ class Environment(object):
             output_file=str(d.get('output_file', 'PCU_STDOUT')),
             compile_timelimit_msec=int(d.get('compile_timelimit_msec', 60000)),
             run_timelimit_msec=int(d.get('run_timelimit_msec', 5000)),
+            run_memlimit_mb=int(d.get('run_memlimit_mb', 0)),
+            output_limit_mb=int(d.get('output_limit_mb', 0)),
             format_strictness=FormatStrictness[d.get(
                 'format_strictness', FormatStrictness.STRICT.name).upper()],
+            timelimit_mode=TimelimitMode[str(d.get(
+                'timelimit_mode', TimelimitMode.WALL.name)).upper()],
+            run_mode=RunMode[str(d.get(
+                'run_mode', RunMode.PROCESS.name)).upper()],
+            precompiled_header=_parse_bool(d.get('precompiled_header', False)),
+            pgo_instrument_flags=str(d.get('pgo_instrument_flags', '')),
+            pgo_use_flags=str(d.get('pgo_use_flags', '')),
             aliases=d.get('aliases', []),
         )
         return env
@@ -66,7 +108,14 @@ class Environment(object):
             'output_file': self.output_file_p,
             'compile_timelimit_msec': self.compile_timelimit_msec,
             'run_timelimit_msec': self.run_timelimit_msec,
+            'run_memlimit_mb': self.run_memlimit_mb,
+            'output_limit_mb': self.output_limit_mb,
             'format_strictness': self.format_strictness.name.lower(),
+            'timelimit_mode': self.timelimit_mode.name.lower(),
+            'run_mode': self.run_mode.name.lower(),
+            'precompiled_header': self.precompiled_header,
+            'pgo_instrument_flags': self.pgo_instrument_flags,
+            'pgo_use_flags': self.pgo_use_flags,
             'aliases': self.aliases,
         }
         return d
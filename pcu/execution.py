@@ -0,0 +1,448 @@
+import contextlib
+import functools
+import os
+import pathlib
+import re
+import resource
+import shlex
+import shutil
+import signal
+import subprocess
+import sys
+import threading
+import time
+from typing import IO, Any, Callable, List, Optional, Tuple, Union
+
+from . import launcher
+
+
+# How often a running process checks whether it has been cancelled.
+_CANCEL_POLL_INTERVAL = 0.05
+
+# How long a process gets to exit after SIGTERM before it is sent SIGKILL.
+_KILL_GRACE_SEC = 0.1
+
+# What a process writes to a pipe is copied into its file this much at a
+# time.
+_PIPE_READ_SIZE = 65536
+# Past the line budget, stderr keeps its last this many bytes, where the
+# message of a crash (e.g. running out of memory) is.
+_ERROR_TAIL_BYTES = 4096
+_CUT_MARKER = b'\n... (cut short; the end follows) ...\n'
+# Once the process group is gone the pipes are at their end; this is only
+# for a process that left the group and still holds one open.
+_READER_JOIN_TIMEOUT_SEC = 1.0
+
+# Characters that mean something to the shell outside of quotes, and inside
+# double quotes. Some only do at the start of a word (#, ~), but telling
+# those apart isn't worth it.
+_SHELL_CHARS = set('|&;<>()$`\\*?[]{}#~!\n')
+_DOUBLE_QUOTED_SHELL_CHARS = set('$`\\')
+# Builtins and keywords, which have no executable (or not the same one)
+_SHELL_WORDS = {
+    '.', ':', 'alias', 'break', 'case', 'cd', 'command', 'continue', 'do',
+    'done', 'elif', 'else', 'esac', 'eval', 'exec', 'exit', 'export', 'fi',
+    'for', 'function', 'if', 'read', 'readonly', 'return', 'set', 'shift',
+    'source', 'then', 'time', 'times', 'trap', 'ulimit', 'umask', 'unset',
+    'until', 'wait', 'while',
+}
+_ASSIGNMENT_RE = re.compile(r'^\s*[A-Za-z_][A-Za-z0-9_]*=')
+
+
+class ExecResult(object):
+    def __init__(self,
+                 returncode: int,
+                 timed_out: bool,
+                 wall_time: float,
+                 cpu_time: float,
+                 max_rss: int,
+                 cancelled: bool = False,
+                 output_limit_exceeded: bool = False,
+                 memlimit_exceeded: bool = False,
+    ) -> None:
+        self.returncode = returncode
+        self.timed_out = timed_out
+        self.wall_time = wall_time  # seconds
+        self.cpu_time = cpu_time  # seconds, user + sys
+        self.max_rss = max_rss  # bytes
+        self.cancelled = cancelled
+        self.output_limit_exceeded = output_limit_exceeded
+        # An allocation failed under the memory limit, or the peak RSS
+        # reached it, as far as the launcher could tell.
+        self.memlimit_exceeded = memlimit_exceeded
+
+
+def _rusage_max_rss(rusage: Any) -> int:
+    # Linux reports ru_maxrss in kilobytes, macOS in bytes.
+    if sys.platform == 'darwin':
+        return rusage.ru_maxrss
+    return rusage.ru_maxrss * 1024
+
+
+def limits_preexec_fn(memlimit: Optional[int],
+                      cpu_limit: Optional[float] = None,
+                      output_limit: Optional[int] = None,
+) -> Optional[Callable]:
+    # None if there's nothing to limit, so that subprocess may use the
+    # cheaper vfork. Peak memory is the same either way: a forked child's
+    # ru_maxrss starts out at our own high-water mark just as a vforked
+    # one's does, which is what the launcher is for.
+    if not memlimit and cpu_limit is None and not output_limit:
+        return None
+
+    def preexec_fn() -> None:
+        if memlimit:
+            # Address space rather than RSS: Linux doesn't enforce
+            # RLIMIT_RSS.
+            resource.setrlimit(resource.RLIMIT_AS, (memlimit, memlimit))
+        if cpu_limit is not None:
+            # Whole seconds only, so this just stops runaway processes
+            # (SIGXCPU, then SIGKILL a second later) in the first second
+            # past the limit; callers compare the exact CPU time.
+            soft = int(cpu_limit) + 1
+            resource.setrlimit(resource.RLIMIT_CPU, (soft, soft + 1))
+        if output_limit:
+            # For output written straight to files, which no pipe reader
+            # sees. One byte over, so that a file cut off by the limit is
+            # told apart from one that just fits.
+            resource.setrlimit(resource.RLIMIT_FSIZE,
+                               (output_limit + 1, output_limit + 1))
+
+    return preexec_fn
+
+
+@functools.lru_cache(maxsize=256)
+def split_command(command: str) -> Optional[List[str]]:
+    # Splits a command into words, or returns None if it needs a shell to
+    # run: pipes, redirections, variables, globs, builtins and the like.
+    quote = None  # type: Optional[str]
+    for c in command:
+        if quote is None:
+            if c in '\'"':
+                quote = c
+            elif c in _SHELL_CHARS:
+                return None
+        elif c == quote:
+            quote = None
+        elif quote == '"' and c in _DOUBLE_QUOTED_SHELL_CHARS:
+            return None
+    if quote is not None or _ASSIGNMENT_RE.match(command):
+        return None
+    args = shlex.split(command)
+    if not args or args[0] in _SHELL_WORDS:
+        return None
+    return args
+
+
+def _resolve_executable(name: str,
+                        cwd: Union[str, pathlib.Path],
+) -> Optional[str]:
+    # Like the shell does it; None if there's no such executable, in which
+    # case the shell gets to say so.
+    if '/' not in name:
+        return shutil.which(name)
+    path = os.path.join(cwd, name)
+    if os.path.isfile(path) and os.access(path, os.X_OK):
+        return path
+    return None
+
+
+def _kill_group(pgid: int, sig: int) -> None:
+    # Every process runs in a process group of its own, so that this also
+    # gets whatever it started.
+    with contextlib.suppress(OSError):
+        os.killpg(pgid, sig)
+
+
+class _Watchdog(threading.Thread):
+    # Kills a process group once it runs out of time, or when cancel is set:
+    # politely with SIGTERM first, then with SIGKILL.
+    def __init__(self,
+                 pgid: int,
+                 deadline: Optional[float],
+                 cancel: Optional[threading.Event],
+    ) -> None:
+        super().__init__(daemon=True)
+        self.timed_out = False
+        self.cancelled = False
+        self._pgid = pgid
+        self._deadline = deadline
+        self._cancel = cancel
+        self._lock = threading.Lock()
+        self._finished = threading.Event()
+
+    def run(self) -> None:
+        while True:
+            wait_time = None  # type: Optional[float]
+            if self._deadline is not None:
+                wait_time = max(0.0, self._deadline - time.monotonic())
+            if self._cancel is not None:
+                wait_time = (_CANCEL_POLL_INTERVAL if wait_time is None
+                             else min(wait_time, _CANCEL_POLL_INTERVAL))
+            if self._finished.wait(wait_time):
+                return
+
+            if self._cancel is not None and self._cancel.is_set():
+                self._kill(cancelled=True)
+                return
+            if (self._deadline is not None and
+                    time.monotonic() >= self._deadline):
+                self._kill(timed_out=True)
+                return
+
+    def _kill(self, timed_out: bool = False, cancelled: bool = False) -> None:
+        with self._lock:
+            if self._finished.is_set():
+                return
+            self.timed_out = timed_out
+            self.cancelled = cancelled
+            _kill_group(self._pgid, signal.SIGTERM)
+        if not self._finished.wait(_KILL_GRACE_SEC):
+            _kill_group(self._pgid, signal.SIGKILL)
+
+    def finish(self) -> None:
+        with self._lock:
+            self._finished.set()
+
+
+class _PipeReader(threading.Thread):
+    # Copies what a process writes to a pipe into a file, keeping at most
+    # max_bytes bytes and max_lines lines of it. What goes over is dropped
+    # (but for the last keep_tail bytes, which are added at the end) and
+    # on_limit is called, once.
+    def __init__(self,
+                 pipe: IO[bytes],
+                 outfile: IO[bytes],
+                 max_bytes: Optional[int],
+                 max_lines: Optional[int] = None,
+                 keep_tail: int = 0,
+                 on_limit: Optional[Callable[[], None]] = None,
+    ) -> None:
+        super().__init__(daemon=True)
+        self._pipe = pipe
+        # Our own descriptor: if a process that escaped its group keeps the
+        # pipe open, we may outlive the caller's file.
+        self._out_fd = os.dup(outfile.fileno())
+        self._max_bytes = max_bytes
+        self._max_lines = max_lines
+        self._keep_tail = keep_tail
+        self._on_limit = on_limit
+        self._written = 0
+        self._lines = 0
+        self._tail = b''
+        # splice(2) moves the data in the kernel, without copying it through
+        # here; line counting needs to see it, though.
+        self._splice = (hasattr(os, 'splice') and max_bytes is not None and
+                        max_lines is None)
+        self.exceeded = False
+
+    def run(self) -> None:
+        fd = self._pipe.fileno()
+        try:
+            while True:
+                if self._splice and not self.exceeded:
+                    try:
+                        n = os.splice(fd, self._out_fd,
+                                      self._max_bytes - self._written + 1)
+                    except OSError:
+                        self._splice = False  # e.g. not supported here
+                        continue
+                    if not n:
+                        break
+                    self._written += n
+                    if self._written > self._max_bytes:
+                        os.ftruncate(self._out_fd, self._max_bytes)
+                        self._limit_reached(b'')
+                    continue
+
+                data = os.read(fd, _PIPE_READ_SIZE)
+                if not data:
+                    break
+                if self.exceeded:
+                    self._keep(data)
+                    continue
+                size = self._fits(data)
+                self._write(data[:size])
+                if size < len(data):
+                    self._limit_reached(data[size:])
+        except OSError:
+            pass
+        finally:
+            with contextlib.suppress(OSError):
+                if self._tail:
+                    self._write(_CUT_MARKER + self._tail)
+                os.close(self._out_fd)
+            self._pipe.close()
+
+    def _fits(self, data: bytes) -> int:
+        # How much of data is within the limits.
+        size = len(data)
+        if self._max_bytes is not None:
+            size = min(size, self._max_bytes - self._written)
+        if self._max_lines is not None:
+            start = 0
+            for _ in range(self._max_lines - self._lines):
+                newline = data.find(b'\n', start, size)
+                if newline < 0:
+                    return size
+                start = newline + 1
+            size = start
+        return size
+
+    def _write(self, data: bytes) -> None:
+        self._written += len(data)
+        self._lines += data.count(b'\n')
+        while data:
+            data = data[os.write(self._out_fd, data):]
+
+    def _keep(self, data: bytes) -> None:
+        if self._keep_tail:
+            self._tail = (self._tail + data)[-self._keep_tail:]
+
+    def _limit_reached(self, data: bytes) -> None:
+        self.exceeded = True
+        self._keep(data)
+        if self._on_limit is not None:
+            self._on_limit()
+
+
+def _is_file(stream: Any) -> bool:
+    # An open file (rather than None, PIPE or DEVNULL), whose output we may
+    # pipe through a _PipeReader.
+    return hasattr(stream, 'fileno')
+
+
+def run_process(command: str,
+                cwd: Union[str, pathlib.Path],
+                stdin: Any,
+                stdout: Any,
+                stderr: Any,
+                timeout: Optional[float] = None,
+                memlimit: Optional[int] = None,
+                cancel: Optional[threading.Event] = None,
+                cpu_limit: Optional[float] = None,
+                output_limit: Optional[int] = None,
+                error_max_lines: Optional[int] = None,
+) -> ExecResult:
+    # Commands that don't need a shell are run directly, which saves
+    # starting one for every run.
+    args = split_command(command)
+    executable = None  # type: Optional[str]
+    if args is not None:
+        executable = _resolve_executable(args[0], cwd)
+
+    # Output to files goes through a pipe instead, so that a program that
+    # prints without end can be stopped at the limit (and only so much of
+    # its stderr is kept), rather than filling up the disk.
+    stdout_file = stderr_file = None  # type: Any
+    if output_limit and _is_file(stdout):
+        stdout_file, stdout = stdout, subprocess.PIPE
+    if error_max_lines is not None and _is_file(stderr):
+        stderr_file, stderr = stderr, subprocess.PIPE
+
+    # Started through the launcher where there is one, which reports the
+    # program's peak memory (see launcher.py).
+    launcher_path = launcher.launcher_path()
+    report = None  # type: Optional[IO[bytes]]
+    pass_fds = ()  # type: Tuple[int, ...]
+    if launcher_path is not None:
+        if executable is None:
+            executable = '/bin/sh'
+            args = [executable, '-c', command]
+        report_fd, report_write_fd = os.pipe()
+        report = os.fdopen(report_fd, 'rb')
+        args = [str(launcher_path), str(report_write_fd),
+                executable] + args
+        executable = args[0]
+        pass_fds = (report_write_fd,)
+
+    start_time = time.monotonic()
+    try:
+        # typeshed currently says cwd can't be path-like (must be str/bytes)
+        proc = subprocess.Popen(  # type: ignore
+            command if executable is None else args,
+            executable=executable,
+            cwd=cwd,
+            stdin=stdin,
+            stdout=stdout,
+            stderr=stderr,
+            shell=executable is None,
+            start_new_session=True,
+            pass_fds=pass_fds,
+            preexec_fn=limits_preexec_fn(memlimit, cpu_limit, output_limit))
+    finally:
+        for fd in pass_fds:
+            os.close(fd)
+
+    # The program's process group, which is the launcher's child's if it
+    # got that far; the launcher itself stays out of it, so that it lives
+    # to report.
+    pgid = proc.pid
+    readers = []  # type: List[_PipeReader]
+    watchdog = None
+    try:
+        if report is not None:
+            pid_line = report.readline()
+            if pid_line:
+                pgid = int(pid_line)
+
+        stdout_reader = None
+        if stdout_file is not None:
+            stdout_reader = _PipeReader(
+                proc.stdout, stdout_file, output_limit,
+                on_limit=lambda: _kill_group(pgid, signal.SIGKILL))
+            readers.append(stdout_reader)
+        if stderr_file is not None:
+            readers.append(_PipeReader(
+                proc.stderr, stderr_file, output_limit or None,
+                error_max_lines, keep_tail=_ERROR_TAIL_BYTES))
+        for reader in readers:
+            reader.start()
+
+        if timeout is not None or cancel is not None:
+            watchdog = _Watchdog(
+                pgid,
+                None if timeout is None else start_time + timeout,
+                cancel)
+            watchdog.start()
+
+        # wait4 (rather than Popen.wait) so that we get the child's rusage;
+        # this includes any descendants it waited for, e.g. under a shell.
+        _, status, rusage = os.wait4(proc.pid, 0)
+        wall_time = time.monotonic() - start_time
+        max_rss = _rusage_max_rss(rusage)
+        memlimit_exceeded = False
+        if report is not None:
+            max_rss_line = report.readline()
+            if max_rss_line:
+                max_rss = int(max_rss_line)
+            memlimit_exceeded = report.readline().strip() == b'1'
+    except BaseException:
+        _kill_group(pgid, signal.SIGKILL)
+        _kill_group(proc.pid, signal.SIGKILL)
+        proc.wait()
+        raise
+    finally:
+        if watchdog is not None:
+            watchdog.finish()
+        # Don't leave anything it started running into the next process.
+        _kill_group(pgid, signal.SIGKILL)
+        _kill_group(proc.pid, signal.SIGKILL)
+        for reader in readers:
+            reader.join(_READER_JOIN_TIMEOUT_SEC)
+        if report is not None:
+            report.close()
+
+    proc.returncode = os.waitstatus_to_exitcode(status)
+
+    return ExecResult(
+        returncode=proc.returncode,
+        timed_out=watchdog is not None and watchdog.timed_out,
+        wall_time=wall_time,
+        cpu_time=rusage.ru_utime + rusage.ru_stime,
+        max_rss=max_rss,
+        cancelled=watchdog is not None and watchdog.cancelled,
+        output_limit_exceeded=(stdout_reader is not None and
+                               stdout_reader.exceeded),
+        memlimit_exceeded=memlimit_exceeded,
+    )
@@ -0,0 +1,170 @@
+import contextlib
+import os
+import pathlib
+import re
+import shutil
+import signal
+import threading
+import time
+from typing import Any, List, Optional
+
+from . import defaults
+from . import execution
+from . import resident
+
+
+_SERVER_SOURCE = 'forkserver/pcu_forkserver.py'
+_LOG_NAME = '.pcu_forkserver.log'
+
+# A killed child should be reaped by the server within this long; if not,
+# the server itself is replaced.
+_KILL_TIMEOUT_SEC = 5.0
+
+_INTERPRETER_RE = re.compile(r'^(python|pypy)[0-9.]*$')
+_OPTIONS_WITH_VALUES = ('-W', '-X', '-Q')
+_UNSUPPORTED_OPTIONS = ('-c', '-m', '-', '-i')
+
+
+class PythonCommand(object):
+    # A run_command of the form "python [options] script.py [args]".
+    def __init__(self,
+                 python: str,
+                 options: List[str],
+                 script: str,
+                 args: List[str],
+    ) -> None:
+        self.python = python
+        self.options = options
+        self.script = script
+        self.args = args
+
+
+def parse_command(run_command: str) -> Optional[PythonCommand]:
+    args = execution.split_command(run_command)
+    if not args or not _INTERPRETER_RE.match(os.path.basename(args[0])):
+        return None
+
+    options = []  # type: List[str]
+    i = 1
+    while i < len(args) and args[i].startswith('-'):
+        arg = args[i]
+        if arg in _UNSUPPORTED_OPTIONS or arg.startswith(('-c', '-m')):
+            return None
+        if arg in _OPTIONS_WITH_VALUES:
+            options.extend(args[i:i + 2])
+            i += 2
+        else:
+            options.append(arg)
+            i += 1
+
+    if i >= len(args):
+        return None
+    return PythonCommand(args[0], options, args[i], args[i + 1:])
+
+
+class _ForkServer(resident.ResidentProcess):
+    # An interpreter that has already started up and imported the usual
+    # modules, and forks a child for each case. Children are killed on their
+    # own; the server is only replaced if it dies.
+    def __init__(self,
+                 args: List[str],
+                 cwd: pathlib.Path,
+                 memlimit: Optional[int],
+                 output_limit: Optional[int],
+    ) -> None:
+        super().__init__(args, cwd, memlimit, output_limit, _LOG_NAME)
+
+    def run(self,
+            stdin_path: str,
+            stdout_path: str,
+            stderr_path: str,
+            timeout: Optional[float],
+            cancel: Optional[threading.Event],
+    ) -> execution.ExecResult:
+        why = self.wait_ready(cancel)
+        start_time = time.monotonic()
+        if why != 'line':
+            return self._failed(why, stderr_path, start_time)
+        if not self.send('RUN\t{}\t{}\t{}'.format(stdin_path, stdout_path,
+                                                 stderr_path)):
+            return self._failed('eof', stderr_path, start_time)
+
+        deadline = None if timeout is None else start_time + timeout
+        line, why = self.read_line(deadline, cancel)
+        if line is None or not line.startswith('STARTED\t'):
+            return self._failed(why, stderr_path, start_time)
+        pid = int(line.split('\t')[1])
+
+        line, why = self.read_line(deadline, cancel)
+        if line is None and why in ('timeout', 'cancel'):
+            # Kill the child's whole process group; the server reaps it and
+            # reports as usual.
+            with contextlib.suppress(OSError):
+                os.killpg(pid, signal.SIGKILL)
+            line, _ = self.read_line(time.monotonic() + _KILL_TIMEOUT_SEC,
+                                     None)
+            if line is None:
+                return self._failed(why, stderr_path, start_time)
+        if line is None or not line.startswith('DONE\t'):
+            return self._failed(why, stderr_path, start_time)
+
+        returncode, wall_ns, cpu_ns, max_rss, out_of_memory = (
+            int(field) for field in line.split('\t')[1:6])
+        return execution.ExecResult(
+            returncode=returncode,
+            timed_out=why == 'timeout',
+            wall_time=wall_ns * 1e-9,
+            cpu_time=cpu_ns * 1e-9,
+            max_rss=max_rss,
+            cancelled=why == 'cancel',
+            memlimit_exceeded=bool(out_of_memory))
+
+    def _failed(self,
+                why: str,
+                stderr_path: str,
+                start_time: float,
+    ) -> execution.ExecResult:
+        elapsed = time.monotonic() - start_time
+        if why in ('timeout', 'cancel'):
+            self.kill()
+            return execution.ExecResult(
+                returncode=self.respawn(),
+                timed_out=why == 'timeout',
+                wall_time=elapsed,
+                cpu_time=elapsed,
+                max_rss=0,
+                cancelled=why == 'cancel')
+        return self.died(stderr_path, elapsed)
+
+
+def run(run_command: str,
+        cwd: pathlib.Path,
+        stdin: Any,
+        stdout: Any,
+        stderr: Any,
+        timeout: Optional[float] = None,
+        memlimit: Optional[int] = None,
+        cancel: Optional[threading.Event] = None,
+        output_limit: Optional[int] = None,
+) -> Optional[execution.ExecResult]:
+    # Like execution.run_process, but forks each run of a Python script off
+    # an interpreter that stays up between calls. Returns None if the
+    # command can't be run that way.
+    command = parse_command(run_command)
+    if command is None:
+        resident.warn_fallback(run_command, 'a fork server',
+                               'not a plain "python script.py" command')
+        return None
+    if shutil.which(command.python) is None:
+        return None  # let the shell report it
+
+    file_paths = resident.file_paths(stdin, stdout, stderr)
+    if file_paths is None:
+        return None
+
+    source = defaults.load_static(_SERVER_SOURCE).decode()
+    args = ([command.python] + command.options +
+            ['-c', source, command.script] + command.args)
+    server = resident.get_process(args, pathlib.Path(cwd).resolve(),
+                                  memlimit, output_limit, _ForkServer)
+    return server.run(*file_paths, timeout, cancel)
@@ -0,0 +1,228 @@
+import datetime
+import json
+import pathlib
+import sys
+from typing import Dict, List, Optional
+
+from . import color_utils
+from . import compile_cache
+from . import problem
+from . import runner
+
+
+_NUM_LISTED_RUNS = 10
+
+# Timings this close together are within the noise of starting a process,
+# whatever the relative difference.
+_MIN_SLOWDOWN_SEC = 0.01
+
+_PASSING_RESULT_NAMES = (
+    runner.TestCaseResult.CORRECT.name,
+    runner.TestCaseResult.NO_ANSWER_FILE_PROVIDED.name,
+)
+
+
+class RunRecord(object):
+    def __init__(self, run_id: int, data: Dict) -> None:
+        self.run_id = run_id
+        self.datetime = data['datetime']  # type: str
+        self.source_sha256 = data['source_sha256']  # type: Optional[str]
+        self.env_name = data['env_name']  # type: str
+        self.jobs = data.get('jobs', 1)  # type: int
+        self.cases = data['cases']  # type: Dict[str, Dict]
+
+    def num_passed(self) -> int:
+        return sum(1 for case in self.cases.values()
+                   if case['result'] in _PASSING_RESULT_NAMES)
+
+
+def record_run(prob: problem.Problem, run_report: runner.RunReport) -> None:
+    # Cancelled runs (e.g. from "pcu watch") are incomplete, so they aren't
+    # worth keeping.
+    if run_report.cancelled or not run_report.cases:
+        return
+
+    source_path = pathlib.Path.cwd() / prob.source_file
+    cases = {}
+    for test_id, report in run_report.cases.items():
+        case = {'result': report.result.name}  # type: Dict
+        if report.exec_result is not None:
+            case['wall_time'] = round(report.exec_result.wall_time, 6)
+            case['cpu_time'] = round(report.exec_result.cpu_time, 6)
+            case['max_rss'] = report.exec_result.max_rss
+        cases[test_id] = case
+
+    now = datetime.datetime.now(datetime.timezone.utc).astimezone()
+    record = {
+        'datetime': now.isoformat(timespec='seconds'),
+        'source_sha256': (compile_cache.file_hash(source_path)
+                          if source_path.is_file() else None),
+        'env_name': prob.env.name,
+        'run_timelimit_msec': prob.env.run_timelimit_msec,
+        'jobs': run_report.jobs,
+        'cases': cases,
+    }
+    # One line per run, written in one go, so that appending stays cheap
+    # however long the history gets.
+    with open(prob.history_path, 'a') as outfile:
+        outfile.write(json.dumps(record, sort_keys=True,
+                                 separators=(',', ':')) + '\n')
+
+
+def load_runs(prob: problem.Problem) -> List[Optional[RunRecord]]:
+    # Runs are numbered from 1 by their line in the history file. A line
+    # that can't be read (say, from a crash mid-write) keeps its number.
+    if not prob.history_path.is_file():
+        return []
+    runs = []  # type: List[Optional[RunRecord]]
+    with open(prob.history_path, 'r') as infile:
+        for run_id, line in enumerate(infile, 1):
+            try:
+                runs.append(RunRecord(run_id, json.loads(line)))
+            except (ValueError, KeyError, TypeError):
+                runs.append(None)
+    return runs
+
+
+def _get_run(runs: List[Optional[RunRecord]],
+             run_id: int,
+) -> Optional[RunRecord]:
+    # Negative ids count back from the latest run, like Python indices.
+    index = run_id - 1 if run_id > 0 else len(runs) + run_id
+    if not 0 <= index < len(runs) or runs[index] is None:
+        with color_utils.ColorizeStderrError():
+            print('ERROR: no readable run', run_id, 'in the history',
+                  '(there are', len(runs), 'runs)',
+                  file=sys.stderr)
+        return None
+    return runs[index]
+
+
+def _short_hash(record: RunRecord) -> str:
+    return (record.source_sha256 or '-')[:8]
+
+
+def _print_runs(runs: List[Optional[RunRecord]]) -> None:
+    print('{:>5}  {:25}  {:8}  {:12}  {}'.format(
+              'Run', 'Date', 'Source', 'Environment', 'Passed'),
+          file=sys.stderr)
+    for record in runs[-_NUM_LISTED_RUNS:]:
+        if record is None:
+            continue
+        print('{:5}  {:25}  {:8}  {:12}  {}/{}'.format(
+                  record.run_id, record.datetime, _short_hash(record),
+                  record.env_name, record.num_passed(), len(record.cases)),
+              file=sys.stderr)
+    if len(runs) > _NUM_LISTED_RUNS:
+        print('(showing the last {} of {} runs)'.format(
+                  _NUM_LISTED_RUNS, len(runs)),
+              file=sys.stderr)
+
+
+def _humanize_name(result_name: str) -> str:
+    return runner.humanize(runner.TestCaseResult[result_name])
+
+
+def _compare_runs(old: RunRecord,
+                  new: RunRecord,
+                  threshold_percent: float,
+) -> None:
+    with color_utils.ColorizeStderrBar2():
+        print('-' * 16, 'Run', old.run_id, 'vs. run', new.run_id, '-' * 16,
+              file=sys.stderr)
+    if old.source_sha256 == new.source_sha256:
+        print('Same source file', _short_hash(new),
+              file=sys.stderr)
+    else:
+        print('Source file changed from', _short_hash(old), 'to',
+              _short_hash(new),
+              file=sys.stderr)
+    if old.env_name != new.env_name:
+        print('Environment changed from', old.env_name, 'to', new.env_name,
+              file=sys.stderr)
+    if old.jobs != new.jobs:
+        with color_utils.ColorizeStderrWarning():
+            print('Note: the runs used', old.jobs, 'and', new.jobs,
+                  'parallel jobs, so their timings may not be comparable',
+                  file=sys.stderr)
+
+    common_test_ids = sorted(set(old.cases) & set(new.cases))
+    flips = []  # type: List[str]
+    slowdowns = []  # type: List[str]
+    for test_id in common_test_ids:
+        old_case = old.cases[test_id]
+        new_case = new.cases[test_id]
+        if old_case['result'] != new_case['result']:
+            flips.append('  {:23} {} -> {}'.format(
+                test_id, _humanize_name(old_case['result']),
+                _humanize_name(new_case['result'])))
+            continue
+
+        old_time = old_case.get('wall_time')
+        new_time = new_case.get('wall_time')
+        if old_time is None or new_time is None:
+            continue
+        if (new_time - old_time >= _MIN_SLOWDOWN_SEC and
+                new_time > old_time * (1 + threshold_percent / 100)):
+            slowdowns.append('  {:23} {:.3f} s -> {:.3f} s ({:+.0f}%)'.format(
+                test_id, old_time, new_time,
+                (new_time / old_time - 1) * 100 if old_time else float('inf')))
+
+    if flips:
+        with color_utils.ColorizeStderrWarning():
+            print('Verdict changes:',
+                  file=sys.stderr)
+            for line in flips:
+                print(line,
+                      file=sys.stderr)
+    if slowdowns:
+        with color_utils.ColorizeStderrWarning():
+            print('Slower by more than {:g}%:'.format(threshold_percent),
+                  file=sys.stderr)
+            for line in slowdowns:
+                print(line,
+                      file=sys.stderr)
+    if not flips and not slowdowns:
+        with color_utils.ColorizeStderrGood():
+            print('No verdict changes, and no test case slower by more than',
+                  '{:g}%'.format(threshold_percent),
+                  file=sys.stderr)
+
+    only_old = sorted(set(old.cases) - set(new.cases))
+    only_new = sorted(set(new.cases) - set(old.cases))
+    for record, test_ids in [(old, only_old), (new, only_new)]:
+        if test_ids:
+            print('Only in run {}:'.format(record.run_id), ' '.join(test_ids),
+                  file=sys.stderr)
+
+
+def history(prob: problem.Problem,
+            old_run_id: Optional[int],
+            new_run_id: Optional[int],
+            threshold_percent: float,
+) -> bool:
+    runs = load_runs(prob)
+    with color_utils.ColorizeStderrBar1():
+        print('=' * 20, 'History of', prob.name, '=' * 20,
+              file=sys.stderr)
+    if not runs:
+        with color_utils.ColorizeStderrWarning():
+            print('No runs recorded yet -- they are recorded by "pcu run"',
+                  'and "pcu watch"',
+                  file=sys.stderr)
+        return True
+
+    _print_runs(runs)
+    if old_run_id is None:
+        if len(runs) < 2:
+            return True
+        old_run_id, new_run_id = -2, -1
+    elif new_run_id is None:
+        new_run_id = -1
+
+    old = _get_run(runs, old_run_id)
+    new = _get_run(runs, new_run_id)
+    if old is None or new is None:
+        return False
+    _compare_runs(old, new, threshold_percent)
+    return True
@@ -0,0 +1,254 @@
+import hashlib
+import os
+import pathlib
+import re
+import shutil
+import subprocess
+import threading
+import time
+import uuid
+from typing import Any, Dict, List, Optional
+
+from . import compile_cache
+from . import defaults
+from . import execution
+from . import paths
+from . import resident
+
+
+_RUNNER_CLASS = 'PcuJvmRunner'
+_RUNNER_SOURCE = 'jvm/PcuJvmRunner.java'
+_LOG_NAME = '.pcu_jvm.log'
+
+_CLASSPATH_OPTIONS = ('-cp', '-classpath', '--class-path')
+_OPTIONS_WITH_VALUES = ('--add-exports', '--add-modules', '--add-opens',
+                        '--add-reads', '--enable-native-access',
+                        '--limit-modules', '--module-path', '-p')
+_UNSUPPORTED_OPTIONS = ('-jar', '-m', '--module', '--source')
+
+_JAVA_VERSION_RE = re.compile(r'^JAVA_VERSION="(?:1\.)?(\d+)', re.MULTILINE)
+
+
+class JvmCommand(object):
+    # A run_command of the form "java [options] MainClass [args]".
+    def __init__(self,
+                 java: str,
+                 options: List[str],
+                 classpath: str,
+                 main_class: str,
+                 args: List[str],
+    ) -> None:
+        self.java = java
+        self.options = options
+        self.classpath = classpath
+        self.main_class = main_class
+        self.args = args
+
+
+def parse_command(run_command: str) -> Optional[JvmCommand]:
+    # Anything fancier (pipes, redirections, variables, jars, modules) is
+    # left to the shell.
+    args = execution.split_command(run_command)
+    if not args or os.path.basename(args[0]) != 'java':
+        return None
+
+    options = []  # type: List[str]
+    classpath = '.'
+    i = 1
+    while i < len(args) and args[i].startswith('-'):
+        arg = args[i]
+        if arg in _UNSUPPORTED_OPTIONS:
+            return None
+        if arg in _CLASSPATH_OPTIONS:
+            if i + 1 == len(args):
+                return None
+            classpath = args[i + 1]
+            i += 2
+        elif arg.startswith('--class-path='):
+            classpath = arg.partition('=')[2]
+            i += 1
+        elif arg in _OPTIONS_WITH_VALUES:
+            options.extend(args[i:i + 2])
+            i += 2
+        else:
+            options.append(arg)
+            i += 1
+
+    if i >= len(args) or args[i].endswith('.java'):
+        return None
+    return JvmCommand(args[0], options, classpath, args[i], args[i + 1:])
+
+
+def _java_major_version(java_path: pathlib.Path) -> Optional[int]:
+    # From the JDK's release file, which is much faster than `java -version`.
+    try:
+        with open(java_path.parent.parent / 'release', 'r') as infile:
+            match = _JAVA_VERSION_RE.search(infile.read())
+    except OSError:
+        return None
+    return int(match.group(1)) if match else None
+
+
+_runner_paths = {}  # type: Dict[str, Optional[pathlib.Path]]
+_runner_paths_lock = threading.Lock()
+def _runner_path(java_path: pathlib.Path) -> Optional[pathlib.Path]:
+    with _runner_paths_lock:
+        if str(java_path) not in _runner_paths:
+            _runner_paths[str(java_path)] = _build_runner(java_path)
+        return _runner_paths[str(java_path)]
+
+
+def _build_runner(java_path: pathlib.Path) -> Optional[pathlib.Path]:
+    # Compiled with the javac next to the java binary, so that the class file
+    # suits the JVM, and cached like compile output.
+    javac_path = java_path.with_name('javac')
+    if not javac_path.is_file():
+        which_javac = shutil.which('javac')
+        if which_javac is None:
+            return None
+        javac_path = pathlib.Path(which_javac)
+
+    source = defaults.load_static(_RUNNER_SOURCE)
+    hasher = hashlib.sha256(source)
+    hasher.update(compile_cache.compiler_identity(str(javac_path)).encode())
+    runner_path = paths.jvm_runner_cache_path() / hasher.hexdigest()
+    if (runner_path / (_RUNNER_CLASS + '.class')).is_file():
+        return runner_path
+
+    paths.jvm_runner_cache_path().mkdir(parents=True, exist_ok=True)
+    temp_path = paths.jvm_runner_cache_path() / '.tmp-{}'.format(
+        uuid.uuid4().hex)
+    try:
+        temp_path.mkdir()
+        source_path = temp_path / (_RUNNER_CLASS + '.java')
+        with open(source_path, 'wb') as outfile:
+            outfile.write(source)
+        sp_result = subprocess.run(
+            [str(javac_path), '-nowarn', '-d', str(temp_path),
+             str(source_path)],
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL)
+        if sp_result.returncode != 0:
+            return None
+        try:
+            os.rename(temp_path, runner_path)
+        except OSError:
+            pass  # somebody else built it first
+    finally:
+        if temp_path.exists():
+            shutil.rmtree(temp_path, ignore_errors=True)
+    return runner_path
+
+
+class _ResidentJvm(resident.ResidentProcess):
+    # Restarted whenever a case ends the JVM: System.exit() without a
+    # SecurityManager, a timeout, a crash.
+    def __init__(self,
+                 args: List[str],
+                 cwd: pathlib.Path,
+                 memlimit: Optional[int],
+                 output_limit: Optional[int],
+    ) -> None:
+        super().__init__(args, cwd, memlimit, output_limit, _LOG_NAME)
+
+    def run(self,
+            stdin_path: str,
+            stdout_path: str,
+            stderr_path: str,
+            timeout: Optional[float],
+            cancel: Optional[threading.Event],
+    ) -> execution.ExecResult:
+        why = self.wait_ready(cancel)
+        start_time = time.monotonic()
+        line = None  # type: Optional[str]
+        if why == 'line':
+            if self.send('RUN\t{}\t{}\t{}'.format(stdin_path, stdout_path,
+                                                   stderr_path)):
+                deadline = (None if timeout is None else
+                            start_time + timeout)
+                line, why = self.read_line(deadline, cancel)
+            else:
+                why = 'eof'
+
+        elapsed = time.monotonic() - start_time
+        if line is not None:
+            fields = line.split('\t')
+            if fields[0] == 'DONE':
+                if fields[5] != '1':
+                    self.respawn()
+                return self._result(int(fields[1]), fields[2:5])
+            if fields[0] == 'EXIT':
+                # System.exit() ended the JVM, with the program's exit code.
+                return self._result(self.respawn(), fields[1:4])
+            why = 'eof'
+
+        if why in ('timeout', 'cancel'):
+            self.kill()
+            return execution.ExecResult(
+                returncode=self.respawn(),
+                timed_out=why == 'timeout',
+                wall_time=elapsed,
+                cpu_time=elapsed,
+                max_rss=0,
+                cancelled=why == 'cancel')
+
+        # E.g. the program called Runtime.halt().
+        return self.died(stderr_path, elapsed)
+
+    @staticmethod
+    def _result(returncode: int, stats: List[str]) -> execution.ExecResult:
+        wall_ns, cpu_ns, rss_kb = (int(stat) for stat in stats)
+        return execution.ExecResult(
+            returncode=returncode,
+            timed_out=False,
+            wall_time=wall_ns * 1e-9,
+            cpu_time=(cpu_ns if cpu_ns >= 0 else wall_ns) * 1e-9,
+            max_rss=rss_kb * 1024)
+
+
+def run(run_command: str,
+        cwd: pathlib.Path,
+        stdin: Any,
+        stdout: Any,
+        stderr: Any,
+        timeout: Optional[float] = None,
+        memlimit: Optional[int] = None,
+        cancel: Optional[threading.Event] = None,
+        output_limit: Optional[int] = None,
+) -> Optional[execution.ExecResult]:
+    # Like execution.run_process, but runs a Java program's main() in a JVM
+    # that stays up between calls. Returns None if the command can't be run
+    # that way.
+    command = parse_command(run_command)
+    if command is None:
+        resident.warn_fallback(run_command, 'a resident JVM',
+                               'not a plain "java MainClass" command')
+        return None
+    java = shutil.which(command.java)
+    if java is None:
+        return None  # let the shell report it
+    java_path = pathlib.Path(java).resolve()
+    runner_path = _runner_path(java_path)
+    if runner_path is None:
+        resident.warn_fallback(run_command, 'a resident JVM',
+                               "couldn't compile the JVM runner")
+        return None
+
+    file_paths = resident.file_paths(stdin, stdout, stderr)
+    if file_paths is None:
+        return None
+
+    options = list(command.options)
+    # Java 18 to 23 only allow a SecurityManager (which the runner uses to
+    # catch System.exit) if asked to; later versions don't allow one at all.
+    version = _java_major_version(java_path)
+    if version is not None and 18 <= version < 24:
+        options.append('-Djava.security.manager=allow')
+
+    args = ([command.java] + options +
+            ['-cp', str(runner_path), _RUNNER_CLASS, command.classpath,
+             command.main_class] + command.args)
+    jvm = resident.get_process(args, pathlib.Path(cwd).resolve(), memlimit,
+                               output_limit, _ResidentJvm)
+    return jvm.run(*file_paths, timeout, cancel)
@@ -0,0 +1,87 @@
+import hashlib
+import os
+import pathlib
+import shutil
+import subprocess
+import sys
+import threading
+import uuid
+from typing import Optional
+
+from . import color_utils
+from . import defaults
+from . import paths
+
+
+_LAUNCHER_SOURCE = 'launcher/pcu_launcher.c'
+_COMPILERS = ('cc', 'gcc', 'clang')
+_COMPILE_TIMEOUT_SEC = 60.0
+
+
+def _build() -> Optional[pathlib.Path]:
+    # Cached by source and platform, since the cache directory may be shared
+    # between machines.
+    source = defaults.load_static(_LAUNCHER_SOURCE)
+    hasher = hashlib.sha256(source)
+    uname = os.uname()
+    hasher.update('{} {}'.format(uname.sysname, uname.machine).encode())
+    launcher_path = paths.launcher_cache_path() / 'pcu_launcher-{}'.format(
+        hasher.hexdigest()[:16])
+    if launcher_path.is_file():
+        return launcher_path
+
+    compiler = next((name for name in _COMPILERS if shutil.which(name)),
+                    None)
+    if compiler is None:
+        return None
+    paths.launcher_cache_path().mkdir(parents=True, exist_ok=True)
+    temp_path = paths.launcher_cache_path() / '.tmp-{}'.format(
+        uuid.uuid4().hex)
+    try:
+        temp_path.mkdir()
+        source_path = temp_path / 'pcu_launcher.c'
+        with open(source_path, 'wb') as outfile:
+            outfile.write(source)
+        executable_path = temp_path / 'pcu_launcher'
+        try:
+            sp_result = subprocess.run(
+                [compiler, '-O2', '-o', str(executable_path),
+                 str(source_path)],
+                stdin=subprocess.DEVNULL,
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL,
+                timeout=_COMPILE_TIMEOUT_SEC)
+        except subprocess.TimeoutExpired:
+            return None
+        if sp_result.returncode != 0:
+            return None
+        os.replace(executable_path, launcher_path)
+    finally:
+        shutil.rmtree(temp_path, ignore_errors=True)
+    return launcher_path
+
+
+_launcher_path = None  # type: Optional[pathlib.Path]
+_launcher_built = False
+_launcher_lock = threading.Lock()
+def launcher_path() -> Optional[pathlib.Path]:
+    # The launcher that execution.run_process starts programs through, so
+    # that their peak memory is measured without pcu's own, and allocations
+    # refused under the memory limit are noticed; None if it can't be built,
+    # in which case programs are started directly.
+    global _launcher_path, _launcher_built
+    with _launcher_lock:
+        if not _launcher_built:
+            _launcher_built = True
+            try:
+                _launcher_path = _build()
+            except OSError:
+                _launcher_path = None
+            if _launcher_path is None:
+                with color_utils.ColorizeStderrWarning():
+                    print('Warning: no C compiler to build the launcher',
+                          "with; peak memory figures will include pcu's own,",
+                          'and running out of memory will show as a',
+                          'Runtime Error',
+                          file=sys.stderr)
+        return _launcher_path
@@ -1,22 +1,40 @@
 import sys
 
-from . import arg_parser
-from . import commands
-from . import config
-from . import paths
+from . import daemon
+
+
+def prepare() -> None:
+    from . import arg_parser
+    from . import config
+    from . import paths
+
+    paths.base_path().mkdir(parents=True, exist_ok=True)
+    paths.templates_path().mkdir(parents=True, exist_ok=True)
+    paths.problems_path().mkdir(parents=True, exist_ok=True)
+    paths.locks_path().mkdir(parents=True, exist_ok=True)
+    config.get_settings()
+    arg_parser.get_parser()
+
+
+def run() -> None:
+    from . import arg_parser
+    from . import commands
+
+    prepare()
+
+    args = arg_parser.parse()
+
+    commands.dispatch(args)
 
 
 def main() -> None:
     try:
-        paths.base_path().mkdir(parents=True, exist_ok=True)
-        paths.templates_path().mkdir(parents=True, exist_ok=True)
-        paths.problems_path().mkdir(parents=True, exist_ok=True)
-        paths.locks_path().mkdir(parents=True, exist_ok=True)
-        config.get_settings()
-
-        args = arg_parser.parse()
+        # Hand the command to a running "pcu daemon", if there is one.
+        returncode = daemon.forward(sys.argv[1:])
+        if returncode is not None:
+            raise SystemExit(returncode)
 
-        commands.dispatch(args)
+        run()
 
     finally:
         sys.stdout.flush()
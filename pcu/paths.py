@@ -49,3 +49,39 @@ def lock_path(lock_name: str) -> pathlib.Path:
     lock_fn = lock_name + '.lock'
     lock_path = locks_path() / lock_fn
     return lock_path
+
+
+@functools.lru_cache(maxsize=None, typed=True)
+def cache_path() -> pathlib.Path:
+    cache_path = base_path() / 'cache'
+    return cache_path
+
+
+@functools.lru_cache(maxsize=None, typed=True)
+def compile_cache_path() -> pathlib.Path:
+    compile_cache_path = cache_path() / 'compile'
+    return compile_cache_path
+
+
+@functools.lru_cache(maxsize=None, typed=True)
+def pch_cache_path() -> pathlib.Path:
+    pch_cache_path = cache_path() / 'pch'
+    return pch_cache_path
+
+
+@functools.lru_cache(maxsize=None, typed=True)
+def jvm_runner_cache_path() -> pathlib.Path:
+    jvm_runner_cache_path = cache_path() / 'jvm'
+    return jvm_runner_cache_path
+
+
+@functools.lru_cache(maxsize=None, typed=True)
+def settings_snapshot_path() -> pathlib.Path:
+    settings_snapshot_path = cache_path() / 'settings.pickle'
+    return settings_snapshot_path
+
+
+@functools.lru_cache(maxsize=None, typed=True)
+def launcher_cache_path() -> pathlib.Path:
+    launcher_cache_path = cache_path() / 'launcher'
+    return launcher_cache_path
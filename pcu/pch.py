@@ -0,0 +1,156 @@
+import contextlib
+import hashlib
+import os
+import pathlib
+import re
+import shlex
+import shutil
+import subprocess
+import sys
+import uuid
+from typing import List, Optional
+
+from . import color_utils
+from . import compile_cache
+from . import paths
+from . import problem
+
+
+HEADER_NAME = 'pcu_pch.h'
+
+# Each entry holds a header compiled for one compiler + flag set; these are
+# tens of megabytes apiece, so only keep the most recently used few.
+_MAX_ENTRIES = 4
+
+_AUTOGENERATED_RE = re.compile(
+    r'BEGIN AUTOGENERATED(.*?)END AUTOGENERATED', re.DOTALL)
+_SYSTEM_INCLUDE_RE = re.compile(r'^\s*#\s*include\s*<[^>]+>', re.MULTILINE)
+
+
+def _autogenerated_includes(source_path: pathlib.Path) -> List[str]:
+    with open(source_path, 'r', errors='replace') as infile:
+        match = _AUTOGENERATED_RE.search(infile.read())
+    if match is None:
+        return []
+    return [m.group(0).strip()
+            for m in _SYSTEM_INCLUDE_RE.finditer(match.group(1))]
+
+
+def _header_flags(prob: problem.Problem) -> Optional[List[str]]:
+    # The header has to be compiled with exactly the flags the source is
+    # compiled with, so reuse the compile command minus its input/output.
+    try:
+        args = shlex.split(prob.compile_command)
+    except ValueError:
+        return None
+    if not args:
+        return None
+
+    flags = [args[0]]
+    skip_next = False
+    for arg in args[1:]:
+        if skip_next:
+            skip_next = False
+        elif arg == '-o':
+            skip_next = True
+        elif arg.startswith('-o') or arg == prob.source_file:
+            pass
+        else:
+            flags.append(arg)
+    return flags
+
+
+def _build(prob: problem.Problem,
+           flags: List[str],
+           includes: List[str],
+           entry_path: pathlib.Path,
+) -> bool:
+    pch_path = paths.pch_cache_path()
+    pch_path.mkdir(parents=True, exist_ok=True)
+
+    # Build in a scratch directory and rename it into place, so concurrent
+    # compiles never pick up a half-written header.
+    temp_path = pch_path / '.tmp-{}'.format(uuid.uuid4().hex)
+    try:
+        temp_path.mkdir()
+        header_path = temp_path / HEADER_NAME
+        with open(header_path, 'w') as outfile:
+            print('\n'.join(includes), file=outfile)
+
+        language = ('c-header' if prob.source_file.endswith('.c')
+                    else 'c++-header')
+        command = flags + ['-x', language, HEADER_NAME,
+                           '-o', HEADER_NAME + '.gch']
+        try:
+            sp_result = subprocess.run(command,
+                cwd=temp_path,
+                stdin=subprocess.DEVNULL,
+                timeout=prob.env.compile_timelimit_msec * 0.001)
+        except (OSError, subprocess.TimeoutExpired):
+            return False
+        if sp_result.returncode != 0:
+            return False
+
+        try:
+            os.rename(temp_path, entry_path)
+        except OSError:
+            pass  # somebody else built the same header first
+        return entry_path.is_dir()
+
+    finally:
+        if temp_path.exists():
+            shutil.rmtree(temp_path, ignore_errors=True)
+
+
+def _evict() -> None:
+    entries = []
+    for entry_path in paths.pch_cache_path().iterdir():
+        if entry_path.name.startswith('.') or not entry_path.is_dir():
+            continue
+        with contextlib.suppress(OSError):
+            entries.append((entry_path.stat().st_mtime, entry_path))
+
+    entries.sort(reverse=True)
+    for _, entry_path in entries[_MAX_ENTRIES:]:
+        shutil.rmtree(entry_path, ignore_errors=True)
+
+
+def prepare(prob: problem.Problem,
+            source_path: pathlib.Path,
+) -> Optional[pathlib.Path]:
+    includes = _autogenerated_includes(source_path)
+    if not includes:
+        return None
+
+    flags = _header_flags(prob)
+    if flags is None:
+        return None
+
+    hasher = hashlib.sha256()
+    for part in includes + flags + [compile_cache.compiler_identity(flags[0])]:
+        hasher.update(part.encode())
+        hasher.update(b'\0')
+    entry_path = paths.pch_cache_path() / hasher.hexdigest()
+
+    if not entry_path.is_dir():
+        print('Building precompiled header for',
+              len(includes), 'autogenerated includes',
+              file=sys.stderr)
+        if not _build(prob, flags, includes, entry_path):
+            with color_utils.ColorizeStderrWarning():
+                print('Could not build precompiled header -- compiling '
+                      'without it',
+                      file=sys.stderr)
+            return None
+        _evict()
+
+    with contextlib.suppress(OSError):
+        os.utime(entry_path)  # mark as recently used
+    return entry_path / HEADER_NAME
+
+
+def command_with_header(prob: problem.Problem,
+                        header_path: pathlib.Path,
+) -> str:
+    return '{} -include {}'.format(prob.compile_command,
+                                   shlex.quote(str(header_path)))
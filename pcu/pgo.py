@@ -0,0 +1,110 @@
+import concurrent.futures
+import pathlib
+import sys
+import tempfile
+from typing import List
+
+from . import abtest
+from . import color_utils
+from . import compiler
+from . import problem
+from . import solution
+from . import testcase_store
+
+
+FLAGS_VARIABLE = '${PCU_PGO_FLAGS}'
+
+# Timed runs of each build per test case when comparing them
+_COMPARE_WARMUPS = 1
+_COMPARE_RUNS = 3
+
+
+def _with_flags(prob: problem.Problem, flags: str) -> problem.Problem:
+    # Environments can say where the flags go with ${PCU_PGO_FLAGS} (e.g.
+    # if compile_command has several steps); otherwise they go at the end.
+    compile_command_p = prob.env.compile_command_p
+    if FLAGS_VARIABLE in compile_command_p:
+        compile_command_p = compile_command_p.replace(FLAGS_VARIABLE, flags)
+    else:
+        compile_command_p += ' ' + flags
+    return prob.variant(env_overrides={'compile_command': compile_command_p})
+
+
+def _train(prob: problem.Problem,
+           working_dir: pathlib.Path,
+           test_ids: List[str],
+           jobs: int,
+           scratch_dir: pathlib.Path,
+) -> int:
+    # Runs the instrumented program on the test cases, which leaves its
+    # profile in the working directory. Returns the number of failed runs.
+    candidate = solution.ProblemSolution(prob, working_dir, jobs, scratch_dir)
+
+    def train(i: int) -> bool:
+        input_path = prob.store.readable_path(
+            test_ids[i], testcase_store.INPUT,
+            scratch_dir / '{}.in'.format(i))
+        exec_result = candidate.run(input_path,
+                                    scratch_dir / '{}.out'.format(i))
+        return not exec_result.timed_out and exec_result.returncode == 0
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=jobs) as pool:
+        return sum(1 for ok in pool.map(train, range(len(test_ids)))
+                   if not ok)
+
+
+def build(prob: problem.Problem,
+          working_dir: pathlib.Path,
+          jobs: int = 1,
+          use_cache: bool = True,
+) -> bool:
+    env = prob.env
+    if not env.pgo_instrument_flags or not env.pgo_use_flags:
+        with color_utils.ColorizeStderrError():
+            print('ERROR: environment', env.name, 'does not support',
+                  'profile-guided optimization -- set its',
+                  'pgo_instrument_flags and pgo_use_flags',
+                  file=sys.stderr)
+        return False
+
+    test_ids = prob.get_test_ids()
+    if not test_ids:
+        with color_utils.ColorizeStderrError():
+            print('ERROR: profile-guided optimization needs test cases to',
+                  'train on',
+                  file=sys.stderr)
+        return False
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        plain_dir = pathlib.Path(temp_dir) / 'plain'
+        plain_dir.mkdir()
+        if not compiler.compile(prob, plain_dir, use_cache=use_cache):
+            return False
+
+        # Neither of these can come from the compile cache: the
+        # instrumented program writes its profile next to where it was
+        # compiled, and the final build depends on that profile.
+        instrumented = _with_flags(prob, env.pgo_instrument_flags)
+        if not compiler.compile(instrumented, working_dir, use_cache=False):
+            return False
+
+        print('Training on', len(test_ids), 'test cases',
+              file=sys.stderr)
+        training_dir = pathlib.Path(temp_dir) / 'training'
+        training_dir.mkdir()
+        num_failed = _train(instrumented, working_dir, test_ids, jobs,
+                            training_dir)
+        if num_failed:
+            with color_utils.ColorizeStderrWarning():
+                print('Warning:', num_failed, 'of', len(test_ids), 'training',
+                      'runs failed or timed out, so the profile may be',
+                      'incomplete',
+                      file=sys.stderr)
+
+        optimized = _with_flags(prob, env.pgo_use_flags)
+        if not compiler.compile(optimized, working_dir, use_cache=False):
+            return False
+
+        return abtest.abtest(prob, plain_dir, optimized, working_dir,
+                             test_ids, _COMPARE_WARMUPS, _COMPARE_RUNS,
+                             descriptions=('plain build', 'PGO build'))
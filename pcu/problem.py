@@ -1,5 +1,7 @@
+import copy
 import datetime
 import filelock
+import hashlib
 import os
 import pathlib
 import shutil
@@ -11,9 +13,19 @@ from . import color_utils
 from . import config
 from . import environment
 from . import paths
+from . import snapshot
+from . import testcase_store
 from . import yaml_util
 
 
+_SETTINGS_FILE = 'problem_settings.yaml'
+_SETTINGS_SNAPSHOT_FILE = '.problem_settings.pickle'
+
+
+def problem_exists(name: str) -> bool:
+    return (paths.problem_path(name) / _SETTINGS_FILE).is_file()
+
+
 class ProblemAlreadyLocked(RuntimeError):
     def __init__(self, problem_name: str, lock_path: Union[str, pathlib.Path]
     ) -> None:
@@ -40,19 +52,24 @@ class Problem(object):
         env: Optional[environment.Environment] = None,
         clean: bool = False,
         delete_on_exit: bool = False,
+        storage: Optional[str] = None,
         die_on_exc_types: Iterable[Type[BaseException]] = [ProblemAlreadyLocked, ProblemSettingsNotFound],
     ) -> None:
         self.name = name
         self.original_env = env
         self._clean = clean
         self._delete_on_exit = delete_on_exit
+        self._requested_storage = storage
         self._die_on_exc_types = tuple(die_on_exc_types)
 
         # Prepare paths
         self.path = paths.problem_path(self.name)
-        self._settings_path = self.path / 'problem_settings.yaml'
+        self._settings_path = self.path / _SETTINGS_FILE
+        self._settings_snapshot_path = self.path / _SETTINGS_SNAPSHOT_FILE
         self._lock_path = paths.lock_path('problem.' + self.name)
         self._testcases_path = self.path / 'testcases'
+        self.bench_path = self.path / 'bench'
+        self.history_path = self.path / 'history.jsonl'
 
         # Defaults
         self.env_overrides = {}  # type: Dict
@@ -61,6 +78,10 @@ class Problem(object):
         self._lock = None  # type: Optional[filelock.FileLock]
         self._acquired = False  # type: bool
         self.env = None  # type: Optional[environment.Environment]
+        self._saved_settings_dict = None  # type: Optional[Dict]
+        self.storage = testcase_store.FILES
+        self.store = testcase_store.FilesTestCaseStore(
+            self._testcases_path)  # type: testcase_store.TestCaseStore
 
         # Set by _update_mapping
         self.mapping = None  # type: Optional[Dict[str, str]]
@@ -74,42 +95,79 @@ class Problem(object):
         return string.Template(s).safe_substitute(self.mapping)
 
     def get_test_ids(self) -> List[str]:
-        result = []
-        for child in self._testcases_path.iterdir():
-            if child.is_file() and child.suffix == '.in':
-                result.append(child.stem)
-        return sorted(result)
+        return self.store.get_test_ids()
 
+    # Paths to read test case files from, whatever the storage (see
+    # TestCaseStore.view_path). New code should go through self.store.
     def get_test_input_path(self, test_id: str) -> pathlib.Path:
-        return self._testcases_path / (test_id + '.in')
+        return self.store.view_path(test_id, testcase_store.INPUT)
 
     def get_test_answer_path(self, test_id: str) -> pathlib.Path:
-        return self._testcases_path / (test_id + '.ans')
+        return self.store.view_path(test_id, testcase_store.ANSWER)
 
     def get_test_output_path(self, test_id: str) -> pathlib.Path:
-        return self._testcases_path / (test_id + '.out')
+        return self.store.view_path(test_id, testcase_store.OUTPUT)
 
     def get_test_error_path(self, test_id: str) -> pathlib.Path:
-        return self._testcases_path / (test_id + '.err')
+        return self.store.view_path(test_id, testcase_store.ERROR)
 
     def update_env(self) -> None:
+        self._apply_env()
+        self._write_settings_dict()
+
+    def _apply_env(self) -> None:
         env_dict = self.original_env.to_dict()
         env_dict.update(self.env_overrides)
         self.env = environment.Environment.from_dict(env_dict)
         self._update_mapping()
-        self._write_settings_dict()
+
+    def variant(self,
+                env: Optional[environment.Environment] = None,
+                source_file: Optional[str] = None,
+                env_overrides: Optional[Dict] = None,
+    ) -> 'Problem':
+        # A view of this (entered) problem with a different environment,
+        # source file and/or environment settings, sharing its test cases.
+        # Nothing about the variant is saved, and it must not be used as a
+        # context manager.
+        prob = copy.copy(self)
+        prob.env_overrides = dict(self.env_overrides)
+        if env is not None:
+            prob.original_env = env
+        if source_file is not None:
+            prob.env_overrides['source_file'] = source_file
+        if env_overrides is not None:
+            prob.env_overrides.update(env_overrides)
+        prob._apply_env()
+        return prob
 
     def _get_settings_dict(self) -> Dict:
         d = {
             'env_name': self.original_env.name,
             'env_overrides': self.env_overrides,
+            'storage': self.storage,
         }
         return d
 
+    def _read_settings_dict(self) -> Dict:
+        # Every command reads the settings file, so keep what it parses to,
+        # which saves importing YAML until it's changed.
+        with open(self._settings_path, 'rb') as infile:
+            data = infile.read()
+        key = hashlib.sha256(data).hexdigest()
+        settings_dict = snapshot.load(self._settings_snapshot_path, key, dict)
+        if settings_dict is None:
+            settings_dict = yaml_util.load_dict(data.decode())
+            snapshot.store(self._settings_snapshot_path, key, settings_dict)
+        return settings_dict
+
     def _write_settings_dict(self) -> None:
         settings_dict = self._get_settings_dict()
+        if settings_dict == self._saved_settings_dict:
+            return
         with open(self._settings_path, 'w') as outfile:
             yaml_util.write_dict(settings_dict, outfile)
+        self._saved_settings_dict = copy.deepcopy(settings_dict)
 
     def _update_mapping(self) -> None:
         settings = config.get_settings()
@@ -125,6 +183,7 @@ class Problem(object):
             'PCU_ENV_NAME': self.env.name,
             'PCU_COMPILE_TIMELIMIT_MSEC': str(self.env.compile_timelimit_msec),
             'PCU_RUN_TIMELIMIT_MSEC': str(self.env.run_timelimit_msec),
+            'PCU_RUN_MEMLIMIT_MB': str(self.env.run_memlimit_mb),
             'PCU_FORMAT_STRICTNESS': self.env.format_strictness.name,
         }
 
@@ -132,6 +191,9 @@ class Problem(object):
         self.mapping['PCU_SOURCE_FILE'] = self.source_file
         self.mapping['PCU_SOURCE_FILE_NOEXT'] = os.path.splitext(self.source_file)[0]
 
+        # Only set for profile-guided optimization builds (see pgo.py)
+        self.mapping['PCU_PGO_FLAGS'] = ''
+
         self.compile_command = self.sub_params(self.env.compile_command_p)
         self.mapping['PCU_COMPILE_COMMAND'] = self.compile_command
 
@@ -152,17 +214,39 @@ class Problem(object):
         self._testcases_path.mkdir(parents=True, exist_ok=True)
 
         if self._settings_path.is_file():
-            with open(self._settings_path, 'r') as infile:
-                data_dict = yaml_util.load_dict(infile.read())
-                self.original_env = config.get_settings().get_env(
-                    data_dict['env_name'])
-                self.env_overrides = data_dict['env_overrides']
+            data_dict = self._read_settings_dict()
+            self._saved_settings_dict = copy.deepcopy(data_dict)
+            self.original_env = config.get_settings().get_env(
+                data_dict['env_name'])
+            self.env_overrides = data_dict['env_overrides']
+            self.storage = data_dict.get('storage', testcase_store.FILES)
         else:
             if self.original_env is None:
                 raise ProblemSettingsNotFound(self.name)
 
+        if (self._requested_storage is not None and
+                self._requested_storage != self.storage):
+            self._convert_storage(self._requested_storage)
+
+        if self.storage == testcase_store.PACKED:
+            self.store = testcase_store.PackedTestCaseStore(
+                self.path / testcase_store.DB_NAME, self._testcases_path)
+
         self.update_env()
 
+    def _convert_storage(self, storage: str) -> None:
+        db_path = self.path / testcase_store.DB_NAME
+        store = testcase_store.PackedTestCaseStore(db_path,
+                                                   self._testcases_path)
+        if storage == testcase_store.PACKED:
+            store.import_files()
+            store.close()
+        else:
+            store.export_files()
+            store.close()
+            db_path.unlink()
+        self.storage = storage
+
     def _acquire_lock(self) -> None:
         try:
             if self._lock is None:
@@ -191,6 +275,8 @@ class Problem(object):
                  exc_val: Optional[Any],
                  exc_tb: Optional[Any],
     ) -> None:
+        self.store.close()
+
         if self._delete_on_exit:
             try:  # best effort delete
                 if self.path.exists():
@@ -0,0 +1,228 @@
+import abc
+import atexit
+import contextlib
+import os
+import pathlib
+import select
+import subprocess
+import sys
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from . import color_utils
+from . import execution
+
+
+# A resident process gets this long to start up before its first case's
+# clock starts.
+_STARTUP_TIMEOUT_SEC = 60.0
+# How often a waiting run checks whether it has been cancelled.
+_CANCEL_POLL_INTERVAL = 0.05
+
+
+class ResidentProcess(abc.ABC):
+    # A helper process that runs test cases on request, talking over its
+    # stdin and stdout one line at a time. It announces itself with a READY
+    # line once it has started up; its own stderr goes to log_name in the
+    # working directory. The cases' output goes straight to their files, so
+    # the output limit is only enforced by RLIMIT_FSIZE.
+    def __init__(self,
+                 args: List[str],
+                 cwd: pathlib.Path,
+                 memlimit: Optional[int],
+                 output_limit: Optional[int],
+                 log_name: str,
+    ) -> None:
+        self.cwd = cwd
+        self.log_path = cwd / log_name
+        self._args = args
+        self._memlimit = memlimit
+        self._output_limit = output_limit
+        self._process = None  # type: Optional[subprocess.Popen]
+        self._buffer = b''
+        self._ready = False
+        self._spawn()
+
+    def _spawn(self) -> None:
+        with open(self.log_path, 'wb') as log:
+            self._process = subprocess.Popen(self._args,
+                cwd=self.cwd,
+                stdin=subprocess.PIPE,
+                stdout=subprocess.PIPE,
+                stderr=log,
+                preexec_fn=execution.limits_preexec_fn(
+                    self._memlimit, output_limit=self._output_limit))
+        self._buffer = b''
+        self._ready = False
+
+    def close(self) -> None:
+        if self._process is not None:
+            with contextlib.suppress(OSError):
+                self._process.kill()
+            self._process.wait()
+            for pipe in (self._process.stdin, self._process.stdout):
+                if pipe is not None:
+                    with contextlib.suppress(OSError):
+                        pipe.close()
+            self._process = None
+
+    def kill(self) -> None:
+        assert self._process is not None
+        with contextlib.suppress(OSError):
+            self._process.kill()
+
+    def respawn(self) -> int:
+        # Starts a replacement right away, so that it is ready by the time
+        # the next case comes along. Returns the exit code of the process
+        # that ended.
+        assert self._process is not None
+        returncode = self._process.wait()
+        self.close()
+        self._spawn()
+        return returncode
+
+    def send(self, line: str) -> bool:
+        assert self._process is not None and self._process.stdin is not None
+        try:
+            self._process.stdin.write((line + '\n').encode())
+            self._process.stdin.flush()
+        except OSError:
+            return False
+        return True
+
+    def read_line(self,
+                  deadline: Optional[float],
+                  cancel: Optional[threading.Event],
+    ) -> Tuple[Optional[str], str]:
+        # Returns (line, why): why is 'line', 'eof', 'timeout' or 'cancel'.
+        assert self._process is not None and self._process.stdout is not None
+        fd = self._process.stdout.fileno()
+        while b'\n' not in self._buffer:
+            wait_time = None  # type: Optional[float]
+            if deadline is not None:
+                wait_time = max(0.0, deadline - time.monotonic())
+            if cancel is not None:
+                wait_time = (_CANCEL_POLL_INTERVAL
+                             if wait_time is None else
+                             min(wait_time, _CANCEL_POLL_INTERVAL))
+            readable, _, _ = select.select([fd], [], [], wait_time)
+            if not readable:
+                if cancel is not None and cancel.is_set():
+                    return None, 'cancel'
+                if deadline is not None and time.monotonic() >= deadline:
+                    return None, 'timeout'
+                continue
+            data = os.read(fd, 4096)
+            if not data:
+                return None, 'eof'
+            self._buffer += data
+
+        line, _, self._buffer = self._buffer.partition(b'\n')
+        return line.decode(), 'line'
+
+    @abc.abstractmethod
+    def run(self,
+            stdin_path: str,
+            stdout_path: str,
+            stderr_path: str,
+            timeout: Optional[float],
+            cancel: Optional[threading.Event],
+    ) -> execution.ExecResult:
+        # Runs one case with its standard streams redirected from and to the
+        # given files.
+        pass
+
+    def wait_ready(self, cancel: Optional[threading.Event]) -> str:
+        while not self._ready:
+            line, why = self.read_line(
+                time.monotonic() + _STARTUP_TIMEOUT_SEC, cancel)
+            if line is None:
+                return why
+            self._ready = line == 'READY'
+        return 'line'
+
+    def died(self, stderr_path: str, elapsed: float) -> execution.ExecResult:
+        # For when the process ended without answering (e.g. it couldn't
+        # start, or crashed); its own output says why.
+        with open(self.log_path, 'rb') as log, \
+                open(stderr_path, 'ab') as outfile:
+            outfile.write(log.read())
+        return execution.ExecResult(
+            returncode=self.respawn(),
+            timed_out=False,
+            wall_time=elapsed,
+            cpu_time=elapsed,
+            max_rss=0)
+
+
+# Resident processes by working directory, command, memory limit and output
+# limit
+_ProcessKey = Tuple[str, Tuple[str, ...], Optional[int], Optional[int]]
+_processes = {}  # type: Dict[_ProcessKey, ResidentProcess]
+_processes_lock = threading.Lock()
+_warned_commands = set()  # type: set
+
+
+def get_process(args: List[str],
+                cwd: pathlib.Path,
+                memlimit: Optional[int],
+                output_limit: Optional[int],
+                factory: Callable[[List[str], pathlib.Path, Optional[int],
+                                   Optional[int]],
+                                  ResidentProcess],
+) -> ResidentProcess:
+    # One process per working directory and command. Each working directory
+    # is used by one thread at a time, and so is its process.
+    key = (str(cwd), tuple(args), memlimit, output_limit)
+    with _processes_lock:
+        # Working directories are temporary; retire the processes of old
+        # ones.
+        for old_key in [k for k in _processes if not os.path.isdir(k[0])]:
+            _processes.pop(old_key).close()
+        if key not in _processes:
+            _processes[key] = factory(args, cwd, memlimit, output_limit)
+        return _processes[key]
+
+
+def close_all() -> None:
+    with _processes_lock:
+        for process in _processes.values():
+            process.close()
+        _processes.clear()
+
+
+atexit.register(close_all)
+
+
+def _file_path(file: Any) -> Optional[str]:
+    if file == subprocess.DEVNULL:
+        return os.devnull
+    name = getattr(file, 'name', None)
+    if not isinstance(name, str):
+        return None
+    return os.path.abspath(name)
+
+
+def file_paths(stdin: Any,
+               stdout: Any,
+               stderr: Any,
+) -> Optional[Tuple[str, str, str]]:
+    # Where a case's standard streams come from and go to, for a resident
+    # process to open; None unless they're all files.
+    stdin_path, stdout_path, stderr_path = (
+        _file_path(file) for file in (stdin, stdout, stderr))
+    if stdin_path is None or stdout_path is None or stderr_path is None:
+        return None
+    return stdin_path, stdout_path, stderr_path
+
+
+def warn_fallback(run_command: str, what: str, reason: str) -> None:
+    with _processes_lock:
+        if run_command in _warned_commands:
+            return
+        _warned_commands.add(run_command)
+    with color_utils.ColorizeStderrWarning():
+        print('Warning: not using', what, 'for', repr(run_command),
+              '({}); running it normally'.format(reason),
+              file=sys.stderr)
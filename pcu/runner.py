@@ -1,19 +1,30 @@
 import collections
-import difflib
+import concurrent.futures
+import contextlib
 import enum
-import inflection
 import itertools
 import os
 import pathlib
-import shutil
+import queue
+import signal
 import subprocess
 import sys
-from typing import DefaultDict, IO, Iterable, List, Optional
+import tempfile
+import threading
+from typing import (
+    Any, Collection, DefaultDict, Dict, IO, Iterable, List, Optional, Tuple)
 
 from . import color_utils
+from . import compare
+from . import compiler
 from . import config
 from . import environment
+from . import execution
+from . import forkserver
+from . import jvm
 from . import problem
+from . import testcase_store
+from . import yaml_util
 
 
 class TestCaseResult(enum.Enum):
@@ -23,6 +34,8 @@ class TestCaseResult(enum.Enum):
     PRESENTATION_ERROR = enum.auto()
     NO_OUTPUT_FILE_PRODUCED = enum.auto()
     TIME_LIMIT_EXCEEDED = enum.auto()
+    MEMORY_LIMIT_EXCEEDED = enum.auto()
+    OUTPUT_LIMIT_EXCEEDED = enum.auto()
     RUNTIME_ERROR = enum.auto()
 
     def get_colorize_colors(self) -> List:
@@ -34,6 +47,11 @@ class TestCaseResult(enum.Enum):
             return [color_utils.Fore.RED]
 
 
+def humanize(result: TestCaseResult) -> str:
+    import inflection  # slow to import, and only needed for reports
+    return inflection.humanize(result.name)
+
+
 def _print_truncate(
     lines: Iterable,
     max_lines: int,
@@ -48,10 +66,122 @@ def _print_truncate(
                 outfile.write('<EOF>\n')
 
 
+_NUM_SLOWEST_CASES = 5
+
+
+class CaseReport(object):
+    def __init__(self,
+                 result: TestCaseResult,
+                 exec_result: Optional[execution.ExecResult] = None,
+                 mismatch: Optional[compare.Mismatch] = None,
+    ) -> None:
+        self.result = result
+        self.exec_result = exec_result
+        self.mismatch = mismatch
+
+
+def _format_size(num_bytes: int) -> str:
+    return '{:.1f} MB'.format(num_bytes / (1024.0 * 1024.0))
+
+
+def _format_resources(exec_result: execution.ExecResult) -> str:
+    return '{:.3f} s wall, {:.3f} s cpu, {} peak memory'.format(
+        exec_result.wall_time, exec_result.cpu_time,
+        _format_size(exec_result.max_rss))
+
+
+class RunReport(object):
+    def __init__(self) -> None:
+        self.cases = {}  # type: Dict[str, CaseReport]
+        self.cancelled = False
+        self.jobs = 1
+
+    def get_failed_test_ids(self) -> List[str]:
+        return sorted(test_id for test_id, report in self.cases.items()
+                      if report.result not in (
+                          TestCaseResult.CORRECT,
+                          TestCaseResult.NO_ANSWER_FILE_PROVIDED))
+
+
+# In timelimit_mode: cpu, a run may take this many times the time limit in
+# wall time (e.g. if it sleeps or waits on I/O) before it is stopped.
+_CPU_MODE_WALL_FACTOR = 3
+
+
+def timelimit(prob: problem.Problem) -> float:
+    # In seconds, scaled from the judge's time to this machine's.
+    return (prob.env.run_timelimit_msec * 0.001 *
+            config.get_settings().speed_factor)
+
+
+def _describe_timelimit(prob: problem.Problem) -> str:
+    description = '{:.3f} s {}'.format(timelimit(prob),
+                                       prob.env.timelimit_mode.name.lower())
+    speed_factor = config.get_settings().speed_factor
+    if speed_factor != 1:
+        description += (' ({:.3f} s on the judge, times speed factor '
+                        '{:g})'.format(prob.env.run_timelimit_msec * 0.001,
+                                       speed_factor))
+    return description
+
+
+def run_program(prob: problem.Problem,
+                working_dir: pathlib.Path,
+                stdin: Any,
+                stdout: Any,
+                stderr: Any,
+                cancel: Optional[threading.Event] = None,
+) -> execution.ExecResult:
+    # Runs the compiled program once, under the environment's limits and
+    # in the way its run_mode asks for.
+    timeout = timelimit(prob)
+    cpu_limit = None  # type: Optional[float]
+    if prob.env.timelimit_mode == environment.TimelimitMode.CPU:
+        cpu_limit = timeout
+        timeout *= _CPU_MODE_WALL_FACTOR
+    memlimit = prob.env.run_memlimit_mb * 1024 * 1024
+    output_limit = prob.env.output_limit_mb * 1024 * 1024
+
+    exec_result = None  # type: Optional[execution.ExecResult]
+    resident_run = {
+        environment.RunMode.JVM: jvm.run,
+        environment.RunMode.FORKSERVER: forkserver.run,
+    }.get(prob.env.run_mode)
+    if resident_run is not None:
+        exec_result = resident_run(prob.run_command,
+            cwd=working_dir,
+            stdin=stdin,
+            stdout=stdout,
+            stderr=stderr,
+            timeout=timeout,
+            memlimit=memlimit,
+            cancel=cancel,
+            output_limit=output_limit)
+    if exec_result is None:
+        exec_result = execution.run_process(prob.run_command,
+            cwd=working_dir,
+            stdin=stdin,
+            stdout=stdout,
+            stderr=stderr,
+            timeout=timeout,
+            memlimit=memlimit,
+            cancel=cancel,
+            cpu_limit=cpu_limit,
+            output_limit=output_limit,
+            error_max_lines=config.get_settings().max_lines_error)
+
+    if cpu_limit is not None and exec_result.cpu_time > cpu_limit:
+        exec_result.timed_out = True
+    return exec_result
+
+
 def run_cases(prob: problem.Problem,
               working_dir: pathlib.Path,
               test_ids: Iterable[str],
-) -> bool:
+              jobs: int = 1,
+              cancel: Optional[threading.Event] = None,
+              priority_test_ids: Collection[str] = (),
+) -> Optional[RunReport]:
     assert(working_dir.is_dir())
 
     with color_utils.ColorizeStderrBar1():
@@ -60,13 +190,16 @@ def run_cases(prob: problem.Problem,
     print('Command:', prob.run_command,
           file=sys.stderr)
 
-    test_ids = sorted(test_ids)
+    run_report = RunReport()
+    test_ids = sorted(test_ids,
+                      key=lambda test_id: (test_id not in priority_test_ids,
+                                           test_id))
     if not test_ids:
         with color_utils.ColorizeStderrWarning():
             print('No test cases to run! Generate some with '
                   '"pcu setin" and "pcu setans".',
                   file=sys.stderr)
-        return True
+        return run_report
 
     prob_test_ids = set(prob.get_test_ids())
     for test_id in test_ids:
@@ -75,76 +208,172 @@ def run_cases(prob: problem.Problem,
                 print('ERROR: Test case', test_id, 'not found for problem',
                       prob.name,
                       file=sys.stderr)
-                return False
+                return None
 
+    jobs = max(1, min(jobs, len(test_ids)))
+    run_report.jobs = jobs
     print('Number of testcases:', len(test_ids),
           file=sys.stderr)
+    print('Time limit:', _describe_timelimit(prob),
+          file=sys.stderr)
+    if jobs > 1:
+        print('Parallel jobs:', jobs,
+              file=sys.stderr)
+        if prob.env.timelimit_mode == environment.TimelimitMode.WALL:
+            # Cases running side by side slow each other down, so one close
+            # to a wall-clock limit may pass or not from run to run.
+            with color_utils.ColorizeStderrWarning():
+                print('Warning: parallel cases share the CPU, so wall-clock',
+                      'times near the limit may vary; use -j 1 or',
+                      'timelimit_mode cpu for verdicts to rely on',
+                      file=sys.stderr)
 
+    with tempfile.TemporaryDirectory() as temp_dir:
+        # Each worker gets a private view of the compiled program, since
+        # cases write their stdout/stderr (and maybe input/output files)
+        # into the working directory.
+        worker_dirs = queue.Queue()  # type: queue.Queue
+        if jobs == 1:
+            worker_dirs.put(working_dir)
+        else:
+            for i in range(jobs):
+                worker_dir = pathlib.Path(temp_dir) / 'worker{}'.format(i)
+                compiler.clone_working_dir(working_dir, worker_dir)
+                worker_dirs.put(worker_dir)
+
+        def run_in_worker(test_id: str) -> Optional[CaseReport]:
+            if cancel is not None and cancel.is_set():
+                return None
+            worker_dir = worker_dirs.get()
+            try:
+                return run_case(prob, worker_dir, test_id, cancel)
+            finally:
+                worker_dirs.put(worker_dir)
+
+        pool = concurrent.futures.ThreadPoolExecutor(max_workers=jobs)
+        try:
+            futures = [pool.submit(run_in_worker, test_id)
+                       for test_id in test_ids]
+
+            # Results may come back in any order; report them in run order.
+            for test_id, future in zip(test_ids, futures):
+                with color_utils.ColorizeStderrBar2():
+                    print('->', 'Test case', test_id, '-' * 20,
+                          file=sys.stderr)
+                report = future.result()
+                if report is None:
+                    run_report.cancelled = True
+                    with color_utils.ColorizeStderrWarning():
+                        print('Run cancelled.',
+                              file=sys.stderr)
+                    return run_report
+
+                _print_case_report(prob, test_id, report)
+                run_report.cases[test_id] = report
+
+                with color_utils.ColorizeStderr(
+                        *report.result.get_colorize_colors()):
+                    print('Status:', humanize(report.result))
+
+        finally:
+            pool.shutdown(wait=True, cancel_futures=True)
+
+    _print_summary(run_report)
+    return run_report
+
+
+def _print_summary(run_report: RunReport) -> None:
     result_counts = \
         collections.defaultdict(int)  # type: DefaultDict[TestCaseResult, int]
-
-    for test_id in test_ids:
-        with color_utils.ColorizeStderrBar2():
-            print('->', 'Test case', test_id, '-' * 20,
-                  file=sys.stderr)
-        test_result = _run_case(prob, working_dir, test_id)
-        result_counts[test_result] += 1
-
-        with color_utils.ColorizeStderr(*test_result.get_colorize_colors()):
-            print('Status:', inflection.humanize(test_result.name))
+    exec_results = {}  # type: Dict[str, execution.ExecResult]
+    for test_id, report in run_report.cases.items():
+        result_counts[report.result] += 1
+        if report.exec_result is not None:
+            exec_results[test_id] = report.exec_result
 
     with color_utils.ColorizeStderrBar2():
         print('-' * 16, 'Summmary', '-' * 16,
               file=sys.stderr)
 
+    num_cases = len(run_report.cases)
     for value in TestCaseResult:
         with color_utils.ColorizeStderr(*value.get_colorize_colors()):
-            print('{:25}'.format(inflection.humanize(value.name)),
+            print('{:25}'.format(humanize(value)),
                   file=sys.stderr, end='')
             print('{:>7} ({:5.1f}%)'.format(result_counts[value],
-                                   result_counts[value] * 100.0 / len(test_ids)),
+                                   result_counts[value] * 100.0 / num_cases),
               file=sys.stderr)
 
-    return True
+    if exec_results:
+        _print_resource_summary(exec_results)
 
 
-def _run_case(prob: problem.Problem,
-              working_dir: pathlib.Path,
-              test_id: str
-) -> TestCaseResult:
-    settings = config.get_settings()
+def _print_resource_summary(exec_results: Dict[str, execution.ExecResult],
+) -> None:
+    slowest = sorted(exec_results,
+                     key=lambda test_id: exec_results[test_id].wall_time,
+                     reverse=True)[:_NUM_SLOWEST_CASES]
+    print('Slowest test cases:',
+          file=sys.stderr)
+    for test_id in slowest:
+        print('  {:23} {}'.format(
+                  test_id, _format_resources(exec_results[test_id])),
+              file=sys.stderr)
+
+    max_rss_test_id = max(exec_results,
+                          key=lambda test_id: exec_results[test_id].max_rss)
+    print('{:25} {:>7} ({})'.format(
+              'Max memory',
+              _format_size(exec_results[max_rss_test_id].max_rss),
+              max_rss_test_id),
+          file=sys.stderr)
 
-    test_input_path = prob.get_test_input_path(test_id)
-    test_output_path = prob.get_test_output_path(test_id)
-    test_error_path = prob.get_test_error_path(test_id)
-    test_answer_path = prob.get_test_answer_path(test_id)
-    assert test_input_path.is_file()
 
-    sp_result = None
+def run_case(prob: problem.Problem,
+              working_dir: pathlib.Path,
+              test_id: str,
+              cancel: Optional[threading.Event] = None,
+              outputs_path: Optional[pathlib.Path] = None,
+) -> Optional[CaseReport]:
+    # The run's output, stderr and stats are saved with the test case, or
+    # if outputs_path is given, in files of their own in that directory.
+    store = prob.store
+    outputs_store = store  # type: testcase_store.TestCaseStore
+    if outputs_path is not None:
+        outputs_store = testcase_store.FilesTestCaseStore(outputs_path)
+    assert store.exists(test_id, testcase_store.INPUT)
+
+    exec_result = None
     input_file = None
     pcu_stdout_path = working_dir / '.pcu_stdout'
     pcu_stderr_path = working_dir / '.pcu_stderr'
+    run_output_path = pcu_stdout_path
+    if prob.output_file != 'PCU_STDOUT':
+        run_output_path = working_dir / prob.output_file
+        # Don't mistake the previous case's output for this one's.
+        with contextlib.suppress(FileNotFoundError):
+            run_output_path.unlink()
+
     try:
         with open(pcu_stdout_path, 'wb') as stdout, \
                 open(pcu_stderr_path, 'wb') as stderr:
             stdin = subprocess.DEVNULL
             if prob.input_file == 'PCU_STDIN':
-                input_file = open(test_input_path, 'rb')
+                input_file = open(store.readable_path(
+                    test_id, testcase_store.INPUT,
+                    working_dir / '.pcu_stdin'), 'rb')
                 stdin = input_file
             else:
-                shutil.copy2(
-                    test_input_path, working_dir / prob.input_file)
+                # Unlink first: the working directory may be a hardlinked
+                # view shared with other workers.
+                input_copy_path = working_dir / prob.input_file
+                with contextlib.suppress(FileNotFoundError):
+                    input_copy_path.unlink()
+                store.copy_to(test_id, testcase_store.INPUT,
+                              input_copy_path)
 
-            try:
-                sp_result = subprocess.run(prob.run_command,  # type: ignore
-                    cwd=working_dir,
-                    stdin=stdin,
-                    stdout=stdout,
-                    stderr=stderr,
-                    timeout=prob.env.run_timelimit_msec * 0.001,
-                    shell=True)
-            except subprocess.TimeoutExpired:
-                return TestCaseResult.TIME_LIMIT_EXCEEDED
+            exec_result = run_program(prob, working_dir, stdin, stdout,
+                                      stderr, cancel)
 
     finally:
         if input_file is not None:
@@ -153,86 +382,195 @@ def _run_case(prob: problem.Problem,
             except Exception:
                 pass
 
+    assert exec_result is not None
+    if exec_result.cancelled:
+        return None
+    _write_stats(outputs_store, test_id, exec_result)
+
+    answer_path = None  # type: Optional[pathlib.Path]
+    if store.exists(test_id, testcase_store.ANSWER):
+        answer_path = store.readable_path(test_id, testcase_store.ANSWER,
+                                          working_dir / '.pcu_answer')
+    report = judge(prob, exec_result, run_output_path, answer_path)
+    if report.result in _CHECKED_RESULTS:
+        # Moved rather than copied where the store keeps plain files: the
+        # output may be large.
+        outputs_store.put(test_id, testcase_store.OUTPUT, run_output_path)
+        outputs_store.put(test_id, testcase_store.ERROR, pcu_stderr_path)
+    return report
+
+
+# Results of runs whose output got as far as being checked.
+_CHECKED_RESULTS = (
+    TestCaseResult.CORRECT,
+    TestCaseResult.NO_ANSWER_FILE_PROVIDED,
+    TestCaseResult.WRONG_ANSWER,
+    TestCaseResult.PRESENTATION_ERROR,
+)
+
+
+def judge(prob: problem.Problem,
+          exec_result: execution.ExecResult,
+          output_path: pathlib.Path,
+          answer_path: Optional[pathlib.Path],
+) -> CaseReport:
+    # The verdict on a finished run of the program, given where its output
+    # went, and the answer file if there is one.
+
     # Handle some edge cases
-    assert sp_result is not None
-    if sp_result.returncode != 0:
-        print('Exit code', sp_result.returncode,
-              file=sys.stderr)
-        return TestCaseResult.RUNTIME_ERROR
+    if _exceeded_output_limit(prob, exec_result, output_path):
+        return CaseReport(TestCaseResult.OUTPUT_LIMIT_EXCEEDED, exec_result)
 
-    run_output_path = pcu_stdout_path
-    if prob.output_file != 'PCU_STDOUT':
-        run_output_path = working_dir / prob.output_file
-    if not run_output_path.is_file():
-        return TestCaseResult.NO_OUTPUT_FILE_PRODUCED
-    shutil.copy2(run_output_path, test_output_path)
-    shutil.copy2(pcu_stderr_path, test_error_path)
+    if exec_result.timed_out:
+        return CaseReport(TestCaseResult.TIME_LIMIT_EXCEEDED, exec_result)
 
-    # Edge cases are handled, time for the fun stuff now
-    with open(test_output_path, 'r') as infile:
-        actual_output = infile.read()
-        actual_output_lines = actual_output.splitlines()
-    result = None
-    expected_output = None
+    if _exceeded_memlimit(prob, exec_result):
+        return CaseReport(TestCaseResult.MEMORY_LIMIT_EXCEEDED, exec_result)
+
+    if exec_result.returncode != 0:
+        return CaseReport(TestCaseResult.RUNTIME_ERROR, exec_result)
+
+    if not output_path.is_file():
+        return CaseReport(TestCaseResult.NO_OUTPUT_FILE_PRODUCED, exec_result)
 
     # If no answer file was provided, then we should exit after printing
     # the output/error preview.
-    if not test_answer_path.is_file():
-        result = TestCaseResult.NO_ANSWER_FILE_PROVIDED
+    if answer_path is None:
+        return CaseReport(TestCaseResult.NO_ANSWER_FILE_PROVIDED, exec_result)
 
-    else:
-        with open(test_answer_path, 'r') as infile:
-            expected_output = infile.read()
-            expected_output_lines = expected_output.splitlines()
-
-        match_exact = expected_output == actual_output
-        match_minus_whitespace = match_exact or \
-            (''.join(expected_output.split()) ==
-             ''.join(actual_output.split()))
-
-        # Figure out the disposition of the test case.
-        if prob.env.format_strictness == environment.FormatStrictness.LAX:
-            result = (TestCaseResult.CORRECT
-                      if match_minus_whitespace
-                      else TestCaseResult.WRONG_ANSWER)
-        else:
-            assert prob.env.format_strictness == environment.FormatStrictness.STRICT
-            result = (TestCaseResult.CORRECT
-                      if match_exact
-                      else (TestCaseResult.PRESENTATION_ERROR
-                            if match_minus_whitespace
-                            else TestCaseResult.WRONG_ANSWER))
+    # Edge cases are handled, time for the fun stuff now
+    result, mismatch = check_output(prob.env.format_strictness,
+                                    answer_path, output_path)
+    return CaseReport(result, exec_result, mismatch)
+
+
+def check_output(format_strictness: environment.FormatStrictness,
+                 answer_path: pathlib.Path,
+                 output_path: pathlib.Path,
+) -> Tuple[TestCaseResult, Optional[compare.Mismatch]]:
+    comparison = compare.compare_files(answer_path, output_path)
+
+    # Figure out the disposition of the test case.
+    if format_strictness == environment.FormatStrictness.LAX:
+        if comparison.match_minus_whitespace:
+            return TestCaseResult.CORRECT, None
+        return TestCaseResult.WRONG_ANSWER, comparison.whitespace_mismatch
+
+    assert format_strictness == environment.FormatStrictness.STRICT
+    if comparison.match_exact:
+        return TestCaseResult.CORRECT, None
+    if comparison.match_minus_whitespace:
+        return TestCaseResult.PRESENTATION_ERROR, comparison.exact_mismatch
+    return TestCaseResult.WRONG_ANSWER, comparison.whitespace_mismatch
+
+
+def _exceeded_memlimit(prob: problem.Problem,
+                       exec_result: execution.ExecResult,
+) -> bool:
+    # A run that failed after an allocation failed under RLIMIT_AS (or its
+    # peak RSS reached the limit), as the launcher or the fork server saw
+    # it. What the program printed doesn't come into it.
+    return (bool(prob.env.run_memlimit_mb) and exec_result.returncode != 0
+            and exec_result.memlimit_exceeded)
+
+
+def _exceeded_output_limit(prob: problem.Problem,
+                           exec_result: execution.ExecResult,
+                           output_path: pathlib.Path,
+) -> bool:
+    output_limit = prob.env.output_limit_mb * 1024 * 1024
+    if not output_limit:
+        return False
+    if exec_result.output_limit_exceeded:
+        return True
+    # Output written straight to a file (output_file, or a resident
+    # run_mode) is cut off by RLIMIT_FSIZE one byte past the limit: the
+    # program gets SIGXFSZ, or a write error if it ignores that.
+    if exec_result.returncode == -signal.SIGXFSZ:
+        return True
+    with contextlib.suppress(FileNotFoundError):
+        return os.path.getsize(output_path) > output_limit
+    return False
+
+
+def _write_stats(store: testcase_store.TestCaseStore,
+                 test_id: str,
+                 exec_result: execution.ExecResult,
+) -> None:
+    stats = {
+        'exit_code': exec_result.returncode,
+        'timed_out': exec_result.timed_out,
+        'wall_time_sec': round(exec_result.wall_time, 6),
+        'cpu_time_sec': round(exec_result.cpu_time, 6),
+        'max_rss_bytes': exec_result.max_rss,
+    }
+    with store.open(test_id, testcase_store.STATS, 'w') as outfile:
+        yaml_util.write_dict(stats, outfile)
+
+
+def _print_case_report(prob: problem.Problem,
+                       test_id: str,
+                       report: CaseReport,
+) -> None:
+    settings = config.get_settings()
+    result = report.result
+    store = prob.store
 
-    # If the program was correct, there's nothing to print.
-    if result == TestCaseResult.CORRECT:
-        return result
+    if report.exec_result is not None:
+        print('Time:', _format_resources(report.exec_result),
+              file=sys.stderr)
+
+    if result in (TestCaseResult.RUNTIME_ERROR,
+                  TestCaseResult.MEMORY_LIMIT_EXCEEDED):
+        print('Exit code', report.exec_result.returncode,
+              file=sys.stderr)
+    if result == TestCaseResult.OUTPUT_LIMIT_EXCEEDED:
+        print('Output limit: {} MB'.format(prob.env.output_limit_mb),
+              file=sys.stderr)
+
+    # Only cases that got as far as checking the output have anything else
+    # to show; if the program was correct, there's nothing to print.
+    if result not in (TestCaseResult.NO_ANSWER_FILE_PROVIDED,
+                      TestCaseResult.WRONG_ANSWER,
+                      TestCaseResult.PRESENTATION_ERROR):
+        return
 
     # print either the output or the diff
     if result == TestCaseResult.NO_ANSWER_FILE_PROVIDED:
         with color_utils.ColorizeStderr(*result.get_colorize_colors()):
-            print(inflection.humanize(result.name), "-- here's the output:",
+            print(humanize(result), "-- here's the output:",
                   file=sys.stderr)
-        with open(test_output_path, 'r') as infile:
+        with store.open(test_id, testcase_store.OUTPUT, 'r') as infile:
             _print_truncate(infile, settings.max_lines_output, sys.stderr)
 
     else:
         with color_utils.ColorizeStderr(*result.get_colorize_colors()):
-            print(inflection.humanize(result.name), "-- here's the diff:",
+            print(humanize(result), "-- here's the diff:",
+                  file=sys.stderr)
+        if report.mismatch is not None:
+            print('First difference at line {}, token {} (byte {}) of the '
+                  'expected output'.format(report.mismatch.line,
+                                           report.mismatch.token,
+                                           report.mismatch.byte_offset),
+                  file=sys.stderr)
+        with tempfile.TemporaryDirectory() as temp_dir:
+            diff = compare.windowed_diff(
+                store.readable_path(test_id, testcase_store.ANSWER,
+                                    pathlib.Path(temp_dir) / 'answer'),
+                store.readable_path(test_id, testcase_store.OUTPUT,
+                                    pathlib.Path(temp_dir) / 'output'),
+                settings.max_lines_output)
+        _print_truncate(diff.lines, settings.max_lines_output, sys.stderr)
+        if diff.further_differences:
+            print('...', diff.further_differences,
+                  'more differing line positions past the diffed window',
+                  '(each line inserted or deleted shifts all later ones)',
                   file=sys.stderr)
-        diff_iter = difflib.unified_diff(
-            expected_output.splitlines(keepends=True),
-            actual_output.splitlines(keepends=True),
-            fromfile='expected output',
-            tofile='actual output',
-            n=(1 ** 30))
-        _print_truncate(diff_iter, settings.max_lines_output, sys.stderr)
 
     # print stderr
-    if os.path.getsize(test_error_path) > 0:
+    if store.size(test_id, testcase_store.ERROR) > 0:
         with color_utils.ColorizeStderr(*result.get_colorize_colors()):
             print("> and here's the stderr:",
                   file=sys.stderr)
-        with open(test_error_path, 'r') as infile:
+        with store.open(test_id, testcase_store.ERROR, 'r') as infile:
             _print_truncate(infile, settings.max_lines_error, sys.stderr)
-
-    return result
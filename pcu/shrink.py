@@ -0,0 +1,158 @@
+import concurrent.futures
+import itertools
+import pathlib
+import queue
+import re
+import sys
+import tempfile
+from typing import Callable, List, Optional
+
+from . import color_utils
+from . import problem
+from . import runner
+from . import solution
+from . import stress
+from . import testcase_store
+
+
+_LINE_RE = re.compile(rb'[^\n]*\n|[^\n]+$')
+# Each token keeps the whitespace after it, so that joining any subset of
+# them gives back well-formed input.
+_TOKEN_RE = re.compile(rb'^\s+|\S+\s*')
+
+
+def _split(items: List[bytes], n: int) -> List[List[bytes]]:
+    size, remainder = divmod(len(items), n)
+    chunks = []
+    start = 0
+    for i in range(n):
+        stop = start + size + (i < remainder)
+        chunks.append(items[start:stop])
+        start = stop
+    return chunks
+
+
+def _ddmin(items: List[bytes],
+           is_failing: Callable[[bytes], bool],
+           pool: concurrent.futures.Executor,
+           jobs: int,
+           describe: Callable[[List[bytes]], None],
+) -> List[bytes]:
+    # Zeller's delta debugging: try removing ever smaller chunks of the
+    # input, keeping any removal after which it still fails. Candidates
+    # are checked a batch of `jobs` at a time, and the first failing one
+    # (in the usual ddmin order) wins.
+    n = 2
+    while len(items) >= 2:
+        chunks = _split(items, min(n, len(items)))
+        candidates = chunks + [
+            list(itertools.chain.from_iterable(chunks[:i] + chunks[i + 1:]))
+            for i in range(len(chunks))]
+        if len(chunks) == 2:
+            candidates = candidates[:2]  # the complements are the chunks
+
+        found = None
+        for batch_start in range(0, len(candidates), jobs):
+            batch = candidates[batch_start:batch_start + jobs]
+            results = pool.map(is_failing, (b''.join(c) for c in batch))
+            found = next((i + batch_start
+                          for i, failing in enumerate(results) if failing),
+                         None)
+            if found is not None:
+                break
+
+        if found is None:
+            if n >= len(items):
+                break
+            n = min(n * 2, len(items))
+            continue
+
+        items = candidates[found]
+        n = 2 if found < len(chunks) else max(n - 1, 2)
+        describe(items)
+    return items
+
+
+def shrink(prob: problem.Problem,
+           candidate: solution.Solution,
+           reference: solution.Solution,
+           test_id: str,
+           jobs: int = 1,
+) -> bool:
+    with prob.store.open(test_id, testcase_store.INPUT) as infile:
+        data = infile.read()
+    original_size = len(data)
+
+    with color_utils.ColorizeStderrBar1():
+        print('=' * 20, 'Shrinking', prob.name, test_id, '=' * 20,
+              file=sys.stderr)
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        scratch_dirs = queue.Queue()  # type: queue.Queue
+        for i in range(jobs):
+            scratch_dir = pathlib.Path(temp_dir) / 'worker{}'.format(i)
+            scratch_dir.mkdir()
+            scratch_dirs.put(scratch_dir)
+
+        def check(data: bytes) -> Optional[runner.TestCaseResult]:
+            scratch_dir = scratch_dirs.get()
+            try:
+                scratch_input_path = scratch_dir / 'input'
+                with open(scratch_input_path, 'wb') as outfile:
+                    outfile.write(data)
+                return stress.check_input(prob, candidate, reference,
+                                          scratch_input_path, scratch_dir)
+            except stress.ReferenceFailed:
+                return None  # e.g. the reference rejects malformed input
+            finally:
+                scratch_dirs.put(scratch_dir)
+
+        original_result = check(data)
+        if original_result in (None, runner.TestCaseResult.CORRECT):
+            with color_utils.ColorizeStderrError():
+                print('ERROR: Test case', test_id, 'does not fail against',
+                      'the reference solution',
+                      file=sys.stderr)
+            return False
+        print('Looking for a smaller input with the same result:',
+              runner.humanize(original_result),
+              file=sys.stderr)
+
+        # Only keep inputs that fail the same way, so that shrinking doesn't
+        # wander off into inputs the solution was never meant to handle.
+        def is_failing(data: bytes) -> bool:
+            return check(data) == original_result
+
+        def describe(items: List[bytes]) -> None:
+            data = b''.join(items)
+            print('  {} lines, {} bytes'.format(data.count(b'\n'), len(data)),
+                  file=sys.stderr)
+
+        pool = concurrent.futures.ThreadPoolExecutor(max_workers=jobs)
+        try:
+            lines = _ddmin(_LINE_RE.findall(data), is_failing, pool, jobs,
+                           describe)
+            tokens = _ddmin(_TOKEN_RE.findall(b''.join(lines)), is_failing,
+                            pool, jobs, describe)
+        finally:
+            pool.shutdown(wait=True, cancel_futures=True)
+        data = b''.join(tokens)
+
+        # Recheck, to get the reference's answer for the final input.
+        scratch_dir = scratch_dirs.get()
+        scratch_input_path = scratch_dir / 'input'
+        with open(scratch_input_path, 'wb') as outfile:
+            outfile.write(data)
+        stress.check_input(prob, candidate, reference, scratch_input_path,
+                           scratch_dir)
+
+        min_test_id = test_id + '_min'
+        prob.store.put(min_test_id, testcase_store.ANSWER,
+                       scratch_dir / 'answer')
+        prob.store.put(min_test_id, testcase_store.INPUT, scratch_input_path)
+
+    with color_utils.ColorizeStderrGood():
+        print('Saved the shrunk input ({} bytes, down from {}) as test case'
+              .format(len(data), original_size), min_test_id,
+              file=sys.stderr)
+    return True
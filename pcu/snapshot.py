@@ -0,0 +1,35 @@
+import os
+import pathlib
+import pickle
+import uuid
+from typing import Any, Type
+
+# Pickled results of parsing a file, kept (under a key that changes with the
+# file) so that it needn't be parsed again until it changes.
+
+
+def load(path: pathlib.Path, key: str, value_type: Type) -> Any:
+    try:
+        with open(path, 'rb') as infile:
+            snapshot_key, value = pickle.load(infile)
+    except Exception:
+        # Missing, truncated or from an incompatible pcu; just rebuild it.
+        return None
+    if snapshot_key != key or not isinstance(value, value_type):
+        return None
+    return value
+
+
+def store(path: pathlib.Path, key: str, value: Any) -> None:
+    temp_path = path.with_name('.tmp-{}'.format(uuid.uuid4().hex))
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(temp_path, 'wb') as outfile:
+            pickle.dump((key, value), outfile,
+                        protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temp_path, path)
+    except OSError:
+        pass  # it's only a cache
+    finally:
+        if temp_path.exists():
+            temp_path.unlink()
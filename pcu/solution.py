@@ -0,0 +1,223 @@
+import abc
+import contextlib
+import os
+import pathlib
+import queue
+import shlex
+import shutil
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+from typing import Any, Iterator, Optional, Union
+
+from . import color_utils
+from . import compiler
+from . import config
+from . import execution
+from . import problem
+from . import runner
+
+
+def run_helper(command: str,
+               cwd: Union[str, pathlib.Path],
+               stdin: Any,
+               stdout: Any,
+               stderr: Any,
+               cancel: Optional[threading.Event] = None,
+) -> execution.ExecResult:
+    # Runs a generator or a reference executable under the helper_* limits,
+    # so that one that loops or floods its output fails rather than hanging
+    # or filling up the disk.
+    settings = config.get_settings()
+    return execution.run_process(command,
+        cwd=cwd,
+        stdin=stdin,
+        stdout=stdout,
+        stderr=stderr,
+        timeout=settings.helper_timelimit_msec * 0.001 or None,
+        memlimit=settings.helper_memlimit_mb * 1024 * 1024,
+        cancel=cancel,
+        output_limit=settings.helper_output_limit_mb * 1024 * 1024)
+
+
+def describe_failure(exec_result: execution.ExecResult) -> str:
+    # Why a run that didn't succeed failed, e.g. "timed out".
+    if exec_result.timed_out:
+        return 'timed out'
+    if (exec_result.output_limit_exceeded or
+            exec_result.returncode == -signal.SIGXFSZ):
+        return 'went over the output limit'
+    return 'finished with exit code {}'.format(exec_result.returncode)
+
+
+class Solution(abc.ABC):
+    # Something that turns an input file into an output file: a compiled pcu
+    # problem or a plain executable. run() may be called from several
+    # threads at once.
+    @abc.abstractmethod
+    def run(self,
+            input_path: pathlib.Path,
+            output_path: pathlib.Path,
+            cancel: Optional[threading.Event] = None,
+            error_path: Optional[pathlib.Path] = None,
+    ) -> execution.ExecResult:
+        # Also writes the stderr to error_path, if given.
+        pass
+
+    @staticmethod
+    def succeeded(exec_result: execution.ExecResult,
+                  output_path: pathlib.Path,
+    ) -> bool:
+        return (not exec_result.timed_out and not exec_result.cancelled and
+                not exec_result.output_limit_exceeded and
+                exec_result.returncode == 0 and output_path.is_file())
+
+
+class ExecutableSolution(Solution):
+    def __init__(self,
+                 executable_path: pathlib.Path,
+                 working_dir: pathlib.Path,
+    ) -> None:
+        self.executable_path = executable_path.resolve()
+        self.working_dir = working_dir
+
+    def run(self,
+            input_path: pathlib.Path,
+            output_path: pathlib.Path,
+            cancel: Optional[threading.Event] = None,
+            error_path: Optional[pathlib.Path] = None,
+    ) -> execution.ExecResult:
+        with contextlib.ExitStack() as stack:
+            stdin = stack.enter_context(open(input_path, 'rb'))
+            stdout = stack.enter_context(open(output_path, 'wb'))
+            stderr = subprocess.DEVNULL  # type: Any
+            if error_path is not None:
+                stderr = stack.enter_context(open(error_path, 'wb'))
+            return run_helper(shlex.quote(str(self.executable_path)),
+                              cwd=self.working_dir,
+                              stdin=stdin,
+                              stdout=stdout,
+                              stderr=stderr,
+                              cancel=cancel)
+
+
+class ProblemSolution(Solution):
+    # Runs a problem's compiled program under its environment's limits and
+    # input/output conventions, like "pcu run" does.
+    def __init__(self,
+                 prob: problem.Problem,
+                 working_dir: pathlib.Path,
+                 jobs: int,
+                 clones_dir: pathlib.Path,
+    ) -> None:
+        self.prob = prob
+        self._worker_dirs = queue.Queue()  # type: queue.Queue
+        if jobs == 1:
+            self._worker_dirs.put(working_dir)
+        else:
+            for i in range(jobs):
+                worker_dir = clones_dir / 'worker{}'.format(i)
+                compiler.clone_working_dir(working_dir, worker_dir)
+                self._worker_dirs.put(worker_dir)
+
+    def run(self,
+            input_path: pathlib.Path,
+            output_path: pathlib.Path,
+            cancel: Optional[threading.Event] = None,
+            error_path: Optional[pathlib.Path] = None,
+    ) -> execution.ExecResult:
+        worker_dir = self._worker_dirs.get()
+        try:
+            return self._run(worker_dir, input_path, output_path, cancel,
+                             error_path)
+        finally:
+            self._worker_dirs.put(worker_dir)
+
+    def _run(self,
+             worker_dir: pathlib.Path,
+             input_path: pathlib.Path,
+             output_path: pathlib.Path,
+             cancel: Optional[threading.Event],
+             error_path: Optional[pathlib.Path],
+    ) -> execution.ExecResult:
+        prob = self.prob
+        run_output_path = None  # type: Optional[pathlib.Path]
+        if prob.output_file != 'PCU_STDOUT':
+            run_output_path = worker_dir / prob.output_file
+            with contextlib.suppress(FileNotFoundError):
+                run_output_path.unlink()
+        with contextlib.suppress(FileNotFoundError):
+            output_path.unlink()
+
+        with contextlib.ExitStack() as stack:
+            stdin = subprocess.DEVNULL
+            if prob.input_file == 'PCU_STDIN':
+                stdin = stack.enter_context(open(input_path, 'rb'))
+            else:
+                input_copy_path = worker_dir / prob.input_file
+                with contextlib.suppress(FileNotFoundError):
+                    input_copy_path.unlink()
+                shutil.copy2(input_path, input_copy_path)
+
+            stdout = subprocess.DEVNULL
+            if run_output_path is None:
+                stdout = stack.enter_context(open(output_path, 'wb'))
+            stderr = subprocess.DEVNULL  # type: Any
+            if error_path is not None:
+                stderr = stack.enter_context(open(error_path, 'wb'))
+
+            exec_result = runner.run_program(prob, worker_dir, stdin, stdout,
+                                             stderr, cancel)
+
+        if run_output_path is not None and run_output_path.is_file():
+            shutil.move(str(run_output_path), str(output_path))
+        return exec_result
+
+
+@contextlib.contextmanager
+def compiled_problem(prob: problem.Problem,
+                     jobs: int,
+                     use_cache: bool = True,
+) -> Iterator[Optional[ProblemSolution]]:
+    with tempfile.TemporaryDirectory() as temp_dir:
+        working_dir = pathlib.Path(temp_dir) / 'compiled'
+        working_dir.mkdir()
+        if not compiler.compile(prob, working_dir, use_cache=use_cache):
+            yield None
+        else:
+            yield ProblemSolution(prob, working_dir, jobs,
+                                  pathlib.Path(temp_dir))
+
+
+@contextlib.contextmanager
+def open_solution(name: str,
+                  jobs: int,
+                  use_cache: bool = True,
+) -> Iterator[Optional[Solution]]:
+    # name is either the path to an executable, or the name of a pcu
+    # problem whose source file is in the current directory.
+    executable_path = pathlib.Path(name)
+    if executable_path.is_file():
+        if not os.access(executable_path, os.X_OK):
+            with color_utils.ColorizeStderrError():
+                print('ERROR:', executable_path, 'must be executable!',
+                      file=sys.stderr)
+            yield None
+            return
+        with tempfile.TemporaryDirectory() as temp_dir:
+            yield ExecutableSolution(executable_path, pathlib.Path(temp_dir))
+        return
+
+    if not problem.problem_exists(name):
+        with color_utils.ColorizeStderrError():
+            print('ERROR:', name, 'is neither an executable file nor a pcu',
+                  'problem',
+                  file=sys.stderr)
+        yield None
+        return
+
+    with problem.Problem(name) as prob:
+        with compiled_problem(prob, jobs, use_cache) as solution:
+            yield solution
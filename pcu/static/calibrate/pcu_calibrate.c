@@ -0,0 +1,92 @@
+/*
+ * Speed benchmark for "pcu calibrate".
+ *
+ * A fixed mix of the work typical solutions do -- integer arithmetic,
+ * random memory access, sorting and floating point -- taking about a second
+ * on a typical machine. It reads no input and prints a checksum, so that it
+ * can be submitted to a judge as is; compare the judge's running time with
+ * the local one to get the speed factor.
+ */
+#include <math.h>
+#include <stdio.h>
+#include <stdlib.h>
+
+typedef unsigned long long u64;
+
+static u64 rng_state = 88172645463325252ULL;
+
+static u64 next_random(void) {
+    rng_state ^= rng_state << 13;
+    rng_state ^= rng_state >> 7;
+    rng_state ^= rng_state << 17;
+    return rng_state;
+}
+
+static u64 integer_arithmetic(void) {
+    u64 sum = 0;
+    for (u64 i = 1; i <= 60000000ULL; i++) {
+        sum += (i * i) % 1000003 ^ (sum >> 3);
+    }
+    return sum;
+}
+
+static u64 memory_access(void) {
+    /* A random cycle through 32 MB, so that most steps miss the cache. */
+    const size_t n = 1 << 22;
+    size_t *next = malloc(n * sizeof(size_t));
+    for (size_t i = 0; i < n; i++) {
+        next[i] = i;
+    }
+    for (size_t i = n - 1; i > 0; i--) {
+        size_t j = next_random() % i;
+        size_t t = next[i];
+        next[i] = next[j];
+        next[j] = t;
+    }
+    u64 sum = 0;
+    size_t p = 0;
+    for (size_t step = 0; step < 8000000; step++) {
+        p = next[p];
+        sum += p;
+    }
+    free(next);
+    return sum;
+}
+
+static int compare_u64(const void *a, const void *b) {
+    u64 x = *(const u64 *) a;
+    u64 y = *(const u64 *) b;
+    return (x > y) - (x < y);
+}
+
+static u64 sorting(void) {
+    const size_t n = 2000000;
+    u64 *values = malloc(n * sizeof(u64));
+    for (size_t i = 0; i < n; i++) {
+        values[i] = next_random();
+    }
+    qsort(values, n, sizeof(u64), compare_u64);
+    u64 sum = 0;
+    for (size_t i = 0; i < n; i += 1000) {
+        sum += values[i];
+    }
+    free(values);
+    return sum;
+}
+
+static u64 floating_point(void) {
+    double x = 0.0;
+    for (int i = 1; i <= 30000000; i++) {
+        x += sqrt((double) i) / (1.0 + x * 1e-9);
+    }
+    return (u64) x;
+}
+
+int main(void) {
+    u64 checksum = integer_arithmetic();
+    checksum ^= memory_access();
+    checksum ^= sorting();
+    checksum ^= floating_point();
+    printf("%llu\n", checksum);
+    return 0;
+}
@@ -0,0 +1,219 @@
+# Fork server for pcu's "forkserver" run mode (see pcu/forkserver.py). Runs
+# under both Python 2 and 3, whichever the environment uses.
+#
+# Usage: python [options] -c "<this file>" SCRIPT [ARGS]
+#
+# Imports the modules that solutions commonly use and compiles SCRIPT, then
+# prints READY on stdout and reads one request per line from stdin:
+#
+#     RUN <tab> stdin path <tab> stdout path <tab> stderr path
+#
+# For each, it forks a child that runs SCRIPT as __main__, with its standard
+# streams bound to those files, and answers
+#
+#     STARTED <tab> child pid
+#     DONE <tab> exit code (or -signal) <tab> wall ns <tab> cpu ns
+#          <tab> peak RSS bytes <tab> 1 if out of memory, else 0
+#
+# Out of memory means that the child died of a MemoryError (which the
+# interpreter raises when an allocation fails, e.g. under RLIMIT_AS), or
+# that its peak RSS reached RLIMIT_AS.
+#
+# The child leads a process group of its own, so that pcu can kill it (and
+# anything it started) without touching the server.
+import errno
+import fcntl
+import os
+import resource
+import sys
+import time
+import traceback
+
+PRELOADED_MODULES = [
+    'array', 'bisect', 'collections', 'copy', 'decimal', 'fractions',
+    'functools', 'heapq', 'io', 'itertools', 'math', 'operator', 'random',
+    're', 'string', 'typing',
+]
+
+monotonic = getattr(time, 'monotonic', time.time)
+
+
+def write_line(fd, line):
+    data = (line + '\n').encode('utf-8')
+    while data:
+        data = data[os.write(fd, data):]
+
+
+def read_flag(fd):
+    # Whether anything was written to the pipe; without waiting, since
+    # something the child started may still have it open.
+    fcntl.fcntl(fd, fcntl.F_SETFL, fcntl.fcntl(fd, fcntl.F_GETFL) |
+                os.O_NONBLOCK)
+    try:
+        return bool(os.read(fd, 1))
+    except OSError:
+        return False
+
+
+def load_code(path, cache):
+    # Compiled once per version of the script, between runs, so that no run
+    # pays for it. A SyntaxError is kept and raised in the child, as the
+    # interpreter would.
+    try:
+        stat = os.stat(path)
+        key = (stat.st_ino, stat.st_size, stat.st_mtime)
+    except OSError:
+        key = None
+    if cache.get('key') != key or 'code' not in cache:
+        try:
+            with open(path, 'rb') as infile:
+                source = infile.read()
+            code = compile(source, path, 'exec', 0, True)
+        except Exception:
+            code = sys.exc_info()[1]
+        cache['key'] = key
+        cache['code'] = code
+    return cache['code']
+
+
+def exit_status(exc):
+    # Like the interpreter does for an uncaught SystemExit.
+    code = exc.code
+    if code is None:
+        return 0
+    if isinstance(code, int):
+        return code & 0xff
+    try:
+        sys.stderr.write(str(code) + '\n')
+    except Exception:
+        pass
+    return 1
+
+
+def run_child(code, script, argv, paths, control_fds, oom_fd):
+    os.setpgid(0, 0)
+    for fd in control_fds:
+        os.close(fd)
+    write_flags = os.O_WRONLY | os.O_CREAT | os.O_TRUNC
+    for fd, path, flags in zip((0, 1, 2), paths,
+                               (os.O_RDONLY, write_flags, write_flags)):
+        new_fd = os.open(path, flags, 0o666)
+        if new_fd != fd:
+            os.dup2(new_fd, fd)
+            os.close(new_fd)
+
+    # A fresh interpreter would seed from the OS, not share the server's
+    # state.
+    if 'random' in sys.modules:
+        sys.modules['random'].seed()
+    sys.argv = [script] + argv
+    main = type(sys)('__main__')
+    main.__file__ = script
+    main.__builtins__ = __builtins__
+    sys.modules['__main__'] = main
+
+    status = 0
+    try:
+        if isinstance(code, BaseException):
+            raise code
+        exec(code, main.__dict__)
+    except SystemExit:
+        status = exit_status(sys.exc_info()[1])
+    except BaseException:
+        exc_type, exc, tb = sys.exc_info()
+        if isinstance(exc, MemoryError):
+            write_line(oom_fd, '1')
+        # Leave this file's frame out of the traceback.
+        traceback.print_exception(exc_type, exc, tb.tb_next)
+        status = 1
+
+    try:
+        import atexit
+        atexit._run_exitfuncs()
+    except Exception:
+        pass
+    for stream in (sys.stdout, sys.stderr):
+        try:
+            stream.flush()
+        except Exception:
+            if status == 0:
+                status = 120
+    os._exit(status)
+
+
+def main():
+    script = sys.argv[1]
+    argv = sys.argv[2:]
+    sys.path[0] = os.path.dirname(os.path.abspath(script))
+
+    # The requests come over stdin and stdout, which the children need for
+    # themselves.
+    control_in = os.dup(0)
+    control_out = os.dup(1)
+    devnull = os.open(os.devnull, os.O_RDWR)
+    os.dup2(devnull, 0)
+    os.dup2(devnull, 1)
+    os.close(devnull)
+    requests = os.fdopen(control_in, 'rb')
+
+    for name in PRELOADED_MODULES:
+        try:
+            __import__(name)
+        except ImportError:
+            pass
+    cache = {}
+    load_code(script, cache)
+    memlimit = resource.getrlimit(resource.RLIMIT_AS)[0]
+    write_line(control_out, 'READY')
+
+    while True:
+        line = requests.readline()
+        if not line:
+            break
+        request = line.decode('utf-8').rstrip('\n').split('\t')
+        if len(request) != 4 or request[0] != 'RUN':
+            break
+
+        code = load_code(script, cache)
+        oom_in, oom_out = os.pipe()
+        start_time = monotonic()
+        pid = os.fork()
+        if pid == 0:
+            os.close(oom_in)
+            run_child(code, script, argv, request[1:],
+                      (control_in, control_out), oom_out)
+        os.close(oom_out)
+        try:
+            os.setpgid(pid, pid)
+        except OSError:
+            pass  # the child got there first
+        write_line(control_out, 'STARTED\t%d' % pid)
+
+        while True:
+            try:
+                _, status, rusage = os.wait4(pid, 0)
+                break
+            except OSError as e:
+                if e.errno != errno.EINTR:  # Python 2 doesn't retry
+                    raise
+        wall_time = monotonic() - start_time
+        if os.WIFSIGNALED(status):
+            returncode = -os.WTERMSIG(status)
+        else:
+            returncode = os.WEXITSTATUS(status)
+        max_rss = rusage.ru_maxrss
+        if sys.platform != 'darwin':
+            max_rss *= 1024
+        out_of_memory = read_flag(oom_in) or (
+            memlimit != resource.RLIM_INFINITY and max_rss >= memlimit)
+        os.close(oom_in)
+        write_line(control_out, 'DONE\t%d\t%d\t%d\t%d\t%d' % (
+            returncode, wall_time * 1e9,
+            (rusage.ru_utime + rusage.ru_stime) * 1e9, max_rss,
+            out_of_memory))
+
+        # Get the next run's code ready while pcu checks this one.
+        load_code(script, cache)
+
+
+main()
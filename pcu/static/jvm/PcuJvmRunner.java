@@ -0,0 +1,368 @@
+import java.io.BufferedInputStream;
+import java.io.BufferedOutputStream;
+import java.io.BufferedReader;
+import java.io.File;
+import java.io.FileDescriptor;
+import java.io.FileInputStream;
+import java.io.FileOutputStream;
+import java.io.IOException;
+import java.io.InputStream;
+import java.io.InputStreamReader;
+import java.io.PrintStream;
+import java.lang.management.ManagementFactory;
+import java.lang.management.OperatingSystemMXBean;
+import java.lang.reflect.InvocationTargetException;
+import java.lang.reflect.Method;
+import java.lang.reflect.Modifier;
+import java.net.URL;
+import java.net.URLClassLoader;
+import java.nio.charset.StandardCharsets;
+import java.nio.file.Files;
+import java.nio.file.Paths;
+import java.security.Permission;
+import java.util.ArrayList;
+import java.util.Arrays;
+import java.util.List;
+
+/**
+ * Resident JVM for pcu's "jvm" run mode (see pcu/jvm.py).
+ *
+ * Usage: java [JVM options] -cp DIR PcuJvmRunner CLASSPATH MAIN_CLASS [ARGS]
+ *
+ * Prints READY on stdout once it has started up, then reads one request per
+ * line from stdin:
+ *
+ *     RUN <tab> stdin path <tab> stdout path <tab> stderr path
+ *
+ * and runs MAIN_CLASS.main(ARGS) with System.in/out/err redirected to those
+ * files. Each run loads the program in a fresh class loader, so static state
+ * starts out fresh, just like in a new JVM. When the run is over, answers on
+ * stdout with
+ *
+ *     DONE <tab> exit code <tab> wall ns <tab> cpu ns <tab> peak RSS kB
+ *          <tab> 1 to keep going, or 0 if this JVM is about to exit
+ *
+ * System.exit() is trapped with a SecurityManager where the JVM still
+ * allows one. Elsewhere, it really does exit: a shutdown hook then answers
+ *
+ *     EXIT <tab> wall ns <tab> cpu ns <tab> peak RSS kB
+ *
+ * and pcu takes the exit code from the JVM process itself.
+ */
+public class PcuJvmRunner {
+    private static final class ExitTrap extends SecurityException {
+        private static final long serialVersionUID = 1L;
+
+        ExitTrap(int status) {
+            super("System.exit(" + status + ")");
+        }
+    }
+
+    private static final Object lock = new Object();
+    private static volatile boolean inCase = false;
+    private static volatile boolean exited = false;
+    private static volatile int exitStatus = 0;
+
+    private static PrintStream control;
+    private static PrintStream caseOut;
+    private static PrintStream caseErr;
+    private static long caseStartWall;
+    private static long caseStartCpu;
+
+    public static void main(String[] args) throws Exception {
+        URL[] classpath = parseClasspath(args[0]);
+        String mainClassName = args[1];
+        String[] mainArgs = Arrays.copyOfRange(args, 2, args.length);
+
+        control = new PrintStream(
+            new FileOutputStream(FileDescriptor.out), true, "UTF-8");
+        BufferedReader requests = new BufferedReader(
+            new InputStreamReader(System.in, StandardCharsets.UTF_8));
+        InputStream originalIn = System.in;
+        PrintStream originalOut = System.out;
+        PrintStream originalErr = System.err;
+
+        if (!installExitTrap()) {
+            Runtime.getRuntime().addShutdownHook(
+                new Thread(PcuJvmRunner::onShutdown));
+        }
+
+        // Load (but don't initialize) the program ahead of each request,
+        // while pcu is busy with the previous case.
+        ClassLoader loader = newLoader(classpath, mainClassName);
+        control.println("READY");
+        String line;
+        while ((line = requests.readLine()) != null) {
+            String[] request = line.split("\t", -1);
+            if (request.length != 4 || !request[0].equals("RUN")) {
+                break;
+            }
+
+            boolean keepGoing;
+            try {
+                keepGoing = runCase(loader, mainClassName, mainArgs,
+                                    request[1], request[2], request[3]);
+            } finally {
+                System.setIn(originalIn);
+                System.setOut(originalOut);
+                System.setErr(originalErr);
+            }
+            if (!keepGoing) {
+                Runtime.getRuntime().halt(0);
+            }
+
+            if (loader instanceof URLClassLoader) {
+                ((URLClassLoader) loader).close();
+            }
+            loader = newLoader(classpath, mainClassName);
+        }
+    }
+
+    private static URL[] parseClasspath(String classpath) throws IOException {
+        List<URL> urls = new ArrayList<>();
+        for (String entry : classpath.split(File.pathSeparator)) {
+            if (!entry.isEmpty()) {
+                urls.add(new File(entry).toURI().toURL());
+            }
+        }
+        return urls.toArray(new URL[0]);
+    }
+
+    private static ClassLoader newLoader(URL[] classpath,
+                                         String mainClassName) {
+        // Parented to the platform classes only, so that nothing of the
+        // program's is shared between runs (or with this class).
+        ClassLoader loader = new URLClassLoader(
+            classpath, ClassLoader.getSystemClassLoader().getParent());
+        try {
+            Class.forName(mainClassName, false, loader);
+        } catch (ClassNotFoundException | LinkageError e) {
+            // reported when the program is run
+        }
+        return loader;
+    }
+
+    @SuppressWarnings({"deprecation", "removal"})
+    private static boolean installExitTrap() {
+        try {
+            System.setSecurityManager(new SecurityManager() {
+                @Override
+                public void checkPermission(Permission perm) {
+                }
+
+                @Override
+                public void checkPermission(Permission perm, Object context) {
+                }
+
+                @Override
+                public void checkExit(int status) {
+                    if (inCase) {
+                        recordExit(status);
+                        throw new ExitTrap(status);
+                    }
+                }
+            });
+            return true;
+        } catch (UnsupportedOperationException | SecurityException e) {
+            return false;
+        }
+    }
+
+    private static void recordExit(int status) {
+        synchronized (lock) {
+            if (!exited) {
+                exitStatus = status;
+                exited = true;
+            }
+        }
+    }
+
+    private static void onShutdown() {
+        if (!inCase) {
+            return;
+        }
+        inCase = false;
+        long wall = System.nanoTime() - caseStartWall;
+        long cpu = elapsedCpu();
+        closeCaseStreams();
+        control.println("EXIT\t" + wall + "\t" + cpu + "\t" + peakRssKb());
+        control.flush();
+    }
+
+    private static boolean runCase(ClassLoader loader,
+                                   String mainClassName,
+                                   String[] mainArgs,
+                                   String inPath,
+                                   String outPath,
+                                   String errPath) throws IOException {
+        InputStream caseIn = new BufferedInputStream(
+            new FileInputStream(inPath), 1 << 16);
+        caseOut = new PrintStream(new BufferedOutputStream(
+            new FileOutputStream(outPath), 1 << 16), false);
+        caseErr = new PrintStream(new BufferedOutputStream(
+            new FileOutputStream(errPath), 1 << 12), true);
+        System.setIn(caseIn);
+        System.setOut(caseOut);
+        System.setErr(caseErr);
+
+        final int[] status = {0};
+        final boolean[] fatal = {false};
+        ThreadGroup group = new ThreadGroup("main") {
+            @Override
+            public void uncaughtException(Thread thread, Throwable e) {
+                if (e instanceof ExitTrap) {
+                    return;
+                }
+                if (thread.getName().equals("main")) {
+                    status[0] = 1;
+                }
+                fatal[0] |= e instanceof VirtualMachineError;
+                caseErr.print("Exception in thread \"" + thread.getName()
+                              + "\" ");
+                e.printStackTrace(caseErr);
+            }
+        };
+        Thread mainThread = new Thread(group, () -> {
+            Method main;
+            try {
+                Class<?> mainClass = Class.forName(mainClassName, false,
+                                                   loader);
+                main = mainClass.getMethod("main", String[].class);
+                if (!Modifier.isStatic(main.getModifiers())) {
+                    throw new NoSuchMethodException("main");
+                }
+            } catch (ClassNotFoundException | NoClassDefFoundError e) {
+                caseErr.println("Error: Could not find or load main class "
+                                + mainClassName);
+                caseErr.println("Caused by: " + e);
+                status[0] = 1;
+                return;
+            } catch (NoSuchMethodException e) {
+                caseErr.println("Error: Main method not found in class "
+                                + mainClassName);
+                status[0] = 1;
+                return;
+            }
+            try {
+                main.invoke(null, (Object) mainArgs.clone());
+            } catch (InvocationTargetException e) {
+                Throwable cause = e.getCause();
+                if (cause instanceof RuntimeException) {
+                    throw (RuntimeException) cause;
+                }
+                if (cause instanceof Error) {
+                    throw (Error) cause;
+                }
+                throw new RuntimeException(cause);
+            } catch (IllegalAccessException e) {
+                throw new RuntimeException(e);
+            }
+        }, "main", 0);
+        mainThread.setContextClassLoader(loader);
+
+        exited = false;
+        resetPeakRss();
+        caseStartCpu = processCpu();
+        caseStartWall = System.nanoTime();
+        inCase = true;
+        mainThread.start();
+
+        // Like a JVM, the run is over once all non-daemon threads are done,
+        // or as soon as somebody calls System.exit().
+        boolean abandoned = false;
+        try {
+            while (!exited && mainThread.isAlive()) {
+                mainThread.join(10);
+            }
+            if (exited) {
+                mainThread.join(100);  // let the trapped exit unwind
+            }
+            for (Thread thread : liveThreads(group)) {
+                while (!exited && thread.isAlive()) {
+                    thread.join(10);
+                }
+            }
+            abandoned = !liveThreads(group).isEmpty();
+        } catch (InterruptedException e) {
+            abandoned = true;
+        }
+        inCase = false;
+        long wall = System.nanoTime() - caseStartWall;
+        long cpu = elapsedCpu();
+
+        closeCaseStreams();
+        try {
+            caseIn.close();
+        } catch (IOException e) {
+        }
+
+        // Threads the program left running would meddle with the next run,
+        // and after e.g. an OutOfMemoryError this JVM may be unreliable, so
+        // start afresh in either case.
+        boolean keepGoing = !abandoned && !fatal[0];
+        control.println("DONE\t" + (exited ? exitStatus : status[0]) + "\t"
+                        + wall + "\t" + cpu + "\t" + peakRssKb() + "\t"
+                        + (keepGoing ? 1 : 0));
+        control.flush();
+        return keepGoing;
+    }
+
+    private static List<Thread> liveThreads(ThreadGroup group) {
+        Thread[] threads = new Thread[group.activeCount() + 16];
+        int count = group.enumerate(threads, true);
+        List<Thread> live = new ArrayList<>();
+        for (int i = 0; i < count; i++) {
+            if (threads[i].isAlive() && !threads[i].isDaemon()) {
+                live.add(threads[i]);
+            }
+        }
+        return live;
+    }
+
+    private static void closeCaseStreams() {
+        caseOut.flush();
+        caseOut.close();
+        caseErr.flush();
+        caseErr.close();
+    }
+
+    private static long processCpu() {
+        OperatingSystemMXBean os = ManagementFactory.getOperatingSystemMXBean();
+        if (os instanceof com.sun.management.OperatingSystemMXBean) {
+            return ((com.sun.management.OperatingSystemMXBean) os)
+                .getProcessCpuTime();
+        }
+        return -1;
+    }
+
+    private static long elapsedCpu() {
+        long now = processCpu();
+        return now < 0 || caseStartCpu < 0 ? -1 : now - caseStartCpu;
+    }
+
+    // Peak RSS is per process, so it is reset before each run where Linux
+    // allows it. It still includes the JVM's own footprint, as it would in
+    // a fresh JVM.
+    private static void resetPeakRss() {
+        try {
+            Files.write(Paths.get("/proc/self/clear_refs"),
+                        "5".getBytes(StandardCharsets.US_ASCII));
+        } catch (IOException | RuntimeException e) {
+        }
+    }
+
+    private static long peakRssKb() {
+        try {
+            for (String line : Files.readAllLines(
+                     Paths.get("/proc/self/status"),
+                     StandardCharsets.US_ASCII)) {
+                if (line.startsWith("VmHWM:")) {
+                    return Long.parseLong(
+                        line.substring(6).replace("kB", "").trim());
+                }
+            }
+        } catch (IOException | RuntimeException e) {
+        }
+        return 0;
+    }
+}
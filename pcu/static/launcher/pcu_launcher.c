@@ -0,0 +1,361 @@
+/*
+ * Launcher for pcu's test case runs (see pcu/launcher.py).
+ *
+ * Usage: pcu_launcher REPORT_FD EXECUTABLE ARGV0 [ARGS...]
+ *
+ * Runs EXECUTABLE in a child, in a process group of its own, and waits for
+ * it. On REPORT_FD it writes the child's pid once it has started, then its
+ * peak RSS in bytes once it has ended, then 1 if it ran out of memory under
+ * RLIMIT_AS and 0 if not, one number per line; it exits the way the child
+ * did.
+ *
+ * pcu can't measure this itself: on exec, Linux carries the peak RSS of the
+ * old address space over into the new program's, and a child forked from
+ * pcu starts out with all of pcu's memory. Forked from this launcher
+ * instead, the child only brings along a few hundred kilobytes.
+ *
+ * Nor does RLIMIT_AS say when it's hit: the allocation just fails, and the
+ * program dies however its runtime handles that. So where the kernel
+ * supports it (Linux 5.5 and up), the launcher has the kernel ask it about
+ * each mmap and mremap that would grow the address space, and notes any
+ * that would take it past the limit.
+ */
+#include <errno.h>
+#include <signal.h>
+#include <stdio.h>
+#include <stdlib.h>
+#include <string.h>
+#include <sys/resource.h>
+#include <sys/time.h>
+#include <sys/types.h>
+#include <sys/wait.h>
+#include <unistd.h>
+
+#ifdef __linux__
+#include <linux/audit.h>
+#include <linux/filter.h>
+#include <linux/seccomp.h>
+#include <poll.h>
+#include <stddef.h>
+#include <sys/ioctl.h>
+#include <sys/mman.h>
+#include <sys/prctl.h>
+#include <sys/signalfd.h>
+#include <sys/socket.h>
+#include <sys/syscall.h>
+#include <sys/utsname.h>
+#if defined(SECCOMP_USER_NOTIF_FLAG_CONTINUE) && defined(__x86_64__)
+#define WATCH_ARCH AUDIT_ARCH_X86_64
+#elif defined(SECCOMP_USER_NOTIF_FLAG_CONTINUE) && defined(__aarch64__)
+#define WATCH_ARCH AUDIT_ARCH_AARCH64
+#endif
+#endif
+
+static void write_number(int fd, long long number) {
+    char line[32];
+    int length = snprintf(line, sizeof(line), "%lld\n", number);
+    char *p = line;
+    while (length > 0) {
+        ssize_t n = write(fd, p, (size_t) length);
+        if (n < 0) {
+            if (errno == EINTR) {
+                continue;
+            }
+            return;
+        }
+        p += n;
+        length -= (int) n;
+    }
+}
+
+#ifdef WATCH_ARCH
+/* Whether the kernel can let a watched call go ahead (Linux 5.5). */
+static int can_watch(void) {
+    struct utsname name;
+    int major, minor;
+    if (uname(&name) < 0 ||
+            sscanf(name.release, "%d.%d", &major, &minor) != 2) {
+        return 0;
+    }
+    return major > 5 || (major == 5 && minor >= 5);
+}
+
+/*
+ * In the child: asks the kernel to pass its mmap and mremap calls to a
+ * listener, which it sends to the launcher over sock. Calls with MAP_FIXED
+ * are left alone; they mostly map over what's already there.
+ */
+static void start_watching(int sock) {
+    struct sock_filter filter[] = {
+        BPF_STMT(BPF_LD | BPF_W | BPF_ABS,
+                 offsetof(struct seccomp_data, arch)),
+        BPF_JUMP(BPF_JMP | BPF_JEQ | BPF_K, WATCH_ARCH, 0, 5),
+        BPF_STMT(BPF_LD | BPF_W | BPF_ABS,
+                 offsetof(struct seccomp_data, nr)),
+        BPF_JUMP(BPF_JMP | BPF_JEQ | BPF_K, __NR_mremap, 4, 0),
+        BPF_JUMP(BPF_JMP | BPF_JEQ | BPF_K, __NR_mmap, 0, 2),
+        /* The low half of the flags, on these little-endian machines. */
+        BPF_STMT(BPF_LD | BPF_W | BPF_ABS,
+                 offsetof(struct seccomp_data, args[3])),
+        BPF_JUMP(BPF_JMP | BPF_JSET | BPF_K, MAP_FIXED, 0, 1),
+        BPF_STMT(BPF_RET | BPF_K, SECCOMP_RET_ALLOW),
+        BPF_STMT(BPF_RET | BPF_K, SECCOMP_RET_USER_NOTIF),
+    };
+    struct sock_fprog program = {
+        (unsigned short) (sizeof(filter) / sizeof(filter[0])), filter,
+    };
+    if (prctl(PR_SET_NO_NEW_PRIVS, 1, 0, 0, 0) < 0) {
+        return;
+    }
+    int listener = (int) syscall(__NR_seccomp, SECCOMP_SET_MODE_FILTER,
+                                 SECCOMP_FILTER_FLAG_NEW_LISTENER, &program);
+    if (listener < 0) {
+        return;
+    }
+
+    char control[CMSG_SPACE(sizeof(int))];
+    char byte = 0;
+    struct iovec iov = {&byte, 1};
+    struct msghdr message;
+    memset(&message, 0, sizeof(message));
+    memset(control, 0, sizeof(control));
+    message.msg_iov = &iov;
+    message.msg_iovlen = 1;
+    message.msg_control = control;
+    message.msg_controllen = sizeof(control);
+    struct cmsghdr *cmsg = CMSG_FIRSTHDR(&message);
+    cmsg->cmsg_level = SOL_SOCKET;
+    cmsg->cmsg_type = SCM_RIGHTS;
+    cmsg->cmsg_len = CMSG_LEN(sizeof(int));
+    memcpy(CMSG_DATA(cmsg), &listener, sizeof(int));
+    sendmsg(sock, &message, 0);
+    close(listener);
+}
+
+/* In the launcher: the listener the child sent, or -1 if it sent none. */
+static int receive_listener(int sock) {
+    char control[CMSG_SPACE(sizeof(int))];
+    char byte;
+    struct iovec iov = {&byte, 1};
+    struct msghdr message;
+    memset(&message, 0, sizeof(message));
+    message.msg_iov = &iov;
+    message.msg_iovlen = 1;
+    message.msg_control = control;
+    message.msg_controllen = sizeof(control);
+    ssize_t n;
+    do {
+        n = recvmsg(sock, &message, MSG_CMSG_CLOEXEC);
+    } while (n < 0 && errno == EINTR);
+    struct cmsghdr *cmsg = n > 0 ? CMSG_FIRSTHDR(&message) : NULL;
+    if (cmsg == NULL || cmsg->cmsg_type != SCM_RIGHTS) {
+        return -1;
+    }
+    int listener;
+    memcpy(&listener, CMSG_DATA(cmsg), sizeof(int));
+    return listener;
+}
+
+/* Pages of address space the process uses, or -1 if it's gone. */
+static long long vm_pages(pid_t pid) {
+    char path[64];
+    long long pages = -1;
+    snprintf(path, sizeof(path), "/proc/%d/statm", (int) pid);
+    FILE *statm = fopen(path, "r");
+    if (statm != NULL) {
+        if (fscanf(statm, "%lld", &pages) != 1) {
+            pages = -1;
+        }
+        fclose(statm);
+    }
+    return pages;
+}
+
+/*
+ * Answers one call from the listener, letting it go ahead either way.
+ * Returns 1 if RLIMIT_AS will refuse it (the same sum the kernel does),
+ * 0 if not, and -1 if there's nothing more to listen to.
+ */
+static int check_call(int listener, long long limit_pages) {
+    struct seccomp_notif request;
+    struct seccomp_notif_resp response;
+    memset(&request, 0, sizeof(request));
+    if (ioctl(listener, SECCOMP_IOCTL_NOTIF_RECV, &request) < 0) {
+        return errno == EINTR || errno == ENOENT ? 0 : -1;
+    }
+
+    unsigned long long growth = 0;
+    if (request.data.nr == __NR_mmap) {
+        growth = request.data.args[1];
+    } else if (request.data.args[2] > request.data.args[1]) {
+        growth = request.data.args[2] - request.data.args[1];
+    }
+    int refused = 0;
+    if (growth > 0) {
+        long long page_size = sysconf(_SC_PAGESIZE);
+        long long pages = vm_pages((pid_t) request.pid);
+        refused = pages >= 0 &&
+            ioctl(listener, SECCOMP_IOCTL_NOTIF_ID_VALID, &request.id) == 0 &&
+            (growth + page_size - 1) / page_size >
+                (unsigned long long) (limit_pages - pages);
+    }
+
+    memset(&response, 0, sizeof(response));
+    response.id = request.id;
+    response.flags = SECCOMP_USER_NOTIF_FLAG_CONTINUE;
+    ioctl(listener, SECCOMP_IOCTL_NOTIF_SEND, &response);
+    return refused;
+}
+
+/*
+ * Waits for the child like wait4, answering the listener's calls until it
+ * has ended; sets *refused if any of them went over the limit.
+ */
+static pid_t watch_and_wait(pid_t pid, int listener, int child_signals,
+                            long long limit_pages, int *status,
+                            struct rusage *rusage, int *refused) {
+    struct pollfd fds[2] = {
+        {child_signals, POLLIN, 0},
+        {listener, POLLIN, 0},
+    };
+    int num_fds = 2;
+    for (;;) {
+        pid_t done = wait4(pid, status, WNOHANG, rusage);
+        if (done != 0) {
+            return done;
+        }
+        if (poll(fds, (nfds_t) num_fds, -1) < 0) {
+            if (errno == EINTR) {
+                continue;
+            }
+            return wait4(pid, status, 0, rusage);
+        }
+        if (fds[0].revents & POLLIN) {
+            struct signalfd_siginfo info;
+            if (read(child_signals, &info, sizeof(info)) < 0) {
+                /* Checked on the next time around anyway. */
+            }
+        }
+        if (num_fds == 2 && (fds[1].revents & (POLLIN | POLLHUP | POLLERR))) {
+            int result = fds[1].revents & POLLIN ?
+                check_call(listener, limit_pages) : -1;
+            if (result < 0) {
+                num_fds = 1;
+            } else if (result > 0) {
+                *refused = 1;
+            }
+        }
+    }
+}
+#endif
+
+int main(int argc, char **argv) {
+    if (argc < 4) {
+        fprintf(stderr, "usage: %s REPORT_FD EXECUTABLE ARGV0 [ARGS...]\n",
+                argv[0]);
+        return 127;
+    }
+    int report_fd = atoi(argv[1]);
+
+    struct rlimit memlimit;
+    if (getrlimit(RLIMIT_AS, &memlimit) < 0) {
+        memlimit.rlim_cur = RLIM_INFINITY;
+    }
+#ifdef WATCH_ARCH
+    int watch;
+    int socks[2];
+    int child_signals = -1;
+    sigset_t child_mask, old_mask;
+    watch = memlimit.rlim_cur != RLIM_INFINITY && can_watch();
+    if (watch) {
+        /* SIGCHLD is taken through a signalfd, to poll it with the rest. */
+        sigemptyset(&child_mask);
+        sigaddset(&child_mask, SIGCHLD);
+        sigprocmask(SIG_BLOCK, &child_mask, &old_mask);
+        child_signals = signalfd(-1, &child_mask, SFD_CLOEXEC);
+        watch = child_signals >= 0 &&
+            socketpair(AF_UNIX, SOCK_STREAM | SOCK_CLOEXEC, 0, socks) == 0;
+        if (!watch) {
+            sigprocmask(SIG_SETMASK, &old_mask, NULL);
+        }
+    }
+#endif
+
+    pid_t pid = fork();
+    if (pid < 0) {
+        perror("pcu_launcher: fork");
+        return 127;
+    }
+    if (pid == 0) {
+        setpgid(0, 0);
+        close(report_fd);
+#ifdef WATCH_ARCH
+        if (watch) {
+            sigprocmask(SIG_SETMASK, &old_mask, NULL);
+            close(socks[0]);
+            start_watching(socks[1]);
+            close(socks[1]);
+        }
+#endif
+        execv(argv[2], argv + 3);
+        /* Like the shell says it. */
+        fprintf(stderr, "%s: %s\n", argv[2], strerror(errno));
+        _exit(errno == ENOENT ? 127 : 126);
+    }
+    setpgid(pid, pid); /* whichever of us gets there first */
+    write_number(report_fd, pid);
+
+    int status;
+    struct rusage rusage;
+    int refused = 0;
+    pid_t done = -1;
+#ifdef WATCH_ARCH
+    if (watch) {
+        close(socks[1]);
+        int listener = receive_listener(socks[0]);
+        close(socks[0]);
+        if (listener >= 0) {
+            long long limit_pages =
+                (long long) (memlimit.rlim_cur / sysconf(_SC_PAGESIZE));
+            done = watch_and_wait(pid, listener, child_signals,
+                                  limit_pages, &status, &rusage, &refused);
+            close(listener);
+        }
+    }
+#endif
+    while (done < 0 && (done = wait4(pid, &status, 0, &rusage)) < 0) {
+        if (errno != EINTR) {
+            perror("pcu_launcher: wait4");
+            return 127;
+        }
+    }
+#ifdef __APPLE__
+    long long max_rss = (long long) rusage.ru_maxrss;
+#else
+    long long max_rss = (long long) rusage.ru_maxrss * 1024;
+#endif
+    write_number(report_fd, max_rss);
+    /*
+     * Where RLIMIT_AS isn't enforced (macOS) or watched, a peak RSS at the
+     * limit is the only sign.
+     */
+    int out_of_memory = refused || (memlimit.rlim_cur != RLIM_INFINITY &&
+        (unsigned long long) max_rss >= memlimit.rlim_cur);
+    write_number(report_fd, out_of_memory);
+    close(report_fd);
+
+    if (WIFSIGNALED(status)) {
+        /* Die of the same signal, without leaving a core of our own. */
+        int sig = WTERMSIG(status);
+        struct rlimit no_core = {0, 0};
+        sigset_t mask;
+        setrlimit(RLIMIT_CORE, &no_core);
+        signal(sig, SIG_DFL);
+        sigemptyset(&mask);
+        sigaddset(&mask, sig);
+        sigprocmask(SIG_UNBLOCK, &mask, NULL);
+        kill(getpid(), sig);
+        return 128 + sig;
+    }
+    return WEXITSTATUS(status);
+}
@@ -0,0 +1,197 @@
+import itertools
+import pathlib
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from typing import Optional
+
+from . import color_utils
+from . import problem
+from . import runner
+from . import solution
+from . import testcase_store
+from . import testgen
+
+
+_PROGRESS_INTERVAL_SEC = 2.0
+
+
+class ReferenceFailed(Exception):
+    pass
+
+
+def check_input(prob: problem.Problem,
+                candidate: solution.Solution,
+                reference: solution.Solution,
+                input_path: pathlib.Path,
+                scratch_dir: pathlib.Path,
+                cancel: Optional[threading.Event] = None,
+) -> Optional[runner.TestCaseResult]:
+    # Judges the candidate's output against the reference's on one input,
+    # the way "pcu run" would. Returns None if cancelled; raises
+    # ReferenceFailed if the reference itself didn't produce an answer.
+    answer_path = scratch_dir / 'answer'
+    output_path = scratch_dir / 'output'
+    error_path = scratch_dir / 'error'
+
+    exec_result = reference.run(input_path, answer_path, cancel)
+    if exec_result.cancelled:
+        return None
+    if not reference.succeeded(exec_result, answer_path):
+        raise ReferenceFailed('reference solution ' +
+                              solution.describe_failure(exec_result))
+
+    exec_result = candidate.run(input_path, output_path, cancel, error_path)
+    if exec_result.cancelled:
+        return None
+    return runner.judge(prob, exec_result, output_path, answer_path).result
+
+
+class _Failure(object):
+    def __init__(self,
+                 seed: int,
+                 result: Optional[runner.TestCaseResult],
+                 worker_dir: pathlib.Path,
+                 error: Optional[str] = None,
+    ) -> None:
+        self.seed = seed
+        self.result = result
+        self.worker_dir = worker_dir
+        self.error = error
+
+
+def stress(prob: problem.Problem,
+           candidate: solution.Solution,
+           reference: solution.Solution,
+           executable_path: pathlib.Path,
+           prefix: str,
+           jobs: int = 1,
+           master_seed: Optional[int] = None,
+           max_cases: int = 0,
+) -> bool:
+    if master_seed is None:
+        master_seed = testgen.random_master_seed()
+
+    with color_utils.ColorizeStderrBar1():
+        print('=' * 20, 'Stress testing', prob.name, '=' * 20,
+              file=sys.stderr)
+    print('Using master seed', master_seed, 'and', jobs, 'parallel jobs',
+          '(Ctrl-C to stop)',
+          file=sys.stderr)
+
+    stop = threading.Event()
+    finished = threading.Event()
+    lock = threading.Lock()
+    seq_nums = itertools.count() if not max_cases else iter(range(max_cases))
+    num_checked = 0
+    num_running = jobs
+    failure = None  # type: Optional[_Failure]
+
+    def fail(new_failure: _Failure) -> None:
+        nonlocal failure
+        with lock:
+            if failure is None:
+                failure = new_failure
+        stop.set()
+
+    def work(worker_dir: pathlib.Path) -> None:
+        nonlocal num_running
+        try:
+            work_loop(worker_dir)
+        finally:
+            with lock:
+                num_running -= 1
+                if not num_running:
+                    finished.set()
+
+    def work_loop(worker_dir: pathlib.Path) -> None:
+        nonlocal num_checked
+        input_path = worker_dir / 'input'
+        while not stop.is_set():
+            with lock:
+                seq_num = next(seq_nums, None)
+            if seq_num is None:
+                return
+            seed = testgen.case_seed(master_seed, seq_num)
+
+            with open(input_path, 'wb') as input_file:
+                if not testgen.run_generator(seq_num, seed, executable_path,
+                                             input_file, subprocess.DEVNULL,
+                                             cwd=worker_dir):
+                    fail(_Failure(seed, None, worker_dir,
+                                  'generator failed'))
+                    return
+
+            try:
+                result = check_input(prob, candidate, reference, input_path,
+                                     worker_dir, stop)
+            except ReferenceFailed as e:
+                fail(_Failure(seed, None, worker_dir, str(e)))
+                return
+            if result is None:
+                return
+            if result != runner.TestCaseResult.CORRECT:
+                fail(_Failure(seed, result, worker_dir))
+                return
+            with lock:
+                num_checked += 1
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        threads = []
+        for i in range(jobs):
+            worker_dir = pathlib.Path(temp_dir) / 'worker{}'.format(i)
+            worker_dir.mkdir()
+            threads.append(threading.Thread(target=work, args=(worker_dir,)))
+
+        start_time = time.monotonic()
+        for thread in threads:
+            thread.start()
+        try:
+            while not finished.wait(_PROGRESS_INTERVAL_SEC):
+                if not stop.is_set():
+                    _print_progress(num_checked, start_time)
+        except KeyboardInterrupt:
+            with color_utils.ColorizeStderrWarning():
+                print('Stopping...',
+                      file=sys.stderr)
+        finally:
+            stop.set()
+            for thread in threads:
+                thread.join()
+
+        _print_progress(num_checked, start_time)
+        if failure is None:
+            with color_utils.ColorizeStderrGood():
+                print('No differences found',
+                      file=sys.stderr)
+            return True
+        if failure.error is not None:
+            with color_utils.ColorizeStderrError():
+                print('ERROR:', failure.error, 'for seed', failure.seed,
+                      file=sys.stderr)
+            return False
+
+        test_id, = testgen.get_new_test_ids(prob, prefix, 1)
+        prob.store.put(test_id, testcase_store.ANSWER,
+                       failure.worker_dir / 'answer')
+        prob.store.put(test_id, testcase_store.INPUT,
+                       failure.worker_dir / 'input')
+
+    assert failure.result is not None
+    with color_utils.ColorizeStderr(*failure.result.get_colorize_colors()):
+        print('Found a failing input:', runner.humanize(failure.result),
+              'for seed', failure.seed,
+              file=sys.stderr)
+    print('Saved it (with the reference answer) as test case', test_id,
+          '-- run "pcu run', prob.name, test_id + '" to see the details',
+          file=sys.stderr)
+    return True
+
+
+def _print_progress(num_checked: int, start_time: float) -> None:
+    elapsed = max(time.monotonic() - start_time, 1e-9)
+    print('Checked {} cases in {:.1f} s ({:.1f} cases/sec)'.format(
+              num_checked, elapsed, num_checked / elapsed),
+          file=sys.stderr)
@@ -0,0 +1,417 @@
+import abc
+import contextlib
+import hashlib
+import io
+import pathlib
+import shutil
+import threading
+import uuid
+from typing import Any, IO, List, Optional, Tuple
+
+
+FILES = 'files'
+PACKED = 'packed'
+STORAGES = [FILES, PACKED]
+
+DB_NAME = 'testcases.db'
+# Under the testcases directory, for view_path's copies
+_VIEWS_DIR = '.views'
+
+INPUT = '.in'
+ANSWER = '.ans'
+OUTPUT = '.out'
+ERROR = '.err'
+STATS = '.stats'
+SUFFIXES = (INPUT, ANSWER, OUTPUT, ERROR, STATS)
+
+
+class TestCaseStore(abc.ABC):
+    # Where a problem's test case files live. A test case exists if it has
+    # an input file; the others (answer, output, ...) are all optional.
+    def __init__(self, testcases_path: pathlib.Path) -> None:
+        self.testcases_path = testcases_path
+
+    @abc.abstractmethod
+    def get_test_ids(self) -> List[str]:
+        pass
+
+    @abc.abstractmethod
+    def exists(self, test_id: str, suffix: str) -> bool:
+        pass
+
+    @abc.abstractmethod
+    def size(self, test_id: str, suffix: str) -> int:
+        pass
+
+    @abc.abstractmethod
+    def open(self, test_id: str, suffix: str, mode: str = 'rb') -> IO:
+        # mode is one of 'rb', 'r', 'wb' and 'w'. A file opened for writing
+        # replaces the stored one once it's closed.
+        pass
+
+    @abc.abstractmethod
+    def put(self, test_id: str, suffix: str, path: pathlib.Path) -> None:
+        # Moves the file at path into the store.
+        pass
+
+    @abc.abstractmethod
+    def delete(self, test_id: str, suffix: str) -> None:
+        pass
+
+    def copy_to(self,
+                test_id: str,
+                suffix: str,
+                dest_path: pathlib.Path,
+    ) -> None:
+        with self.open(test_id, suffix) as infile, \
+                open(dest_path, 'wb') as outfile:
+            shutil.copyfileobj(infile, outfile)
+
+    def readable_path(self,
+                      test_id: str,
+                      suffix: str,
+                      scratch_path: pathlib.Path,
+    ) -> pathlib.Path:
+        # A path to read the file from, for programs that need one: the
+        # file itself if the store has one, else a copy at scratch_path.
+        self.copy_to(test_id, suffix, scratch_path)
+        return scratch_path
+
+    def view_path(self, test_id: str, suffix: str) -> pathlib.Path:
+        # A path to read the file from for code that expects plain files
+        # (see Problem.get_test_input_path and friends). Unless the store
+        # keeps plain files, it's a copy refreshed on every call, and
+        # writing to it changes nothing; if there is no such file, nothing
+        # is at the path.
+        scratch_path = self.testcases_path / _VIEWS_DIR / (test_id + suffix)
+        if not self.exists(test_id, suffix):
+            with contextlib.suppress(FileNotFoundError):
+                scratch_path.unlink()
+            return scratch_path
+        scratch_path.parent.mkdir(exist_ok=True)
+        return self.readable_path(test_id, suffix, scratch_path)
+
+    def temp_path(self, test_id: str, suffix: str) -> pathlib.Path:
+        # A place to write a file before put()ing it in, on the same file
+        # system as the test cases.
+        return self.testcases_path / '.{}{}.tmp-{}'.format(
+            test_id, suffix, uuid.uuid4().hex)
+
+    def close(self) -> None:
+        pass
+
+
+class FilesTestCaseStore(TestCaseStore):
+    # Every test case file as a file of its own in the testcases directory.
+    def _path(self, test_id: str, suffix: str) -> pathlib.Path:
+        return self.testcases_path / (test_id + suffix)
+
+    def get_test_ids(self) -> List[str]:
+        result = []
+        for child in self.testcases_path.iterdir():
+            if child.is_file() and child.suffix == INPUT:
+                result.append(child.stem)
+        return sorted(result)
+
+    def exists(self, test_id: str, suffix: str) -> bool:
+        return self._path(test_id, suffix).is_file()
+
+    def size(self, test_id: str, suffix: str) -> int:
+        return self._path(test_id, suffix).stat().st_size
+
+    def open(self, test_id: str, suffix: str, mode: str = 'rb') -> IO:
+        return open(self._path(test_id, suffix), mode)
+
+    def put(self, test_id: str, suffix: str, path: pathlib.Path) -> None:
+        shutil.move(str(path), str(self._path(test_id, suffix)))
+
+    def delete(self, test_id: str, suffix: str) -> None:
+        with contextlib.suppress(FileNotFoundError):
+            self._path(test_id, suffix).unlink()
+
+    def copy_to(self,
+                test_id: str,
+                suffix: str,
+                dest_path: pathlib.Path,
+    ) -> None:
+        shutil.copy2(self._path(test_id, suffix), dest_path)
+
+    def readable_path(self,
+                      test_id: str,
+                      suffix: str,
+                      scratch_path: pathlib.Path,
+    ) -> pathlib.Path:
+        return self._path(test_id, suffix)
+
+    def view_path(self, test_id: str, suffix: str) -> pathlib.Path:
+        return self._path(test_id, suffix)
+
+
+# Files are stored in chunks of this size, so that they can be streamed in
+# and out without holding all of one in memory.
+_CHUNK_SIZE = 1024 * 1024
+
+# How long to wait for another writer to commit before giving up
+_LOCK_TIMEOUT_SEC = 600
+
+_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS files (
+    test_id TEXT NOT NULL,
+    suffix TEXT NOT NULL,
+    blob_id INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    sha256 TEXT NOT NULL,
+    PRIMARY KEY (test_id, suffix)
+);
+CREATE INDEX IF NOT EXISTS files_by_suffix ON files (suffix, test_id);
+CREATE TABLE IF NOT EXISTS chunks (
+    blob_id INTEGER NOT NULL,
+    seq INTEGER NOT NULL,
+    data BLOB NOT NULL,
+    PRIMARY KEY (blob_id, seq)
+);
+'''
+
+
+class _ChunkReader(io.RawIOBase):
+    def __init__(self, store: 'PackedTestCaseStore', blob_id: int) -> None:
+        self._store = store
+        self._blob_id = blob_id
+        self._seq = 0
+        self._chunk = b''
+        self._offset = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer: Any) -> int:
+        if self._offset == len(self._chunk):
+            chunk = self._store._read_chunk(self._blob_id, self._seq)
+            if chunk is None:
+                return 0
+            self._seq += 1
+            self._chunk = chunk
+            self._offset = 0
+        n = min(len(buffer), len(self._chunk) - self._offset)
+        buffer[:n] = self._chunk[self._offset:self._offset + n]
+        self._offset += n
+        return n
+
+
+class _ChunkWriter(io.RawIOBase):
+    # Writes a file on a database connection of its own, in one
+    # transaction: its chunks under a blob id of their own, then the file
+    # pointing at them. Closing the writer commits it, unless it was
+    # aborted, in which case the stored file is left as it was.
+    def __init__(self,
+                 store: 'PackedTestCaseStore',
+                 test_id: str,
+                 suffix: str,
+    ) -> None:
+        self._store = store
+        self._test_id = test_id
+        self._suffix = suffix
+        self._blob_id = store._new_blob_id()
+        self._seq = 0
+        self._pending = bytearray()
+        self._size = 0
+        self._hasher = hashlib.sha256()
+        self._aborted = False
+        self._conn = store._connect()
+        self._conn.execute('BEGIN')
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data: Any) -> int:
+        data = bytes(data)
+        self._pending += data
+        self._size += len(data)
+        self._hasher.update(data)
+        while len(self._pending) >= _CHUNK_SIZE:
+            self._flush_chunk()
+        return len(data)
+
+    def _flush_chunk(self) -> None:
+        chunk = bytes(self._pending[:_CHUNK_SIZE])
+        del self._pending[:_CHUNK_SIZE]
+        self._conn.execute('INSERT INTO chunks VALUES (?, ?, ?)',
+                           (self._blob_id, self._seq, chunk))
+        self._seq += 1
+
+    def abort(self) -> None:
+        self._aborted = True
+
+    def close(self) -> None:
+        if not self.closed:
+            try:
+                if not self._aborted:
+                    if self._pending:
+                        self._flush_chunk()
+                    _delete_file(self._conn, self._test_id, self._suffix)
+                    self._conn.execute(
+                        'INSERT INTO files VALUES (?, ?, ?, ?, ?)',
+                        (self._test_id, self._suffix, self._blob_id,
+                         self._size, self._hasher.hexdigest()))
+                    self._conn.execute('COMMIT')
+            finally:
+                if self._conn.in_transaction:
+                    self._conn.execute('ROLLBACK')
+                self._conn.close()
+        super().close()
+
+
+class _BufferedChunkWriter(io.BufferedWriter):
+    # Aborts the write if the block writing the file raises.
+    def __exit__(self, exc_type: Any, *args: Any) -> None:
+        if exc_type is not None:
+            self.raw.abort()  # type: ignore
+        super().__exit__(exc_type, *args)
+
+
+class _TextChunkWriter(io.TextIOWrapper):
+    def __exit__(self, exc_type: Any, *args: Any) -> None:
+        if exc_type is not None:
+            self.buffer.raw.abort()  # type: ignore
+        super().__exit__(exc_type, *args)
+
+
+def _delete_file(conn: Any, test_id: str, suffix: str) -> None:
+    conn.execute(
+        'DELETE FROM chunks WHERE blob_id IN (SELECT blob_id FROM files '
+        'WHERE test_id = ? AND suffix = ?)',
+        (test_id, suffix))
+    conn.execute(
+        'DELETE FROM files WHERE test_id = ? AND suffix = ?',
+        (test_id, suffix))
+
+
+class PackedTestCaseStore(TestCaseStore):
+    # Keeps every test case file of a problem in one SQLite database: an
+    # index of files with their sizes and hashes, and their contents in
+    # chunks. Files are streamed straight from and to the database, and a
+    # file being written is committed all at once when it's closed.
+    def __init__(self,
+                 db_path: pathlib.Path,
+                 testcases_path: pathlib.Path,
+    ) -> None:
+        super().__init__(testcases_path)
+        self.db_path = db_path
+        self._conn = self._connect()
+        self._conn.execute('PRAGMA journal_mode = WAL')
+        self._conn.executescript(_SCHEMA)
+        self._lock = threading.Lock()
+        with self._transaction():
+            # Chunks of a file that was still being written when pcu died.
+            self._conn.execute(
+                'DELETE FROM chunks WHERE blob_id NOT IN '
+                '(SELECT blob_id FROM files)')
+        row = self._conn.execute('SELECT MAX(blob_id) FROM files').fetchone()
+        self._next_blob_id = (row[0] or 0) + 1
+
+    def _connect(self) -> Any:
+        # Writers wait for each other's transactions to finish, which for
+        # a big file can take a while.
+        import sqlite3  # only needed for packed problems
+        conn = sqlite3.connect(str(self.db_path), timeout=_LOCK_TIMEOUT_SEC,
+                               check_same_thread=False, isolation_level=None)
+        conn.execute('PRAGMA synchronous = NORMAL')
+        return conn
+
+    @contextlib.contextmanager
+    def _transaction(self) -> Any:
+        self._conn.execute('BEGIN')
+        try:
+            yield
+        except BaseException:
+            self._conn.execute('ROLLBACK')
+            raise
+        self._conn.execute('COMMIT')
+
+    def _new_blob_id(self) -> int:
+        with self._lock:
+            blob_id = self._next_blob_id
+            self._next_blob_id += 1
+            return blob_id
+
+    def _get_file(self,
+                  test_id: str,
+                  suffix: str,
+    ) -> Tuple[int, int]:
+        # (blob id, size) of the file
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT blob_id, size FROM files '
+                'WHERE test_id = ? AND suffix = ?',
+                (test_id, suffix)).fetchone()
+        if row is None:
+            raise FileNotFoundError('no {} file for test case {}'.format(
+                suffix, test_id))
+        return row
+
+    def _read_chunk(self, blob_id: int, seq: int) -> Optional[bytes]:
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT data FROM chunks WHERE blob_id = ? AND seq = ?',
+                (blob_id, seq)).fetchone()
+        return None if row is None else row[0]
+
+    def get_test_ids(self) -> List[str]:
+        with self._lock:
+            rows = self._conn.execute(
+                'SELECT test_id FROM files WHERE suffix = ? ORDER BY test_id',
+                (INPUT,))
+            return [test_id for test_id, in rows]
+
+    def exists(self, test_id: str, suffix: str) -> bool:
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT 1 FROM files WHERE test_id = ? AND suffix = ?',
+                (test_id, suffix)).fetchone()
+        return row is not None
+
+    def size(self, test_id: str, suffix: str) -> int:
+        return self._get_file(test_id, suffix)[1]
+
+    def open(self, test_id: str, suffix: str, mode: str = 'rb') -> IO:
+        binary_file = None  # type: Any
+        if mode in ('rb', 'r'):
+            blob_id, _ = self._get_file(test_id, suffix)
+            binary_file = io.BufferedReader(_ChunkReader(self, blob_id),
+                                            _CHUNK_SIZE)
+        elif mode in ('wb', 'w'):
+            binary_file = _BufferedChunkWriter(
+                _ChunkWriter(self, test_id, suffix), _CHUNK_SIZE)
+        else:
+            raise ValueError('unsupported mode: {!r}'.format(mode))
+        if 'b' in mode:
+            return binary_file
+        if mode == 'w':
+            return _TextChunkWriter(binary_file)
+        return io.TextIOWrapper(binary_file)
+
+    def put(self, test_id: str, suffix: str, path: pathlib.Path) -> None:
+        with open(path, 'rb') as infile, \
+                self.open(test_id, suffix, 'wb') as outfile:
+            shutil.copyfileobj(infile, outfile, _CHUNK_SIZE)
+        path.unlink()
+
+    def delete(self, test_id: str, suffix: str) -> None:
+        with self._lock, self._transaction():
+            _delete_file(self._conn, test_id, suffix)
+
+    def close(self) -> None:
+        self._conn.close()
+
+    def import_files(self) -> None:
+        for child in sorted(self.testcases_path.iterdir()):
+            if child.is_file() and child.suffix in SUFFIXES:
+                self.put(child.stem, child.suffix, child)
+
+    def export_files(self) -> None:
+        with self._lock:
+            rows = self._conn.execute(
+                'SELECT test_id, suffix FROM files').fetchall()
+        for test_id, suffix in rows:
+            self.copy_to(test_id, suffix,
+                         self.testcases_path / (test_id + suffix))
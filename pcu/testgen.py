@@ -1,22 +1,80 @@
+import concurrent.futures
 import contextlib
-import inflection
+import hashlib
 import itertools
 import os
 import pathlib
+import queue
 import random
+import shlex
 import subprocess
 import sys
 import tempfile
+import threading
+from typing import IO, Iterator, List, Optional, Union
 
 from . import color_utils
 from . import problem
+from . import solution
+from . import testcase_store
+
+
+_QUEUE_POLL_SEC = 0.1
 
 
 def generate_tests(prob: problem.Problem,
                    executable_path: pathlib.Path,
                    prefix: str,
                    num_cases: int,
+                   jobs: int = 1,
+                   master_seed: Optional[int] = None,
+                   reference: Optional[solution.Solution] = None,
 ) -> bool:
+    if not check_executable(executable_path):
+        return False
+
+    print('Generating', num_cases, 'test cases for problem', prob.name,
+          'with executable', executable_path,
+          file=sys.stderr)
+
+    new_test_ids = get_new_test_ids(prob, prefix, num_cases)
+
+    if master_seed is None:
+        master_seed = random_master_seed()
+    print('Using master seed', master_seed,
+          '(pass --seed', master_seed, 'to generate the same test cases '
+          'again)',
+          file=sys.stderr)
+
+    import inflection
+    with contextlib.ExitStack() as stack:
+        if reference is None:
+            results = stack.enter_context(_generate_all(
+                prob, executable_path, master_seed, new_test_ids, jobs))
+        else:
+            results = stack.enter_context(_generate_all_with_reference(
+                prob, executable_path, reference, master_seed, new_test_ids,
+                jobs))
+
+        # Report in order, so the log reads the same whatever the job count.
+        for i, (test_id, result) in enumerate(zip(new_test_ids, results)):
+            if not result.result():
+                with color_utils.ColorizeStderrError():
+                    print('Terminating early due to error.',
+                          file=sys.stderr)
+                return False
+            print('Generated', inflection.ordinalize(i), 'case',
+                  'with id', test_id, 'and seed', case_seed(master_seed, i),
+                  file=sys.stderr)
+
+    with color_utils.ColorizeStderrGood():
+        print('Successfully generated', num_cases, 'test cases for',
+              'problem', prob.name,
+              file=sys.stderr)
+    return True
+
+
+def check_executable(executable_path: pathlib.Path) -> bool:
     if not executable_path.is_file():
         with color_utils.ColorizeStderrError():
             print('ERROR:', executable_path, 'is not a file',
@@ -29,90 +87,244 @@ def generate_tests(prob: problem.Problem,
                   file=sys.stderr)
         return False
 
-    print('Generating', num_cases, 'test cases for problem', prob.name,
-          'with executable', executable_path,
-          file=sys.stderr)
+    return True
+
 
+def get_new_test_ids(prob: problem.Problem,
+                     prefix: str,
+                     num_cases: int,
+) -> List[str]:
     existing_test_ids = set(prob.get_test_ids())
     id_gen = (prefix + '{:06d}'.format(i) for i in itertools.count())
-    new_test_ids = list(itertools.islice(
+    return list(itertools.islice(
         (test_id for test_id in id_gen if test_id not in existing_test_ids),
         num_cases))
 
-    rng = random.SystemRandom()
-    for i, test_id in enumerate(new_test_ids):
-        seed = rng.getrandbits(31)
-        print('Generating', inflection.ordinalize(i), 'case',
-              'with id', test_id, 'and seed', seed,
-              file=sys.stderr)
-        input_path = prob.get_test_input_path(test_id)
-        answer_path = prob.get_test_answer_path(test_id)
 
-        if not _generate(i, seed, executable_path, input_path, answer_path):
+def random_master_seed() -> int:
+    return random.SystemRandom().getrandbits(31)
+
+
+def case_seed(master_seed: int, seq_num: int) -> int:
+    # Derived by hashing rather than by drawing from a seeded RNG in
+    # sequence, so that any one case can be regenerated on its own.
+    digest = hashlib.sha256('{}:{}'.format(master_seed, seq_num).encode())
+    return int.from_bytes(digest.digest()[:4], 'big') & 0x7fffffff
+
+
+# Each result is True if the case was generated, False if generation failed,
+# or None if it was abandoned because another case failed.
+_Results = List['concurrent.futures.Future[Optional[bool]]']
+
+
+@contextlib.contextmanager
+def _generate_all(prob: problem.Problem,
+                  executable_path: pathlib.Path,
+                  master_seed: int,
+                  test_ids: List[str],
+                  jobs: int,
+) -> Iterator[_Results]:
+    def generate(i: int, test_id: str) -> bool:
+        return _generate(i, case_seed(master_seed, i), executable_path,
+                         prob.store, test_id)
+
+    pool = concurrent.futures.ThreadPoolExecutor(max_workers=jobs)
+    try:
+        yield [pool.submit(generate, i, test_id)
+               for i, test_id in enumerate(test_ids)]
+    finally:
+        pool.shutdown(wait=True, cancel_futures=True)
+
+
+@contextlib.contextmanager
+def _generate_all_with_reference(prob: problem.Problem,
+                                 executable_path: pathlib.Path,
+                                 reference: solution.Solution,
+                                 master_seed: int,
+                                 test_ids: List[str],
+                                 jobs: int,
+) -> Iterator[_Results]:
+    # Generator workers write inputs and hand them to reference workers,
+    # which compute the answers. The queue between them is bounded, so
+    # generators can't run far ahead of a slow reference.
+    results = [concurrent.futures.Future() for _ in test_ids]  # type: _Results
+    inputs = queue.Queue(maxsize=jobs)  # type: queue.Queue
+    stop = threading.Event()
+    indices = iter(range(len(test_ids)))
+    indices_lock = threading.Lock()
+
+    def finish(i: int, result: Optional[bool]) -> None:
+        if not result:
+            stop.set()
+        results[i].set_result(result)
+
+    def generate_inputs() -> None:
+        while not stop.is_set():
+            with indices_lock:
+                i = next(indices, None)
+            if i is None:
+                return
+
+            temp_input_path = prob.store.temp_path(test_ids[i],
+                                                   testcase_store.INPUT)
+            try:
+                with open(temp_input_path, 'wb') as input_file:
+                    generated = run_generator(
+                        i, case_seed(master_seed, i), executable_path,
+                        input_file, subprocess.DEVNULL)
+            except Exception as e:
+                generated = False
+                results[i].set_exception(e)
+            if not generated:
+                with contextlib.suppress(FileNotFoundError):
+                    temp_input_path.unlink()
+                if not results[i].done():
+                    finish(i, False)
+                stop.set()
+                return
+
+            while not stop.is_set():
+                try:
+                    inputs.put((i, temp_input_path), timeout=_QUEUE_POLL_SEC)
+                    break
+                except queue.Full:
+                    pass
+            else:
+                temp_input_path.unlink()
+                finish(i, None)
+
+    def compute_answers() -> None:
+        while True:
+            item = inputs.get()
+            if item is None:
+                return
+            i, temp_input_path = item
+            if stop.is_set():
+                temp_input_path.unlink()
+                finish(i, None)
+                continue
+            try:
+                finish(i, _compute_answer(reference, temp_input_path,
+                                          prob.store, test_ids[i],
+                                          case_seed(master_seed, i)))
+            except Exception as e:
+                stop.set()
+                results[i].set_exception(e)
+
+    generators = [threading.Thread(target=generate_inputs)
+                  for _ in range(jobs)]
+    references = [threading.Thread(target=compute_answers)
+                  for _ in range(jobs)]
+    for thread in generators + references:
+        thread.start()
+
+    try:
+        yield results
+    finally:
+        stop.set()
+        for thread in generators:
+            thread.join()
+        for _ in references:
+            inputs.put(None)
+        for thread in references:
+            thread.join()
+
+
+def _compute_answer(reference: solution.Solution,
+                    temp_input_path: pathlib.Path,
+                    store: testcase_store.TestCaseStore,
+                    test_id: str,
+                    seed: int,
+) -> bool:
+    temp_answer_path = store.temp_path(test_id, testcase_store.ANSWER)
+    try:
+        exec_result = reference.run(temp_input_path, temp_answer_path)
+        if not reference.succeeded(exec_result, temp_answer_path):
             with color_utils.ColorizeStderrError():
-                print('Terminating early due to error.',
+                print('ERROR: reference solution',
+                      solution.describe_failure(exec_result),
+                      'on the input for seed', seed,
                       file=sys.stderr)
             return False
 
-    with color_utils.ColorizeStderrGood():
-        print('Successfully generated', num_cases, 'test cases for',
-              'problem', prob.name,
-              file=sys.stderr)
+        store.put(test_id, testcase_store.ANSWER, temp_answer_path)
+        store.put(test_id, testcase_store.INPUT, temp_input_path)
+        return True
+
+    finally:
+        for temp_path in (temp_input_path, temp_answer_path):
+            with contextlib.suppress(FileNotFoundError):
+                temp_path.unlink()
+
+
+def run_generator(seq_num: int,
+                  seed: int,
+                  executable_path: pathlib.Path,
+                  input_file: IO,
+                  answer_file: Union[IO, int],
+                  cwd: Optional[pathlib.Path] = None,
+                  size: Optional[int] = None,
+) -> bool:
+    with contextlib.ExitStack() as stack:
+        if cwd is None:
+            cwd = pathlib.Path(
+                stack.enter_context(tempfile.TemporaryDirectory()))
+        args = [
+            str(executable_path.resolve()),
+            str(seq_num),
+            str(seed),
+        ]
+        if size is not None:
+            args.append(str(size))
+        exec_result = solution.run_helper(
+            ' '.join(shlex.quote(arg) for arg in args),
+            cwd=cwd,
+            stdin=subprocess.DEVNULL,
+            stdout=input_file,
+            stderr=answer_file)
+
+    if (exec_result.returncode != 0 or exec_result.timed_out or
+            exec_result.output_limit_exceeded):
+        with color_utils.ColorizeStderrError():
+            print('ERROR: generator executable',
+                  solution.describe_failure(exec_result),
+                  'for seed', seed,
+                  file=sys.stderr)
+        return False
     return True
 
 
 def _generate(seq_num: int,
               seed: int,
               executable_path: pathlib.Path,
-              input_path: pathlib.Path,
-              answer_path: pathlib.Path,
+              store: testcase_store.TestCaseStore,
+              test_id: str,
 ) -> bool:
-    should_unlink_input = False
-    should_unlink_answer = False
+    # Write to temporary files and move them into the store, so an
+    # interrupted or failed generator never leaves a partial test case
+    # behind.
+    temp_input_path = store.temp_path(test_id, testcase_store.INPUT)
+    temp_answer_path = store.temp_path(test_id, testcase_store.ANSWER)
 
     try:
-        with tempfile.TemporaryDirectory() as tmpdir, \
-                open(input_path, 'wb') as input_file, \
-                open(answer_path, 'wb') as answer_file:
-            args = [
-                str(executable_path.resolve()),
-                str(seq_num),
-                str(seed),
-            ]
-            try:
-                sp_result = subprocess.run(args,
-                    cwd=tmpdir,
-                    stdin=subprocess.DEVNULL,
-                    stdout=input_file,
-                    stderr=answer_file)
-            except:
-                should_unlink_input = True
-                should_unlink_answer = True
-                raise
-
-        if sp_result.returncode != 0:
-            with color_utils.ColorizeStderrError():
-                print('ERROR: generator executable finished',
-                      'with exit code', sp_result.returncode,
-                      file=sys.stderr)
-            should_unlink_input = True
-            should_unlink_answer = True
-            return False
+        with open(temp_input_path, 'wb') as input_file, \
+                open(temp_answer_path, 'wb') as answer_file:
+            if not run_generator(seq_num, seed, executable_path,
+                                 input_file, answer_file):
+                return False
 
-        if os.path.getsize(answer_path) == 0:
+        if os.path.getsize(temp_answer_path) == 0:
             with color_utils.ColorizeStderrWarning():
-                print('No answer file generated for this test case.',
+                print('No answer file generated for seed', seed,
                       file=sys.stderr)
                 print('(the expected output should be printed to stderr)',
                       file=sys.stderr)
-            should_unlink_answer = True
-
+        else:
+            store.put(test_id, testcase_store.ANSWER, temp_answer_path)
+        store.put(test_id, testcase_store.INPUT, temp_input_path)
         return True
 
     finally:
-        if should_unlink_input:
-            with contextlib.suppress(FileNotFoundError):
-                input_path.unlink()
-        if should_unlink_answer:
+        for temp_path in (temp_input_path, temp_answer_path):
             with contextlib.suppress(FileNotFoundError):
-                answer_path.unlink()
+                temp_path.unlink()
@@ -0,0 +1,102 @@
+import ctypes
+import ctypes.util
+import os
+import pathlib
+import select
+import struct
+import threading
+import time
+from typing import Optional, Tuple
+
+
+# From <sys/inotify.h>
+_IN_CLOEXEC = 0o2000000
+_IN_NONBLOCK = 0o4000
+_IN_CLOSE_WRITE = 0x00000008
+_IN_MOVED_TO = 0x00000080
+_IN_CREATE = 0x00000100
+_EVENT_HEADER = struct.Struct('iIII')
+
+_POLL_INTERVAL = 0.2
+
+
+class FileWatcher(object):
+    # Watches the parent directory rather than the file itself: editors
+    # often save by writing a new file and renaming it over the old one.
+    def __init__(self, path: pathlib.Path) -> None:
+        self.path = path.resolve()
+        self._inotify_fd = self._init_inotify()
+        self._last_stat = self._stat()
+
+    def _init_inotify(self) -> Optional[int]:
+        try:
+            libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+            inotify_init1 = libc.inotify_init1
+            inotify_add_watch = libc.inotify_add_watch
+        except (OSError, AttributeError, TypeError):
+            return None  # not Linux; fall back to polling
+
+        fd = inotify_init1(_IN_CLOEXEC | _IN_NONBLOCK)
+        if fd < 0:
+            return None
+        mask = _IN_CLOSE_WRITE | _IN_MOVED_TO | _IN_CREATE
+        if inotify_add_watch(fd, os.fsencode(self.path.parent), mask) < 0:
+            os.close(fd)
+            return None
+        return fd
+
+    def _stat(self) -> Optional[Tuple[int, int]]:
+        try:
+            stat = self.path.stat()
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def _read_inotify_events(self) -> bool:
+        assert self._inotify_fd is not None
+        changed = False
+        try:
+            data = os.read(self._inotify_fd, 1 << 16)
+        except BlockingIOError:
+            return False
+
+        offset = 0
+        while offset < len(data):
+            _, _, _, name_len = _EVENT_HEADER.unpack_from(data, offset)
+            offset += _EVENT_HEADER.size
+            name = data[offset:offset + name_len].rstrip(b'\0')
+            offset += name_len
+            if name == os.fsencode(self.path.name):
+                changed = True
+        return changed
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            remaining = None  # type: Optional[float]
+            if deadline is not None:
+                remaining = max(0.0, deadline - time.monotonic())
+
+            if self._inotify_fd is not None:
+                readable, _, _ = select.select(
+                    [self._inotify_fd], [], [], remaining)
+                if readable and self._read_inotify_events():
+                    return True
+            else:
+                time.sleep(_POLL_INTERVAL if remaining is None
+                           else min(remaining, _POLL_INTERVAL))
+                stat = self._stat()
+                if stat != self._last_stat:
+                    self._last_stat = stat
+                    return True
+
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+
+    def watch_in_background(self, changed: threading.Event) -> None:
+        def loop() -> None:
+            while True:
+                if self.wait():
+                    changed.set()
+
+        threading.Thread(target=loop, daemon=True).start()
@@ -1,11 +1,14 @@
 from typing import Dict, IO, Optional
-import yaml
+
+# yaml is imported where it's used: it is slow to import, and most commands
+# get their settings from config's snapshot instead.
 
 
 def load_dict(s: Optional[str]) -> Dict:
     if not s:
         return {}
 
+    import yaml
     d = yaml.safe_load(s)
     if d is None:
         return {}
@@ -15,4 +18,5 @@ def load_dict(s: Optional[str]) -> Dict:
 
 
 def write_dict(d: Dict, f: IO) -> None:
+    import yaml
     yaml.safe_dump(d, stream=f)
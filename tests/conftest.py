@@ -0,0 +1,72 @@
+import contextlib
+import pathlib
+from typing import Callable, Dict, Iterator, Optional
+
+import pytest
+
+from pcu import config
+from pcu import paths
+from pcu import problem
+from pcu import testcase_store
+
+
+def _clear_path_caches() -> None:
+    for value in vars(paths).values():
+        if hasattr(value, 'cache_clear'):
+            value.cache_clear()
+
+
+@pytest.fixture(autouse=True)
+def pcu_home(tmp_path: pathlib.Path,
+             monkeypatch: pytest.MonkeyPatch,
+) -> pathlib.Path:
+    # Every test gets a ~/.pcu of its own.
+    monkeypatch.setenv('HOME', str(tmp_path))
+    monkeypatch.setenv('PCU_NO_DAEMON', '1')
+    monkeypatch.setattr(config, '_cached_settings', None)
+    _clear_path_caches()
+    paths.base_path().mkdir()
+    yield paths.base_path()
+    _clear_path_caches()
+
+
+@pytest.fixture
+def make_problem(pcu_home: pathlib.Path,
+) -> Iterator[Callable[..., problem.Problem]]:
+    # Creates (and enters) problems, like "pcu make" would.
+    with contextlib.ExitStack() as stack:
+        def make(name: str = 'prob',
+                 env_name: str = 'python3',
+                 env_overrides: Optional[Dict] = None,
+                 storage: Optional[str] = None,
+        ) -> problem.Problem:
+            env = config.get_settings().get_env(env_name)
+            prob = stack.enter_context(
+                problem.Problem(name, env=env, storage=storage))
+            if env_overrides:
+                prob.env_overrides.update(env_overrides)
+                prob.update_env()
+            return prob
+
+        yield make
+
+
+def add_test(prob: problem.Problem,
+             test_id: str,
+             input_data: bytes,
+             answer_data: Optional[bytes] = None,
+) -> None:
+    if answer_data is not None:
+        with prob.store.open(test_id, testcase_store.ANSWER,
+                             'wb') as outfile:
+            outfile.write(answer_data)
+    with prob.store.open(test_id, testcase_store.INPUT, 'wb') as outfile:
+        outfile.write(input_data)
+
+
+def write_source(prob: problem.Problem,
+                 working_dir: pathlib.Path,
+                 source: str,
+) -> None:
+    with open(working_dir / prob.source_file, 'w') as outfile:
+        outfile.write(source)
@@ -0,0 +1,71 @@
+import math
+
+import pytest
+
+from conftest import add_test, write_source
+from pcu import abtest
+from pcu import testcase_store
+
+
+def _abtest(prob, tmp_path, source_a, source_b, runs=2):
+    variants = []
+    working_dirs = []
+    for name, source in [('a', source_a), ('b', source_b)]:
+        variant = prob.variant(source_file=name + '.py')
+        working_dir = tmp_path / name
+        working_dir.mkdir()
+        write_source(variant, working_dir, source)
+        variants.append(variant)
+        working_dirs.append(working_dir)
+    return abtest.abtest(variants[0], working_dirs[0], variants[1],
+                         working_dirs[1], prob.get_test_ids(), 0, runs)
+
+
+def test_speedup_interval():
+    speedup, interval = abtest.speedup_interval([math.log(2)])
+    assert speedup == pytest.approx(2)
+    assert interval is None
+
+    speedup, interval = abtest.speedup_interval(
+        [math.log(1.9), math.log(2.1), math.log(2)])
+    assert speedup == pytest.approx(2, rel=0.01)
+    assert interval[0] < speedup < interval[1]
+
+
+def test_overall_interval_is_across_test_cases(make_problem, tmp_path,
+                                               monkeypatch):
+    # However many runs there are of each case, the overall interval comes
+    # from one mean per case.
+    prob = make_problem()
+    add_test(prob, 't1', b'')
+    add_test(prob, 't2', b'')
+    lengths = []
+    real_speedup_interval = abtest.speedup_interval
+
+    def speedup_interval(log_ratios):
+        lengths.append(len(log_ratios))
+        return real_speedup_interval(log_ratios)
+
+    monkeypatch.setattr(abtest, 'speedup_interval', speedup_interval)
+    assert _abtest(prob, tmp_path, 'print(1)\n', 'print(1)\n', runs=3)
+    assert lengths == [3, 3, 2]
+
+
+def test_saved_outputs_are_left_alone(make_problem, tmp_path, capfd):
+    prob = make_problem()
+    add_test(prob, 't1', b'', b'1\n')
+    with prob.store.open('t1', testcase_store.OUTPUT, 'wb') as outfile:
+        outfile.write(b'saved\n')
+
+    assert _abtest(prob, tmp_path, 'print(1)\n', 'print( 1 )\n')
+    assert 'outputs differ' not in capfd.readouterr().err
+    with prob.store.open('t1', testcase_store.OUTPUT) as infile:
+        assert infile.read() == b'saved\n'
+    assert not prob.store.exists('t1', testcase_store.STATS)
+
+
+def test_different_outputs_are_reported(make_problem, tmp_path, capfd):
+    prob = make_problem()
+    add_test(prob, 't1', b'')
+    assert _abtest(prob, tmp_path, 'print(1)\n', 'print(2)\n')
+    assert 'outputs differ' in capfd.readouterr().err
@@ -0,0 +1,64 @@
+import statistics
+
+import pytest
+
+from conftest import add_test, write_source
+from pcu import bench
+from pcu import runner
+from pcu import yaml_util
+
+
+def test_percentile_interpolates_between_ranks():
+    values = [1.0, 2.0, 3.0, 4.0, 10.0]
+    assert bench.percentile(values, 0) == 1.0
+    assert bench.percentile(values, 0.5) == 3.0
+    assert bench.percentile(values, 1) == 10.0
+    assert bench.percentile(values, 0.95) == pytest.approx(
+        statistics.quantiles(values, n=100, method='inclusive')[94])
+
+
+def test_timing_stats():
+    stats = bench.TimingStats([3.0, 1.0, 2.0])
+    assert (stats.min, stats.median, stats.max) == (1.0, 2.0, 3.0)
+    assert stats.spread == pytest.approx(0.5)
+    assert bench.TimingStats([2.0]).spread == 0.0
+
+
+def _bench(make_problem, tmp_path, monkeypatch, source, warmups, runs):
+    prob = make_problem()
+    add_test(prob, 't1', b'', b'1\n')
+    working_dir = tmp_path / 'work'
+    working_dir.mkdir()
+    write_source(prob, working_dir, source)
+    monkeypatch.chdir(working_dir)
+    assert bench.bench(prob, working_dir, ['t1'], warmups, runs, 10)
+    results_paths = list(prob.bench_path.iterdir())
+    assert len(results_paths) == 1
+    return yaml_util.load_dict(results_paths[0].read_text())
+
+
+def test_bench_runs_warmups_and_timed_runs(make_problem, tmp_path,
+                                           monkeypatch):
+    counter_path = tmp_path / 'runs'
+    results = _bench(make_problem, tmp_path, monkeypatch,
+                     'open({!r}, "a").write("x")\nprint(1)\n'.format(
+                         str(counter_path)),
+                     2, 3)
+    assert counter_path.read_text() == 'xxxxx'
+    assert (results['warmups'], results['runs']) == (2, 3)
+    case = results['cases']['t1']
+    assert case['result'] == 'CORRECT'
+    wall_time = case['wall_time']
+    assert (0 < wall_time['min'] <= wall_time['median'] <= wall_time['p95']
+            <= wall_time['max'])
+
+
+def test_bench_stops_on_a_failing_case(make_problem, tmp_path, monkeypatch):
+    counter_path = tmp_path / 'runs'
+    results = _bench(make_problem, tmp_path, monkeypatch,
+                     'open({!r}, "a").write("x")\nprint(2)\n'.format(
+                         str(counter_path)),
+                     2, 3)
+    assert counter_path.read_text() == 'x'
+    assert results['cases']['t1']['result'] == (
+        runner.TestCaseResult.WRONG_ANSWER.name)
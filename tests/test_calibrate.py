@@ -0,0 +1,61 @@
+import pytest
+
+from conftest import add_test, write_source
+from pcu import calibrate
+from pcu import config
+from pcu import paths
+from pcu import runner
+
+
+def test_write_speed_factor_keeps_the_rest(pcu_home):
+    paths.settings_path().write_text(
+        '# my settings\nmax_lines_output: 10\nspeed_factor: 1.0  # old\n')
+    calibrate.write_speed_factor(1.5)
+    assert paths.settings_path().read_text() == (
+        '# my settings\nmax_lines_output: 10\nspeed_factor: 1.500\n')
+    assert config.reload_settings().speed_factor == 1.5
+
+
+def test_write_speed_factor_adds_the_line(pcu_home):
+    paths.settings_path().write_text('max_lines_output: 10')
+    calibrate.write_speed_factor(0.25)
+    assert paths.settings_path().read_text() == (
+        'max_lines_output: 10\nspeed_factor: 0.250\n')
+
+
+def test_speed_factor_scales_time_limits(pcu_home, make_problem):
+    paths.settings_path().write_text('speed_factor: 2.0\n')
+    prob = make_problem(env_overrides={'run_timelimit_msec': 1500})
+    assert runner.timelimit(prob) == pytest.approx(3.0)
+
+
+def _run_one(prob, tmp_path, source):
+    working_dir = tmp_path / 'work'
+    working_dir.mkdir()
+    write_source(prob, working_dir, source)
+    add_test(prob, 't1', b'')
+    return runner.run_case(prob, working_dir, 't1')
+
+
+def test_cpu_mode_allows_waiting(make_problem, tmp_path):
+    # Sleeping past the limit uses no CPU time.
+    prob = make_problem(env_overrides={'run_timelimit_msec': 400,
+                                       'timelimit_mode': 'cpu'})
+    report = _run_one(prob, tmp_path, 'import time\ntime.sleep(0.6)\n')
+    assert report.result == runner.TestCaseResult.NO_ANSWER_FILE_PROVIDED
+    assert report.exec_result.wall_time > 0.6
+
+
+def test_cpu_mode_stops_busy_loops(make_problem, tmp_path):
+    prob = make_problem(env_overrides={'run_timelimit_msec': 400,
+                                       'timelimit_mode': 'cpu'})
+    report = _run_one(prob, tmp_path, 'while True: pass\n')
+    assert report.result == runner.TestCaseResult.TIME_LIMIT_EXCEEDED
+    assert report.exec_result.cpu_time > 0.4
+
+
+def test_wall_mode_stops_waiting(make_problem, tmp_path):
+    prob = make_problem(env_overrides={'run_timelimit_msec': 400})
+    report = _run_one(prob, tmp_path, 'import time\ntime.sleep(5)\n')
+    assert report.result == runner.TestCaseResult.TIME_LIMIT_EXCEEDED
+    assert report.exec_result.wall_time < 3
@@ -0,0 +1,170 @@
+import random
+import re
+
+import pytest
+
+from pcu import compare
+
+
+def _old_compare(expected_path, actual_path):
+    # What runner did before compare.py: read both files whole, in text
+    # mode.
+    with open(expected_path, 'r') as infile:
+        expected = infile.read()
+    with open(actual_path, 'r') as infile:
+        actual = infile.read()
+    match_exact = expected == actual
+    match_minus_whitespace = match_exact or \
+        ''.join(expected.split()) == ''.join(actual.split())
+    return match_exact, match_minus_whitespace
+
+
+def _naive_mismatch(expected, offset):
+    # Where compare.Mismatch says the difference at offset (into the
+    # expected text, with normalized newlines) is.
+    tokens = sum(1 for match in re.finditer(r'\S+', expected)
+                 if match.start() <= offset)
+    if offset >= len(expected) or expected[offset].isspace():
+        tokens += 1
+    return offset, expected[:offset].count('\n') + 1, tokens
+
+
+def _first_difference(a, b):
+    for i, (x, y) in enumerate(zip(a, b)):
+        if x != y:
+            return i
+    return None if len(a) == len(b) else min(len(a), len(b))
+
+
+def _random_text(rng):
+    return ''.join(rng.choice('ab  \n\n\r\t')
+                   for _ in range(rng.randrange(12)))
+
+
+@pytest.mark.parametrize('chunk_size', [1, 3, 1 << 20])
+def test_matches_old_implementation(tmp_path, monkeypatch, chunk_size):
+    monkeypatch.setattr(compare, '_CHUNK_SIZE', chunk_size)
+    rng = random.Random(chunk_size)
+    expected_path = tmp_path / 'expected'
+    actual_path = tmp_path / 'actual'
+    for _ in range(500):
+        expected = _random_text(rng)
+        actual = (expected if rng.random() < 0.2
+                  else _random_text(rng))
+        expected_path.write_bytes(expected.encode())
+        actual_path.write_bytes(actual.encode())
+
+        comparison = compare.compare_files(expected_path, actual_path)
+        assert ((comparison.match_exact,
+                 comparison.match_minus_whitespace) ==
+                _old_compare(expected_path, actual_path)), (expected, actual)
+
+        with open(expected_path) as infile:
+            expected_text = infile.read()
+        with open(actual_path) as infile:
+            actual_text = infile.read()
+        if not comparison.match_exact:
+            mismatch = comparison.exact_mismatch
+            assert ((mismatch.byte_offset, mismatch.line, mismatch.token) ==
+                    _naive_mismatch(expected_text, _first_difference(
+                        expected_text, actual_text))), (expected, actual)
+        if not comparison.match_minus_whitespace:
+            positions = [i for i, c in enumerate(expected_text)
+                         if not c.isspace()]
+            stripped_offset = _first_difference(
+                ''.join(expected_text.split()), ''.join(actual_text.split()))
+            offset = (positions[stripped_offset]
+                      if stripped_offset < len(positions)
+                      else len(expected_text))
+            mismatch = comparison.whitespace_mismatch
+            assert ((mismatch.byte_offset, mismatch.line, mismatch.token) ==
+                    _naive_mismatch(expected_text, offset)), (expected,
+                                                              actual)
+
+
+def test_large_files_are_compared_in_chunks(tmp_path, monkeypatch):
+    # Only ever a chunk of each file in memory: a difference far in is
+    # still found, and placed right.
+    monkeypatch.setattr(compare, '_CHUNK_SIZE', 4096)
+    expected_path = tmp_path / 'expected'
+    actual_path = tmp_path / 'actual'
+    lines = ['{}\n'.format(i) for i in range(100000)]
+    expected_path.write_text(''.join(lines))
+    lines[76543] = 'x\n'
+    actual_path.write_text(''.join(lines))
+
+    comparison = compare.compare_files(expected_path, actual_path)
+    assert not comparison.match_minus_whitespace
+    assert comparison.whitespace_mismatch.line == 76544
+    assert comparison.whitespace_mismatch.token == 76544
+
+
+def _unified_diff(expected_path, actual_path, context_lines):
+    import difflib
+    with open(expected_path) as infile:
+        expected = infile.readlines()
+    with open(actual_path) as infile:
+        actual = infile.readlines()
+    return list(difflib.unified_diff(expected, actual, 'expected output',
+                                     'actual output', n=context_lines))
+
+
+@pytest.mark.parametrize('changes', [
+    {3: 'x\n'},
+    {0: 'x\n', 1: 'y\n'},
+    {10: 'x\n', 12: 'y\n', 30: 'z\n'},
+    {49: 'x\n'},
+])
+def test_windowed_diff_matches_unified_diff(tmp_path, changes):
+    expected_path = tmp_path / 'expected'
+    actual_path = tmp_path / 'actual'
+    lines = ['{}\n'.format(i) for i in range(50)]
+    expected_path.write_text(''.join(lines))
+    for i, line in changes.items():
+        lines[i] = line
+    actual_path.write_text(''.join(lines))
+
+    diff = compare.windowed_diff(expected_path, actual_path, 1000)
+    assert diff.lines == _unified_diff(expected_path, actual_path, 1)
+    assert diff.further_differences == 0
+
+
+def test_windowed_diff_stops_after_the_window(tmp_path):
+    expected_path = tmp_path / 'expected'
+    actual_path = tmp_path / 'actual'
+    expected_path.write_text(''.join('{}\n'.format(i)
+                                     for i in range(100000)))
+    actual_path.write_text(''.join('{}\n'.format(i if i < 500 else -i)
+                                   for i in range(100000)))
+
+    diff = compare.windowed_diff(expected_path, actual_path, 10)
+    assert len(diff.lines) >= 10
+    assert diff.lines[:2] == ['--- expected output\n',
+                              '+++ actual output\n']
+    assert diff.lines[2].startswith('@@ -500,')
+    assert diff.lines[3] == ' 499\n'
+    assert diff.lines[4] == '-500\n'
+    assert 0 < diff.further_differences < 100000 - 500
+
+
+def test_windowed_diff_counts_positions_past_the_window(tmp_path):
+    # A line inserted past the window shifts every line after it.
+    expected_path = tmp_path / 'expected'
+    actual_path = tmp_path / 'actual'
+    lines = ['{}\n'.format(i) for i in range(100000)]
+    expected_path.write_text(''.join(lines))
+    lines[0] = 'changed\n'
+    lines.insert(90000, 'inserted\n')
+    actual_path.write_text(''.join(lines))
+
+    diff = compare.windowed_diff(expected_path, actual_path, 10)
+    assert diff.lines[3] == '-0\n'
+    assert diff.further_differences == 100000 - 90000 + 1
+
+
+def test_windowed_diff_of_equal_files(tmp_path):
+    path = tmp_path / 'same'
+    path.write_text('1\n2\n')
+    diff = compare.windowed_diff(path, path, 10)
+    assert diff.lines == []
+    assert diff.further_differences == 0
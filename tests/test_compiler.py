@@ -0,0 +1,88 @@
+import os
+import threading
+import time
+
+from conftest import write_source
+from pcu import compile_cache
+from pcu import compiler
+from pcu import paths
+
+
+def _compile(make_problem, tmp_path, compile_command, cancel=None):
+    prob = make_problem(env_overrides={'compile_command': compile_command})
+    working_dir = tmp_path / 'work'
+    working_dir.mkdir()
+    write_source(prob, working_dir, 'print(1)\n')
+    return compiler.compile(prob, working_dir, copy_source=False,
+                            use_cache=False, cancel=cancel)
+
+
+def test_compile_succeeds(make_problem, tmp_path):
+    assert _compile(make_problem, tmp_path, 'true')
+
+
+def test_compile_fails(make_problem, tmp_path):
+    assert not _compile(make_problem, tmp_path, 'false')
+
+
+def test_cancelled_compile_is_killed(make_problem, tmp_path, capfd):
+    # As when the source is saved again while "pcu watch" compiles it.
+    cancel = threading.Event()
+    timer = threading.Timer(0.3, cancel.set)
+    timer.start()
+    start = time.monotonic()
+    try:
+        assert not _compile(make_problem, tmp_path, 'sleep 30', cancel)
+    finally:
+        timer.cancel()
+    assert time.monotonic() - start < 10
+    assert 'Compile cancelled.' in capfd.readouterr().err
+
+
+def _cached_compile(prob, tmp_path, source):
+    working_dir = tmp_path / 'work{}'.format(len(list(tmp_path.iterdir())))
+    working_dir.mkdir()
+    write_source(prob, working_dir, source)
+    assert compiler.compile(prob, working_dir, copy_source=False)
+    return working_dir
+
+
+def test_unchanged_source_reuses_compile_output(make_problem, tmp_path):
+    counter_path = tmp_path / 'compiles'
+    counter_path.write_text('')
+    prob = make_problem(env_overrides={
+        'compile_command': "sh -c 'echo >> {}; cp prob.py built'".format(
+            counter_path)})
+    builds = tmp_path / 'builds'
+    builds.mkdir()
+
+    working_dir = _cached_compile(prob, builds, 'print(1)\n')
+    assert (working_dir / 'built').read_text() == 'print(1)\n'
+    working_dir = _cached_compile(prob, builds, 'print(1)\n')
+    assert (working_dir / 'built').read_text() == 'print(1)\n'
+    assert counter_path.read_text().count('\n') == 1
+
+    working_dir = _cached_compile(prob, builds, 'print(2)\n')
+    assert (working_dir / 'built').read_text() == 'print(2)\n'
+    assert counter_path.read_text().count('\n') == 2
+
+    # A different command is a different build, too.
+    prob.env_overrides['compile_command'] += ' '
+    prob.update_env()
+    _cached_compile(prob, builds, 'print(2)\n')
+    assert counter_path.read_text().count('\n') == 3
+
+
+def test_eviction_drops_least_recently_used(pcu_home, tmp_path):
+    for i, key in enumerate(['old', 'mid', 'new']):
+        working_dir = tmp_path / key
+        working_dir.mkdir()
+        (working_dir / 'built').write_bytes(b'x' * 1000)
+        compile_cache.store(key, working_dir)
+        os.utime(paths.compile_cache_path() / key, (i, i))
+
+    compile_cache._evict(2500)
+    assert sorted(path.name for path
+                  in paths.compile_cache_path().iterdir()) == ['mid', 'new']
+    assert compile_cache.restore('new', tmp_path / 'new')
+    assert not compile_cache.restore('old', tmp_path / 'old')
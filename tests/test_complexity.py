@@ -0,0 +1,40 @@
+import math
+import random
+
+import pytest
+
+from pcu import complexity
+
+
+def test_step_sizes_double():
+    assert complexity.step_sizes(1000, 4) == [125, 250, 500, 1000]
+    assert complexity.step_sizes(2, 5) == [1, 2]
+
+
+@pytest.mark.parametrize('name, f', [
+    ('O(1)', lambda n: 0),
+    ('O(n)', lambda n: n),
+    ('O(n log n)', lambda n: n * math.log2(n)),
+    ('O(n^2)', lambda n: n ** 2),
+    ('O(n^3)', lambda n: n ** 3),
+])
+def test_fit_finds_the_class(name, f):
+    rng = random.Random(name)
+    sizes = complexity.step_sizes(1 << 14, 10)
+    scale = 2.0 / f(sizes[-1]) if f(sizes[-1]) else 0
+    # 5 ms of startup, then up to two seconds of work, with 2% noise.
+    times = [(0.005 + scale * f(n)) * rng.uniform(0.98, 1.02)
+             for n in sizes]
+    fits = complexity.fit_classes(sizes, times)
+    assert fits[0].name == name
+    assert fits[0].weight > fits[1].weight
+    assert sum(fit.weight for fit in fits) == pytest.approx(1)
+    assert fits[0].predict(sizes[-1]) == pytest.approx(times[-1], rel=0.1)
+
+
+def test_fit_never_has_negative_startup_time():
+    sizes = [1, 2, 4, 8, 16]
+    times = [0.001, 0.001, 0.002, 0.004, 0.016]
+    for fit in complexity.fit_classes(sizes, times):
+        assert fit.constant >= 0
+        assert fit.coefficient >= 0
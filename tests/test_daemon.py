@@ -0,0 +1,88 @@
+import os
+import pathlib
+import socket
+import subprocess
+import sys
+import time
+
+import pytest
+
+from pcu import daemon
+
+
+_REPO_PATH = pathlib.Path(__file__).resolve().parent.parent
+
+# Exits with the command's exit code if the daemon ran it, or 99 if it
+# would have run in-process.
+_FORWARD = '''
+import sys
+from pcu import daemon
+returncode = daemon.forward(sys.argv[1:])
+sys.exit(99 if returncode is None else returncode)
+'''
+
+
+@pytest.fixture
+def pcu_env(monkeypatch):
+    monkeypatch.delenv('PCU_NO_DAEMON')
+    env = dict(os.environ)
+    env['PYTHONPATH'] = str(_REPO_PATH)
+    return env
+
+
+def _pcu(env, cwd, *argv):
+    return subprocess.run([sys.executable, '-c', _FORWARD] + list(argv),
+                          cwd=cwd, env=env, stdin=subprocess.DEVNULL,
+                          capture_output=True, timeout=60)
+
+
+def test_no_daemon_runs_in_process(pcu_env, tmp_path):
+    assert daemon.status() is None
+    assert _pcu(pcu_env, tmp_path, 'info').returncode == 99
+
+
+def test_daemon_runs_commands(pcu_env, tmp_path):
+    work_path = tmp_path / 'work'
+    work_path.mkdir()
+    assert daemon.start()
+    try:
+        status = daemon.status()
+        assert status is not None and status['pid'] > 0
+
+        result = _pcu(pcu_env, work_path, 'make', '-e', 'python3', 'p')
+        assert result.returncode == 0, result.stderr
+        # Run in our working directory, writing to our stderr.
+        assert (work_path / 'p.py').is_file()
+        assert b'Created python3 problem p' in result.stderr
+
+        result = _pcu(pcu_env, work_path, 'getin', 'p', 'nope')
+        assert result.returncode != 0
+        assert b'not found' in result.stderr
+    finally:
+        daemon.stop()
+    deadline = time.monotonic() + 10
+    while daemon._socket_path().exists() and time.monotonic() < deadline:
+        time.sleep(0.05)
+    assert daemon.status() is None
+    assert _pcu(pcu_env, work_path, 'info').returncode == 99
+
+
+def test_stalled_client_does_not_block_others(pcu_env, tmp_path):
+    assert daemon.start()
+    try:
+        # Connects, then never finishes its request.
+        stalled = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        stalled.connect(str(daemon._socket_path()))
+        stalled.sendall(b'{"argv": ')
+        try:
+            start_time = time.monotonic()
+            result = _pcu(pcu_env, tmp_path, 'make', '-e', 'python3', 'p')
+            assert result.returncode == 0, result.stderr
+            assert (time.monotonic() - start_time <
+                    daemon._REQUEST_TIMEOUT_SEC + 10)
+            # Dropped once its time was up.
+            assert stalled.recv(1) == b''
+        finally:
+            stalled.close()
+    finally:
+        daemon.stop()
@@ -0,0 +1,123 @@
+import subprocess
+import sys
+import time
+
+import pytest
+
+from pcu import execution
+from pcu import launcher
+
+
+_MB = 1024 * 1024
+
+
+def _run(command, cwd, **kwargs):
+    return execution.run_process(command,
+        cwd=cwd,
+        stdin=subprocess.DEVNULL,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+        **kwargs)
+
+
+def test_max_rss_excludes_our_own_memory(tmp_path):
+    if launcher.launcher_path() is None:
+        pytest.skip('no C compiler to build the launcher with')
+    ballast = b'x' * (200 * _MB)
+    exec_result = _run('true', tmp_path)
+    assert len(ballast) == 200 * _MB
+    assert exec_result.returncode == 0
+    assert 0 < exec_result.max_rss < 16 * _MB
+
+
+def test_max_rss_counts_the_program(tmp_path):
+    if launcher.launcher_path() is None:
+        pytest.skip('no C compiler to build the launcher with')
+    exec_result = _run(
+        "python3 -c 'x = b\"x\" * (100 * 1024 * 1024)'", tmp_path)
+    assert exec_result.returncode == 0
+    assert 100 * _MB < exec_result.max_rss < 150 * _MB
+
+
+@pytest.mark.parametrize('size_mb, exceeded', [(300, True), (1, False)])
+def test_launcher_notices_refused_allocations(tmp_path, size_mb, exceeded):
+    if launcher.launcher_path() is None:
+        pytest.skip('no C compiler to build the launcher with')
+    exec_result = _run(
+        "'{}' -c 'x = bytearray({} * 1024 * 1024)'".format(sys.executable,
+                                                           size_mb),
+        tmp_path, memlimit=64 * _MB)
+    assert (exec_result.returncode != 0) == exceeded
+    assert exec_result.memlimit_exceeded == exceeded
+
+
+@pytest.mark.parametrize('command, args', [
+    ('./binary.exe', ['./binary.exe']),
+    ("python3 'my file.py' -x", ['python3', 'my file.py', '-x']),
+    ('java -cp "a b" Main', ['java', '-cp', 'a b', 'Main']),
+    ('echo hi | cat', None),
+    ('./a.out < input', None),
+    ('echo $HOME', None),
+    ('echo "$HOME"', None),
+    ('echo *.py', None),
+    ('X=1 ./a.out', None),
+    ('cd out && ./a.out', None),
+    ("echo 'unterminated", None),
+    ('exec ./a.out', None),
+])
+def test_split_command(command, args):
+    assert execution.split_command(command) == args
+
+
+def _run_to_file(command, cwd, **kwargs):
+    with open(cwd / 'stdout', 'wb') as stdout:
+        exec_result = execution.run_process(command,
+            cwd=cwd,
+            stdin=subprocess.DEVNULL,
+            stdout=stdout,
+            stderr=subprocess.DEVNULL,
+            **kwargs)
+    return exec_result, (cwd / 'stdout').read_bytes()
+
+
+def test_direct_and_shell_commands(tmp_path):
+    exec_result, output = _run_to_file("printf '%s|' 'a b' c", tmp_path)
+    assert exec_result.returncode == 0
+    assert output == b'a b|c|'
+    exec_result, output = _run_to_file('echo hi | tr a-z A-Z', tmp_path)
+    assert exec_result.returncode == 0
+    assert output == b'HI\n'
+
+
+def test_missing_executable(tmp_path):
+    assert _run('./no-such-program', tmp_path).returncode == 127
+    assert _run('no-such-program-anywhere', tmp_path).returncode == 127
+
+
+def _is_running(pid):
+    try:
+        with open('/proc/{}/stat'.format(pid)) as infile:
+            return infile.read().rsplit(')', 1)[1].split()[0] != 'Z'
+    except FileNotFoundError:
+        return False
+
+
+def _wait_until_stopped(pid):
+    deadline = time.monotonic() + 5
+    while _is_running(pid) and time.monotonic() < deadline:
+        time.sleep(0.05)
+    return not _is_running(pid)
+
+
+def test_timeout_kills_the_whole_process_group(tmp_path):
+    exec_result = _run("sh -c 'sleep 30 & echo $! > pid; wait'", tmp_path,
+                       timeout=0.5)
+    assert exec_result.timed_out
+    assert exec_result.wall_time < 5
+    assert _wait_until_stopped(int((tmp_path / 'pid').read_text()))
+
+
+def test_background_processes_are_killed(tmp_path):
+    exec_result = _run("sh -c 'sleep 30 & echo $! > pid'", tmp_path)
+    assert exec_result.returncode == 0
+    assert _wait_until_stopped(int((tmp_path / 'pid').read_text()))
@@ -0,0 +1,73 @@
+from pcu import execution
+from pcu import history
+from pcu import runner
+
+
+def _record(prob, cases, cancelled=False):
+    run_report = runner.RunReport()
+    run_report.cancelled = cancelled
+    for test_id, (result, wall_time) in cases.items():
+        run_report.cases[test_id] = runner.CaseReport(
+            result, execution.ExecResult(0, False, wall_time, wall_time,
+                                         1024))
+    history.record_run(prob, run_report)
+
+
+_CORRECT = runner.TestCaseResult.CORRECT
+_WRONG = runner.TestCaseResult.WRONG_ANSWER
+
+
+def test_runs_are_recorded_in_order(make_problem):
+    prob = make_problem()
+    _record(prob, {'t1': (_CORRECT, 0.5), 't2': (_WRONG, 0.25)})
+    _record(prob, {'t1': (_CORRECT, 0.5)}, cancelled=True)
+    _record(prob, {'t1': (_CORRECT, 0.75)})
+
+    runs = history.load_runs(prob)
+    assert [run.run_id for run in runs] == [1, 2]
+    assert runs[0].num_passed() == 1
+    assert runs[0].cases['t2'] == {'result': 'WRONG_ANSWER',
+                                   'wall_time': 0.25, 'cpu_time': 0.25,
+                                   'max_rss': 1024}
+    assert runs[1].cases['t1']['wall_time'] == 0.75
+
+
+def test_unreadable_lines_keep_their_numbers(make_problem):
+    prob = make_problem()
+    _record(prob, {'t1': (_CORRECT, 0.5)})
+    with open(prob.history_path, 'a') as outfile:
+        outfile.write('{"datetime": \n')
+    _record(prob, {'t1': (_CORRECT, 0.5)})
+    runs = history.load_runs(prob)
+    assert runs[1] is None
+    assert runs[2].run_id == 3
+    assert history._get_run(runs, -1) is runs[2]
+    assert history._get_run(runs, 2) is None
+
+
+def test_regressions_are_reported(make_problem, capfd):
+    prob = make_problem()
+    _record(prob, {'t1': (_CORRECT, 1.0), 't2': (_CORRECT, 1.0),
+                   't3': (_CORRECT, 0.001), 't4': (_CORRECT, 1.0)})
+    _record(prob, {'t1': (_WRONG, 1.0), 't2': (_CORRECT, 1.5),
+                   't3': (_CORRECT, 0.005), 't4': (_CORRECT, 1.05)})
+    capfd.readouterr()
+    assert history.history(prob, None, None, 10)
+    err = capfd.readouterr().err
+    assert 'Verdict changes' in err
+    lines = err.splitlines()
+    assert any(line.split()[:1] == ['t1'] and 'Wrong answer' in line
+               for line in lines)
+    slower = [line.split()[0] for line in
+              lines[lines.index('Slower by more than 10%:') + 1:]]
+    # t3 is slower by far, but only by milliseconds; t4 by too little.
+    assert slower == ['t2']
+
+
+def test_no_regressions(make_problem, capfd):
+    prob = make_problem()
+    _record(prob, {'t1': (_CORRECT, 1.0)})
+    _record(prob, {'t1': (_CORRECT, 0.5)})
+    capfd.readouterr()
+    assert history.history(prob, 1, 2, 10)
+    assert 'No verdict changes' in capfd.readouterr().err
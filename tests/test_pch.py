@@ -0,0 +1,55 @@
+import shutil
+
+import pytest
+
+from conftest import add_test, write_source
+from pcu import compiler
+from pcu import pch
+from pcu import runner
+
+
+_SOURCE = '''\
+// BEGIN AUTOGENERATED
+#include <cstdio>
+#include <vector>
+// END AUTOGENERATED
+int main() {
+    std::vector<int> v{1, 2};
+    std::printf("%d\\n", v[0] + v[1]);
+}
+'''
+
+
+def test_header_flags_drop_input_and_output(make_problem):
+    prob = make_problem(env_name='cpp')
+    assert pch._header_flags(prob) == ['g++', '--std=c++1y', '-O2']
+
+
+def test_no_header_without_autogenerated_includes(make_problem, tmp_path):
+    prob = make_problem(env_name='cpp')
+    source_path = tmp_path / 'prob.cpp'
+    source_path.write_text('int main() {}\n')
+    assert pch.prepare(prob, source_path) is None
+
+
+def test_compile_with_precompiled_header(make_problem, tmp_path, capfd):
+    if shutil.which('g++') is None:
+        pytest.skip('no g++')
+    prob = make_problem(env_name='cpp')
+    add_test(prob, 't1', b'', b'3\n')
+    source_path = tmp_path / 'prob.cpp'
+    source_path.write_text(_SOURCE)
+    header_path = pch.prepare(prob, source_path)
+    assert header_path is not None
+    assert header_path.with_name(pch.HEADER_NAME + '.gch').is_file()
+    # Built once, then reused.
+    assert pch.prepare(prob, source_path) == header_path
+
+    working_dir = tmp_path / 'work'
+    working_dir.mkdir()
+    write_source(prob, working_dir, _SOURCE)
+    assert compiler.compile(prob, working_dir, copy_source=False,
+                            use_cache=False)
+    assert 'Using precompiled header' in capfd.readouterr().err
+    report = runner.run_case(prob, working_dir, 't1')
+    assert report.result == runner.TestCaseResult.CORRECT
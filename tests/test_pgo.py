@@ -0,0 +1,64 @@
+import shutil
+
+import pytest
+
+from conftest import add_test
+from pcu import pgo
+from pcu import testcase_store
+
+
+_SOURCE = '''\
+#include <cstdio>
+int main() {
+    long long n, total = 0;
+    std::scanf("%lld", &n);
+    for (long long i = 0; i < n; i++) {
+        total += i % 7 == 3 ? i : 1;
+    }
+    std::printf("%lld\\n", total);
+}
+'''
+
+
+def test_flags_go_at_the_end_or_in_place(make_problem):
+    prob = make_problem(env_name='cpp')
+    variant = pgo._with_flags(prob, '-fprofile-generate')
+    assert variant.compile_command == prob.compile_command + \
+        ' -fprofile-generate'
+
+    prob.env_overrides['compile_command'] = (
+        'g++ ${PCU_PGO_FLAGS} -o binary.exe prob.cpp')
+    prob.update_env()
+    variant = pgo._with_flags(prob, '-fprofile-use')
+    assert variant.compile_command == (
+        'g++ -fprofile-use -o binary.exe prob.cpp')
+    # The problem itself is left alone.
+    assert '${PCU_PGO_FLAGS}' in prob.env_overrides['compile_command']
+
+
+def test_environment_without_pgo_flags(make_problem, tmp_path, capfd):
+    prob = make_problem()
+    add_test(prob, 't1', b'')
+    assert not pgo.build(prob, tmp_path)
+    assert 'does not support' in capfd.readouterr().err
+
+
+def test_pgo_build(make_problem, tmp_path, monkeypatch):
+    if shutil.which('g++') is None:
+        pytest.skip('no g++')
+    prob = make_problem(env_name='cpp')
+    add_test(prob, 't1', b'100000\n')
+    with prob.store.open('t1', testcase_store.OUTPUT, 'wb') as outfile:
+        outfile.write(b'saved\n')
+    source_dir = tmp_path / 'source'
+    source_dir.mkdir()
+    (source_dir / prob.source_file).write_text(_SOURCE)
+    monkeypatch.chdir(source_dir)
+    working_dir = tmp_path / 'work'
+    working_dir.mkdir()
+
+    assert pgo.build(prob, working_dir, use_cache=False)
+    assert (working_dir / 'binary.exe').is_file()
+    assert list(working_dir.glob('*.gcda'))
+    with prob.store.open('t1', testcase_store.OUTPUT) as infile:
+        assert infile.read() == b'saved\n'
@@ -0,0 +1,64 @@
+import os
+import subprocess
+import sys
+
+from pcu import config
+from pcu import problem
+from pcu import testcase_store
+from pcu import yaml_util
+
+
+def _make_problem():
+    env = config.get_settings().get_env('python3')
+    with problem.Problem('prob', env=env):
+        pass
+
+
+def _fail(*args):
+    raise AssertionError('YAML should not be needed')
+
+
+def test_unchanged_settings_skip_yaml(monkeypatch):
+    _make_problem()
+    with problem.Problem('prob') as prob:  # writes the snapshot
+        pass
+
+    monkeypatch.setattr(yaml_util, 'load_dict', _fail)
+    monkeypatch.setattr(yaml_util, 'write_dict', _fail)
+    with problem.Problem('prob') as prob:
+        assert prob.env.name == 'python3'
+        assert prob.storage == testcase_store.FILES
+
+
+def test_changed_settings_are_reread():
+    _make_problem()
+    with problem.Problem('prob') as prob:
+        prob.env_overrides['run_timelimit_msec'] = 1234
+        prob.update_env()
+    with problem.Problem('prob') as prob:
+        assert prob.env.run_timelimit_msec == 1234
+
+    # Edited by hand, behind the snapshot's back.
+    settings_path = prob.path / 'problem_settings.yaml'
+    settings = settings_path.read_text().replace('1234', '4321')
+    settings_path.write_text(settings)
+    with problem.Problem('prob') as prob:
+        assert prob.env.run_timelimit_msec == 4321
+
+
+def test_info_loads_no_feature_modules():
+    _make_problem()
+    script = '\n'.join([
+        'import sys',
+        'from pcu import main',
+        "sys.argv = ['pcu', 'info', 'prob']",
+        'main.run()',
+        "heavy = ['yaml', 'sqlite3', 'difflib', 'pcu.runner', 'pcu.testgen']",
+        'print(*[name for name in heavy if name in sys.modules])',
+    ])
+    for _ in range(2):  # the first run writes the snapshots
+        output = subprocess.run(
+            [sys.executable, '-c', script],
+            env=dict(os.environ), stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL, check=True).stdout
+    assert output == b'\n'
@@ -0,0 +1,124 @@
+import subprocess
+import sys
+
+import pytest
+
+from conftest import add_test, write_source
+from pcu import config
+from pcu import environment
+from pcu import execution
+from pcu import forkserver
+from pcu import jvm
+from pcu import resident
+from pcu import runner
+
+
+def test_resident_process_needs_run():
+    class NoRun(resident.ResidentProcess):
+        pass
+
+    with pytest.raises(TypeError):
+        NoRun(['true'], None, None, None, 'log')
+
+
+def test_file_paths(tmp_path):
+    with open(tmp_path / 'in', 'wb') as infile:
+        assert resident.file_paths(infile, subprocess.DEVNULL,
+                                   infile) == (str(tmp_path / 'in'),
+                                               '/dev/null',
+                                               str(tmp_path / 'in'))
+        assert resident.file_paths(infile, subprocess.PIPE, infile) is None
+
+
+def test_forkserver_parse_command():
+    command = forkserver.parse_command(
+        'python3 -O -X dev sol.py a b')
+    assert command.python == 'python3'
+    assert command.options == ['-O', '-X', 'dev']
+    assert command.script == 'sol.py'
+    assert command.args == ['a', 'b']
+    assert forkserver.parse_command('python3 -m sol') is None
+    assert forkserver.parse_command('./sol') is None
+
+
+def test_jvm_parse_command():
+    command = jvm.parse_command('java -Xss64m -cp out Main x')
+    assert command.java == 'java'
+    assert command.options == ['-Xss64m']
+    assert command.classpath == 'out'
+    assert command.main_class == 'Main'
+    assert command.args == ['x']
+    assert jvm.parse_command('java -jar sol.jar') is None
+    assert jvm.parse_command('java Main.java') is None
+
+
+def test_forkserver_runs_cases(tmp_path):
+    (tmp_path / 'sol.py').write_text(
+        'import sys\nn = int(input())\nprint(n * 2)\nsys.exit(n % 2)\n')
+    run_command = '{} sol.py'.format(sys.executable)
+    try:
+        for n, returncode in ((2, 0), (3, 1)):
+            (tmp_path / 'in').write_text('{}\n'.format(n))
+            with open(tmp_path / 'in', 'rb') as stdin, \
+                    open(tmp_path / 'out', 'wb') as stdout:
+                exec_result = forkserver.run(run_command, tmp_path, stdin,
+                                             stdout, subprocess.DEVNULL,
+                                             timeout=10)
+            assert exec_result.returncode == returncode
+            assert (tmp_path / 'out').read_text() == '{}\n'.format(n * 2)
+    finally:
+        resident.close_all()
+
+
+def test_forkserver_times_out(tmp_path):
+    (tmp_path / 'sol.py').write_text('while True: pass\n')
+    run_command = '{} sol.py'.format(sys.executable)
+    try:
+        with open(tmp_path / 'out', 'wb') as stdout:
+            exec_result = forkserver.run(run_command, tmp_path,
+                                         subprocess.DEVNULL, stdout,
+                                         subprocess.DEVNULL, timeout=0.5)
+        assert exec_result.timed_out
+    finally:
+        resident.close_all()
+
+
+@pytest.mark.parametrize('source, env_overrides, expected', [
+    ('print(int(input()) + 1)\n', {}, runner.TestCaseResult.CORRECT),
+    ('print(3)\n', {}, runner.TestCaseResult.WRONG_ANSWER),
+    ('raise SystemExit(1)\n', {}, runner.TestCaseResult.RUNTIME_ERROR),
+    ('while True: pass\n', {'run_timelimit_msec': 300},
+     runner.TestCaseResult.TIME_LIMIT_EXCEEDED),
+    ('x = bytearray(300 * 1024 * 1024)\n', {'run_memlimit_mb': 64},
+     runner.TestCaseResult.MEMORY_LIMIT_EXCEEDED),
+    ('import sys\nsys.stderr.write("MemoryError\\n")\nsys.exit(1)\n',
+     {'run_memlimit_mb': 64}, runner.TestCaseResult.RUNTIME_ERROR),
+    ('import sys\nwhile True: sys.stdout.write("2" * 65536)\n',
+     {'output_limit_mb': 1}, runner.TestCaseResult.OUTPUT_LIMIT_EXCEEDED),
+])
+def test_forkserver_verdicts(make_problem, tmp_path, monkeypatch, source,
+                             env_overrides, expected):
+    # The same verdicts as in a process of its own, without falling back
+    # to one.
+    def run_process(*args, **kwargs):
+        raise AssertionError('fell back to run_process')
+
+    env_overrides = dict(env_overrides, run_mode='forkserver')
+    prob = make_problem(env_overrides=env_overrides)
+    working_dir = tmp_path / 'work'
+    working_dir.mkdir()
+    write_source(prob, working_dir, source)
+    add_test(prob, 't1', b'1\n', b'2\n')
+    monkeypatch.setattr(execution, 'run_process', run_process)
+    try:
+        for _ in range(2):
+            report = runner.run_case(prob, working_dir, 't1')
+            assert report.result == expected
+    finally:
+        resident.close_all()
+
+
+@pytest.mark.parametrize('env_name', ['java', 'java_file', 'python3'])
+def test_resident_modes_are_opt_in(pcu_home, env_name):
+    env = config.get_settings().get_env(env_name)
+    assert env.run_mode == environment.RunMode.PROCESS
@@ -0,0 +1,229 @@
+import threading
+import time
+
+import pytest
+
+from conftest import add_test, write_source
+from pcu import launcher
+from pcu import runner
+from pcu import testcase_store
+from pcu import yaml_util
+
+
+_ALLOCATE_300_MB = 'x = bytearray(300 * 1024 * 1024)\nprint(1)\n'
+
+
+def _run_one(prob, tmp_path, source, answer=b'1\n'):
+    working_dir = tmp_path / 'work'
+    working_dir.mkdir()
+    write_source(prob, working_dir, source)
+    add_test(prob, 't1', b'', answer)
+    return runner.run_case(prob, working_dir, 't1')
+
+
+@pytest.mark.parametrize('use_launcher', [True, False])
+def test_small_program_under_tight_memlimit_is_correct(
+        make_problem, tmp_path, monkeypatch, use_launcher):
+    # Even where the peak RSS counts our own memory (without the launcher),
+    # that mustn't turn into a Memory Limit Exceeded.
+    if not use_launcher:
+        monkeypatch.setattr(launcher, 'launcher_path', lambda: None)
+    prob = make_problem(env_overrides={'run_memlimit_mb': 64})
+    ballast = b'x' * (200 * 1024 * 1024)
+    report = _run_one(prob, tmp_path, 'print(1)\n')
+    assert len(ballast)
+    assert report.result == runner.TestCaseResult.CORRECT
+
+
+@pytest.mark.parametrize('source', [
+    _ALLOCATE_300_MB,
+    'x = []\nwhile True: x.append(bytearray(1024 * 1024))\n',
+])
+def test_allocation_failure_is_memory_limit_exceeded(make_problem, tmp_path,
+                                                     source):
+    if launcher.launcher_path() is None:
+        pytest.skip('no C compiler to build the launcher with')
+    prob = make_problem(env_overrides={'run_memlimit_mb': 64})
+    report = _run_one(prob, tmp_path, source)
+    assert report.result == runner.TestCaseResult.MEMORY_LIMIT_EXCEEDED
+
+
+@pytest.mark.parametrize('message', ['MemoryError', 'std::bad_alloc'])
+def test_out_of_memory_message_is_runtime_error(make_problem, tmp_path,
+                                                message):
+    # Only what the launcher sees counts, not what the program prints.
+    prob = make_problem(env_overrides={'run_memlimit_mb': 64})
+    report = _run_one(prob, tmp_path,
+                      'import sys\nsys.stderr.write({!r})\nsys.exit(1)\n'
+                      .format(message + '\n'))
+    assert report.result == runner.TestCaseResult.RUNTIME_ERROR
+
+
+def test_allocation_without_memlimit_is_correct(make_problem, tmp_path):
+    prob = make_problem(env_overrides={'run_memlimit_mb': 0})
+    report = _run_one(prob, tmp_path, _ALLOCATE_300_MB)
+    assert report.result == runner.TestCaseResult.CORRECT
+
+
+def _run_all(prob, tmp_path, source, jobs):
+    working_dir = tmp_path / 'work{}'.format(jobs)
+    working_dir.mkdir()
+    write_source(prob, working_dir, source)
+    return runner.run_cases(prob, working_dir, prob.get_test_ids(), jobs)
+
+
+# Busy for 0.6 s of CPU time, against a 1 s limit.
+_NEAR_LIMIT = ('import time\n'
+               'while time.process_time() < 0.6: pass\n'
+               'print(int(input()) * 2)\n')
+
+
+def test_near_limit_verdicts_match_across_jobs(make_problem, tmp_path):
+    # Under a CPU time limit, cases sharing the CPU don't change verdicts.
+    prob = make_problem(env_overrides={'run_timelimit_msec': 1000,
+                                       'timelimit_mode': 'cpu'})
+    for i in range(2):
+        add_test(prob, 't{}'.format(i), b'%d\n' % i, b'%d\n' % (i * 2))
+    serial = _run_all(prob, tmp_path, _NEAR_LIMIT, 1)
+    parallel = _run_all(prob, tmp_path, _NEAR_LIMIT, 2)
+    for test_id in prob.get_test_ids():
+        assert serial.cases[test_id].result == runner.TestCaseResult.CORRECT
+        assert parallel.cases[test_id].result == serial.cases[test_id].result
+
+
+def test_parallel_wall_clock_run_warns(make_problem, tmp_path, capsys):
+    prob = make_problem()
+    for i in range(2):
+        add_test(prob, 't{}'.format(i), b'%d\n' % i, b'%d\n' % (i * 2))
+    _run_all(prob, tmp_path, 'print(int(input()) * 2)\n', 2)
+    assert 'wall-clock times near the limit' in capsys.readouterr().err
+
+    prob = make_problem(name='cpu', env_overrides={'timelimit_mode': 'cpu'})
+    for i in range(2):
+        add_test(prob, 't{}'.format(i), b'%d\n' % i, b'%d\n' % (i * 2))
+    (tmp_path / 'cpu').mkdir()
+    _run_all(prob, tmp_path / 'cpu', 'print(int(input()) * 2)\n', 2)
+    assert 'wall-clock times near the limit' not in capsys.readouterr().err
+
+
+def test_parallel_run_matches_serial(make_problem, tmp_path):
+    prob = make_problem()
+    for i in range(6):
+        add_test(prob, 't{}'.format(i), b'%d\n' % i,
+                 b'%d\n' % (i * 2 if i % 3 else i))
+    source = 'print(int(input()) * 2)\n'
+    serial = _run_all(prob, tmp_path, source, 1)
+    parallel = _run_all(prob, tmp_path, source, 3)
+    assert parallel.jobs == 3
+    assert ({test_id: report.result
+             for test_id, report in parallel.cases.items()} ==
+            {test_id: report.result
+             for test_id, report in serial.cases.items()})
+    assert parallel.get_failed_test_ids() == ['t3']
+
+
+def test_parallel_cases_overlap(make_problem, tmp_path):
+    prob = make_problem()
+    for i in range(4):
+        add_test(prob, 't{}'.format(i), b'')
+    start = time.monotonic()
+    report = _run_all(prob, tmp_path, 'import time\ntime.sleep(1)\n', 4)
+    # Run one after another, the cases would take four seconds.
+    assert time.monotonic() - start < 3
+    assert all(case.exec_result.wall_time >= 1
+               for case in report.cases.values())
+    assert len(report.cases) == 4
+
+
+def test_run_cases_stops_when_cancelled(make_problem, tmp_path):
+    prob = make_problem()
+    add_test(prob, 't1', b'')
+    cancel = threading.Event()
+    cancel.set()
+    working_dir = tmp_path / 'work'
+    working_dir.mkdir()
+    write_source(prob, working_dir, 'print(1)\n')
+    report = runner.run_cases(prob, working_dir, ['t1'], cancel=cancel)
+    assert report.cancelled
+    assert not report.cases
+
+
+_FLOOD = 'import sys\nwhile True: sys.stdout.write("1" * 65536)\n'
+
+
+def test_flooding_stdout_is_output_limit_exceeded(make_problem, tmp_path):
+    prob = make_problem(env_overrides={'output_limit_mb': 1})
+    report = _run_one(prob, tmp_path, _FLOOD)
+    assert report.result == runner.TestCaseResult.OUTPUT_LIMIT_EXCEEDED
+    assert report.exec_result.output_limit_exceeded
+    assert report.exec_result.wall_time < 5
+
+
+def test_flooding_output_file_is_output_limit_exceeded(make_problem,
+                                                       tmp_path):
+    # Written straight to a file, so cut off by RLIMIT_FSIZE.
+    prob = make_problem(env_overrides={'output_limit_mb': 1,
+                                       'output_file': 'out.txt'})
+    report = _run_one(prob, tmp_path,
+                      'f = open("out.txt", "w")\n'
+                      'while True: f.write("1" * 65536)\n')
+    assert report.result == runner.TestCaseResult.OUTPUT_LIMIT_EXCEEDED
+    assert (tmp_path / 'work' / 'out.txt').stat().st_size <= 1024 * 1024 + 1
+
+
+def test_large_output_without_output_limit_is_checked(make_problem,
+                                                      tmp_path):
+    # No limit unless the environment sets one.
+    prob = make_problem()
+    assert prob.env.output_limit_mb == 0
+    report = _run_one(prob, tmp_path, 'print("1" * (65 * 1024 * 1024))\n',
+                      answer=b'1' * (65 * 1024 * 1024) + b'\n')
+    assert report.result == runner.TestCaseResult.CORRECT
+
+
+def test_output_just_under_the_limit_is_checked(make_problem, tmp_path):
+    prob = make_problem(env_overrides={'output_limit_mb': 1})
+    report = _run_one(prob, tmp_path,
+                      'print("1" * (1024 * 1024 - 1))\n',
+                      answer=b'1' * (1024 * 1024 - 1) + b'\n')
+    assert report.result == runner.TestCaseResult.CORRECT
+
+
+def test_stderr_is_capped(make_problem, tmp_path, pcu_home):
+    (pcu_home / 'settings.yaml').write_text('max_lines_error: 5\n')
+    prob = make_problem()
+    report = _run_one(prob, tmp_path,
+                      'import sys\n'
+                      'for i in range(100000): print(i, file=sys.stderr)\n'
+                      'print(1)\n')
+    assert report.result == runner.TestCaseResult.CORRECT
+    with prob.store.open('t1', testcase_store.ERROR) as infile:
+        error = infile.read()
+    assert error.startswith(b'0\n1\n2\n3\n4\n')
+    # With the very end of it kept.
+    assert error.endswith(b'99999\n')
+    assert len(error) < 16 * 1024
+
+
+def test_timeout_is_time_limit_exceeded(make_problem, tmp_path):
+    prob = make_problem(env_overrides={'run_timelimit_msec': 300})
+    report = _run_one(prob, tmp_path, 'while True: pass\n')
+    assert report.result == runner.TestCaseResult.TIME_LIMIT_EXCEEDED
+    assert report.exec_result.timed_out
+
+
+def test_stats_are_saved_with_the_case(make_problem, tmp_path):
+    prob = make_problem()
+    report = _run_one(prob, tmp_path,
+                      'import time\n'
+                      'end = time.process_time() + 0.2\n'
+                      'while time.process_time() < end: pass\n'
+                      'print(1)\n')
+    assert report.result == runner.TestCaseResult.CORRECT
+    with prob.store.open('t1', testcase_store.STATS, 'r') as infile:
+        stats = yaml_util.load_dict(infile.read())
+    assert stats['exit_code'] == 0
+    assert not stats['timed_out']
+    assert stats['cpu_time_sec'] >= 0.2
+    assert stats['wall_time_sec'] >= stats['cpu_time_sec'] * 0.9
+    assert stats['max_rss_bytes'] == report.exec_result.max_rss > 0
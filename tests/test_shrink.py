@@ -0,0 +1,85 @@
+import concurrent.futures
+import os
+import random
+import sys
+
+import pytest
+
+from conftest import add_test, write_source
+from pcu import shrink
+from pcu import solution
+from pcu import testcase_store
+
+
+def _ddmin(items, is_failing, jobs=1):
+    with concurrent.futures.ThreadPoolExecutor(max_workers=jobs) as pool:
+        return shrink._ddmin(items, is_failing, pool, jobs,
+                             lambda items: None)
+
+
+def _contains_in_order(required):
+    def is_failing(data):
+        position = 0
+        for item in required:
+            position = data.find(item, position)
+            if position < 0:
+                return False
+            position += len(item)
+        return True
+    return is_failing
+
+
+@pytest.mark.parametrize('jobs', [1, 3])
+def test_ddmin_is_one_minimal(jobs):
+    rng = random.Random(jobs)
+    for _ in range(50):
+        items = [b'<%d>' % i for i in range(rng.randrange(1, 60))]
+        num_required = min(len(items), rng.randint(1, 3))
+        required = sorted(rng.sample(items, num_required), key=items.index)
+        is_failing = _contains_in_order(required)
+        result = _ddmin(items, is_failing, jobs)
+        assert is_failing(b''.join(result))
+        # Removing any one item makes it pass.
+        for i in range(len(result)):
+            assert not is_failing(b''.join(result[:i] + result[i + 1:]))
+        assert result == required
+
+
+def test_ddmin_is_the_same_whatever_the_jobs():
+    items = [b'%d ' % i for i in range(40)]
+
+    def is_failing(data):
+        numbers = [int(token) for token in data.split()]
+        return sum(numbers) % 7 == 3 and len(numbers) >= 2
+
+    results = [_ddmin(items, is_failing, jobs) for jobs in (1, 2, 5)]
+    assert results[0] == results[1] == results[2]
+    assert is_failing(b''.join(results[0]))
+
+
+def test_shrink_saves_minimal_case(make_problem, tmp_path):
+    prob = make_problem()
+    working_dir = tmp_path / 'work'
+    working_dir.mkdir()
+    # Wrong only when a 7 is in the input.
+    write_source(prob, working_dir,
+                 'import sys\n'
+                 'numbers = [int(t) for t in sys.stdin.read().split()]\n'
+                 'print(sum(numbers) + (7 in numbers))\n')
+    candidate = solution.ProblemSolution(prob, working_dir, 1, tmp_path)
+    reference_path = tmp_path / 'reference'
+    with open(reference_path, 'w') as outfile:
+        outfile.write('#!{}\n'.format(sys.executable) +
+                      'import sys\n'
+                      'print(sum(int(t) for t in sys.stdin.read().split()))\n')
+    os.chmod(reference_path, 0o755)
+    reference = solution.ExecutableSolution(reference_path, tmp_path)
+
+    lines = [' '.join(str(n) for n in range(i, i + 5)) + '\n'
+             for i in range(0, 50, 5)]
+    add_test(prob, 't1', ''.join(lines).encode())
+    assert shrink.shrink(prob, candidate, reference, 't1', jobs=2)
+    with prob.store.open('t1_min', testcase_store.INPUT) as infile:
+        assert infile.read().split() == [b'7']
+    with prob.store.open('t1_min', testcase_store.ANSWER) as infile:
+        assert infile.read() == b'7\n'
@@ -0,0 +1,89 @@
+import os
+import subprocess
+import time
+
+import pytest
+
+from conftest import add_test
+from pcu import solution
+from pcu import testgen
+
+
+def _write_settings(pcu_home, text):
+    with open(pcu_home / 'settings.yaml', 'w') as outfile:
+        outfile.write(text)
+
+
+def _write_executable(path, script):
+    with open(path, 'w') as outfile:
+        outfile.write('#!/bin/sh\n' + script)
+    os.chmod(path, 0o755)
+    return path
+
+
+def test_solution_is_abstract():
+    with pytest.raises(TypeError):
+        solution.Solution()
+
+
+def test_looping_reference_times_out(pcu_home, tmp_path):
+    _write_settings(pcu_home, 'helper_timelimit_msec: 300\n')
+    reference = solution.ExecutableSolution(
+        _write_executable(tmp_path / 'ref', 'while :; do :; done\n'),
+        tmp_path)
+    input_path = tmp_path / 'input'
+    input_path.write_bytes(b'1\n')
+    output_path = tmp_path / 'output'
+
+    start_time = time.monotonic()
+    exec_result = reference.run(input_path, output_path)
+    assert time.monotonic() - start_time < 5
+    assert not reference.succeeded(exec_result, output_path)
+    assert solution.describe_failure(exec_result) == 'timed out'
+
+
+def test_flooding_reference_stops_at_output_limit(pcu_home, tmp_path):
+    _write_settings(pcu_home, 'helper_output_limit_mb: 1\n')
+    reference = solution.ExecutableSolution(
+        _write_executable(tmp_path / 'ref', 'exec yes\n'), tmp_path)
+    input_path = tmp_path / 'input'
+    input_path.write_bytes(b'1\n')
+    output_path = tmp_path / 'output'
+
+    exec_result = reference.run(input_path, output_path)
+    assert not reference.succeeded(exec_result, output_path)
+    assert (solution.describe_failure(exec_result) ==
+            'went over the output limit')
+    assert output_path.stat().st_size == 1024 * 1024
+
+
+def test_looping_generator_fails(pcu_home, tmp_path):
+    _write_settings(pcu_home, 'helper_timelimit_msec: 300\n')
+    generator = _write_executable(tmp_path / 'gen', 'while :; do :; done\n')
+    with open(tmp_path / 'input', 'wb') as input_file:
+        assert not testgen.run_generator(0, 1, generator, input_file,
+                                         subprocess.DEVNULL)
+
+
+def test_generator_answer_on_stderr_is_limited(pcu_home, tmp_path):
+    _write_settings(pcu_home, 'helper_output_limit_mb: 1\n')
+    generator = _write_executable(tmp_path / 'gen',
+                                  'echo 1; exec yes >&2\n')
+    with open(tmp_path / 'input', 'wb') as input_file, \
+            open(tmp_path / 'answer', 'wb') as answer_file:
+        assert not testgen.run_generator(0, 1, generator, input_file,
+                                         answer_file)
+    assert (tmp_path / 'answer').stat().st_size <= 1024 * 1024 + 1
+
+
+def test_testgen_fails_on_looping_reference(pcu_home, tmp_path,
+                                            make_problem):
+    _write_settings(pcu_home, 'helper_timelimit_msec: 300\n')
+    prob = make_problem()
+    generator = _write_executable(tmp_path / 'gen', 'echo 1\n')
+    reference = solution.ExecutableSolution(
+        _write_executable(tmp_path / 'ref', 'while :; do :; done\n'),
+        tmp_path)
+    assert not testgen.generate_tests(prob, generator, 'g', 2,
+                                      reference=reference)
+    assert prob.get_test_ids() == []
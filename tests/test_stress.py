@@ -0,0 +1,48 @@
+import os
+
+import pytest
+
+from conftest import write_source
+from pcu import runner
+from pcu import solution
+from pcu import stress
+
+
+def _check(make_problem, tmp_path, source, env_overrides=None):
+    prob = make_problem(env_overrides=env_overrides)
+    working_dir = tmp_path / 'work'
+    working_dir.mkdir()
+    write_source(prob, working_dir, source)
+    candidate = solution.ProblemSolution(prob, working_dir, 1, tmp_path)
+
+    reference_path = tmp_path / 'reference'
+    with open(reference_path, 'w') as outfile:
+        outfile.write('#!/bin/sh\necho 2\n')
+    os.chmod(reference_path, 0o755)
+    reference = solution.ExecutableSolution(reference_path, tmp_path)
+
+    scratch_dir = tmp_path / 'scratch'
+    scratch_dir.mkdir()
+    input_path = scratch_dir / 'input'
+    input_path.write_bytes(b'1\n')
+    return stress.check_input(prob, candidate, reference, input_path,
+                              scratch_dir)
+
+
+@pytest.mark.parametrize('source, env_overrides, expected', [
+    ('print(int(input()) + 1)\n', None, runner.TestCaseResult.CORRECT),
+    ('print(3)\n', None, runner.TestCaseResult.WRONG_ANSWER),
+    ('print(" 2")\n', {'format_strictness': 'STRICT'},
+     runner.TestCaseResult.PRESENTATION_ERROR),
+    ('raise SystemExit(1)\n', None, runner.TestCaseResult.RUNTIME_ERROR),
+    ('while True: pass\n', {'run_timelimit_msec': 200},
+     runner.TestCaseResult.TIME_LIMIT_EXCEEDED),
+    ('x = bytearray(300 * 1024 * 1024)\n', {'run_memlimit_mb': 64},
+     runner.TestCaseResult.MEMORY_LIMIT_EXCEEDED),
+    ('import sys\nwhile True: sys.stdout.write("2" * 65536)\n',
+     {'output_limit_mb': 1}, runner.TestCaseResult.OUTPUT_LIMIT_EXCEEDED),
+])
+def test_check_input_verdicts(make_problem, tmp_path, source, env_overrides,
+                              expected):
+    assert _check(make_problem, tmp_path, source, env_overrides) == expected
+
@@ -0,0 +1,242 @@
+import pytest
+
+from conftest import add_test, write_source
+from pcu import config
+from pcu import problem
+from pcu import runner
+from pcu import testcase_store
+
+
+def _make_store(tmp_path, storage):
+    testcases_path = tmp_path / 'testcases'
+    testcases_path.mkdir()
+    if storage == testcase_store.FILES:
+        return testcase_store.FilesTestCaseStore(testcases_path)
+    return testcase_store.PackedTestCaseStore(
+        tmp_path / testcase_store.DB_NAME, testcases_path)
+
+
+@pytest.fixture(params=testcase_store.STORAGES)
+def store(request, tmp_path, monkeypatch):
+    # Small chunks, so that files span several of them.
+    monkeypatch.setattr(testcase_store, '_CHUNK_SIZE', 7)
+    store = _make_store(tmp_path, request.param)
+    yield store
+    store.close()
+
+
+def test_round_trip(store, tmp_path):
+    data = bytes(range(256)) * 3
+    with store.open('t1', testcase_store.INPUT, 'wb') as outfile:
+        outfile.write(data[:100])
+        outfile.write(data[100:])
+    with store.open('t1', testcase_store.STATS, 'w') as outfile:
+        outfile.write('exit_code: 0\n')
+
+    assert store.exists('t1', testcase_store.INPUT)
+    assert not store.exists('t1', testcase_store.ANSWER)
+    assert store.size('t1', testcase_store.INPUT) == len(data)
+    with store.open('t1', testcase_store.INPUT) as infile:
+        assert infile.read() == data
+    with store.open('t1', testcase_store.STATS, 'r') as infile:
+        assert infile.read() == 'exit_code: 0\n'
+
+    path = store.readable_path('t1', testcase_store.INPUT,
+                               tmp_path / 'scratch')
+    assert path.read_bytes() == data
+
+
+def test_overwrite_and_delete(store):
+    for data in (b'first version\n', b'2\n', b''):
+        with store.open('t1', testcase_store.ANSWER, 'wb') as outfile:
+            outfile.write(data)
+        with store.open('t1', testcase_store.ANSWER) as infile:
+            assert infile.read() == data
+
+    store.delete('t1', testcase_store.ANSWER)
+    assert not store.exists('t1', testcase_store.ANSWER)
+    with pytest.raises(FileNotFoundError):
+        store.open('t1', testcase_store.ANSWER)
+    store.delete('t1', testcase_store.ANSWER)  # already gone
+
+
+def test_put_moves_the_file_in(store):
+    path = store.temp_path('t1', testcase_store.INPUT)
+    path.write_bytes(b'1 2\n')
+    store.put('t1', testcase_store.INPUT, path)
+    assert not path.exists()
+    with store.open('t1', testcase_store.INPUT) as infile:
+        assert infile.read() == b'1 2\n'
+
+
+def test_test_ids_are_the_cases_with_inputs(store):
+    for test_id in ('b', 'a', 'c'):
+        with store.open(test_id, testcase_store.INPUT, 'wb') as outfile:
+            outfile.write(b'1\n')
+    with store.open('d', testcase_store.ANSWER, 'wb') as outfile:
+        outfile.write(b'1\n')
+    path = store.temp_path('e', testcase_store.INPUT)
+    path.write_bytes(b'')
+    store.put('e', testcase_store.INPUT, path)
+    store.temp_path('f', testcase_store.INPUT).write_bytes(b'')
+    assert store.get_test_ids() == ['a', 'b', 'c', 'e']
+
+
+def test_packed_store_keeps_no_loose_files(tmp_path):
+    store = _make_store(tmp_path, testcase_store.PACKED)
+    with store.open('t1', testcase_store.INPUT, 'wb') as outfile:
+        outfile.write(b'1\n')
+    with store.open('t1', testcase_store.INPUT) as infile:
+        assert infile.read() == b'1\n'
+    assert list(store.testcases_path.iterdir()) == []
+    store.close()
+
+
+def test_packed_writes_are_committed_when_closed(tmp_path):
+    store = _make_store(tmp_path, testcase_store.PACKED)
+    with store.open('t1', testcase_store.INPUT, 'wb') as outfile:
+        outfile.write(b'1\n')
+    # Another process sees it before this store is closed.
+    other = testcase_store.PackedTestCaseStore(store.db_path,
+                                               store.testcases_path)
+    assert other.get_test_ids() == ['t1']
+    with other.open('t1', testcase_store.INPUT) as infile:
+        assert infile.read() == b'1\n'
+    other.close()
+    store.close()
+
+
+def test_packed_store_drops_unfinished_writes(tmp_path):
+    store = _make_store(tmp_path, testcase_store.PACKED)
+    # As if pcu died while writing a file: its chunks are in, but no file
+    # points at them.
+    store._conn.execute('INSERT INTO chunks VALUES (?, ?, ?)',
+                        (store._new_blob_id(), 0, b'0123'))
+    store.close()
+
+    store = testcase_store.PackedTestCaseStore(store.db_path,
+                                               store.testcases_path)
+    assert store.get_test_ids() == []
+    assert store._conn.execute(
+        'SELECT COUNT(*) FROM chunks').fetchone() == (0,)
+    store.close()
+
+
+@pytest.mark.parametrize('mode', ['wb', 'w'])
+def test_packed_write_is_rolled_back_on_error(tmp_path, monkeypatch, mode):
+    monkeypatch.setattr(testcase_store, '_CHUNK_SIZE', 7)
+    store = _make_store(tmp_path, testcase_store.PACKED)
+    with store.open('t1', testcase_store.INPUT, mode) as outfile:
+        outfile.write('old\n' if mode == 'w' else b'old\n')
+
+    data = 'a much longer new version\n'
+    with pytest.raises(KeyboardInterrupt):
+        with store.open('t1', testcase_store.INPUT, mode) as outfile:
+            outfile.write(data if mode == 'w' else data.encode())
+            outfile.flush()
+            raise KeyboardInterrupt
+    with store.open('t1', testcase_store.INPUT) as infile:
+        assert infile.read() == b'old\n'
+
+    with pytest.raises(KeyboardInterrupt):
+        with store.open('t2', testcase_store.INPUT, mode) as outfile:
+            outfile.write(data if mode == 'w' else data.encode())
+            outfile.flush()
+            raise KeyboardInterrupt
+    assert store.get_test_ids() == ['t1']
+    assert store._conn.execute(
+        'SELECT COUNT(DISTINCT blob_id) FROM chunks').fetchone() == (1,)
+    store.close()
+
+
+def test_packed_write_is_invisible_until_closed(tmp_path, monkeypatch):
+    monkeypatch.setattr(testcase_store, '_CHUNK_SIZE', 7)
+    store = _make_store(tmp_path, testcase_store.PACKED)
+    outfile = store.open('t1', testcase_store.INPUT, 'wb')
+    outfile.write(b'more than one chunk\n')
+    outfile.flush()
+    assert not store.exists('t1', testcase_store.INPUT)
+    assert store._conn.execute(
+        'SELECT COUNT(*) FROM chunks').fetchone() == (0,)
+    outfile.close()
+    with store.open('t1', testcase_store.INPUT) as infile:
+        assert infile.read() == b'more than one chunk\n'
+    store.close()
+
+
+def test_packed_put_that_fails_stores_nothing(tmp_path, monkeypatch):
+    def failing_copy(infile, outfile, length):
+        outfile.write(infile.read(4))
+        outfile.flush()
+        raise OSError('read error')
+
+    store = _make_store(tmp_path, testcase_store.PACKED)
+    path = store.temp_path('t1', testcase_store.INPUT)
+    path.write_bytes(b'1 2 3 4\n')
+    monkeypatch.setattr(testcase_store.shutil, 'copyfileobj', failing_copy)
+    with pytest.raises(OSError):
+        store.put('t1', testcase_store.INPUT, path)
+    assert not store.exists('t1', testcase_store.INPUT)
+    assert path.exists()
+    store.close()
+
+
+def test_convert_storage_keeps_test_cases(pcu_home):
+    env = config.get_settings().get_env('python3')
+    with problem.Problem('prob', env=env) as prob:
+        add_test(prob, 't1', b'1\n', b'2\n')
+        add_test(prob, 't2', b'3\n')
+
+    for storage in (testcase_store.PACKED, testcase_store.FILES):
+        with problem.Problem('prob', storage=storage) as prob:
+            assert prob.storage == storage
+            assert prob.get_test_ids() == ['t1', 't2']
+            with prob.store.open('t1', testcase_store.ANSWER) as infile:
+                assert infile.read() == b'2\n'
+            assert not prob.store.exists('t2', testcase_store.ANSWER)
+
+
+def test_run_case_on_packed_problem(make_problem, tmp_path):
+    prob = make_problem(storage=testcase_store.PACKED)
+    working_dir = tmp_path / 'work'
+    working_dir.mkdir()
+    write_source(prob, working_dir, 'print(int(input()) + 1)\n')
+    add_test(prob, 't1', b'1\n', b'2\n')
+    add_test(prob, 't2', b'1\n', b'3\n')
+
+    assert (runner.run_case(prob, working_dir, 't1').result ==
+            runner.TestCaseResult.CORRECT)
+    assert (runner.run_case(prob, working_dir, 't2').result ==
+            runner.TestCaseResult.WRONG_ANSWER)
+    with prob.store.open('t2', testcase_store.OUTPUT) as infile:
+        assert infile.read() == b'2\n'
+    assert prob.store.exists('t2', testcase_store.STATS)
+    assert list((prob.path / 'testcases').iterdir()) == []
+
+
+def test_view_path(store):
+    with store.open('t1', testcase_store.INPUT, 'wb') as outfile:
+        outfile.write(b'old\n')
+    assert store.view_path('t1', testcase_store.INPUT).read_bytes() == \
+        b'old\n'
+    with store.open('t1', testcase_store.INPUT, 'wb') as outfile:
+        outfile.write(b'new\n')
+    assert store.view_path('t1', testcase_store.INPUT).read_bytes() == \
+        b'new\n'
+    store.delete('t1', testcase_store.INPUT)
+    assert not store.view_path('t1', testcase_store.INPUT).exists()
+    assert not store.view_path('t2', testcase_store.ANSWER).exists()
+    assert store.get_test_ids() == []
+
+
+@pytest.mark.parametrize('storage', testcase_store.STORAGES)
+def test_problem_path_accessors(make_problem, storage):
+    prob = make_problem(storage=storage)
+    add_test(prob, 't1', b'1\n', b'2\n')
+    assert prob.get_test_input_path('t1').read_bytes() == b'1\n'
+    assert prob.get_test_answer_path('t1').read_bytes() == b'2\n'
+    assert not prob.get_test_output_path('t1').is_file()
+    assert not prob.get_test_error_path('t1').is_file()
+    if storage == testcase_store.FILES:
+        assert prob.get_test_input_path('t1') == (
+            prob.store.testcases_path / 't1.in')
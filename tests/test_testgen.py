@@ -0,0 +1,78 @@
+import os
+
+from conftest import add_test
+from pcu import solution
+from pcu import testcase_store
+from pcu import testgen
+
+
+def _write_executable(path, script):
+    with open(path, 'w') as outfile:
+        outfile.write('#!/bin/sh\n' + script)
+    os.chmod(path, 0o755)
+    return path
+
+
+def _contents(prob):
+    result = {}
+    for test_id in prob.get_test_ids():
+        for suffix in (testcase_store.INPUT, testcase_store.ANSWER):
+            if prob.store.exists(test_id, suffix):
+                with prob.store.open(test_id, suffix) as infile:
+                    result[test_id + suffix] = infile.read()
+    return result
+
+
+def test_case_seeds_are_reproducible():
+    seeds = [testgen.case_seed(42, i) for i in range(1000)]
+    assert seeds == [testgen.case_seed(42, i) for i in range(1000)]
+    assert len(set(seeds)) == len(seeds)
+    assert all(0 <= seed < 2 ** 31 for seed in seeds)
+    assert seeds != [testgen.case_seed(43, i) for i in range(1000)]
+
+
+def test_new_test_ids_skip_existing(make_problem):
+    prob = make_problem()
+    add_test(prob, 'g000001', b'')
+    assert testgen.get_new_test_ids(prob, 'g', 3) == [
+        'g000000', 'g000002', 'g000003']
+
+
+def test_same_seed_same_cases_whatever_the_jobs(make_problem, tmp_path):
+    generator = _write_executable(tmp_path / 'gen',
+                                  'echo "$1 $2"\necho "$2" >&2\n')
+    contents = []
+    for jobs in (1, 4):
+        prob = make_problem('jobs{}'.format(jobs))
+        assert testgen.generate_tests(prob, generator, 'g', 8, jobs=jobs,
+                                      master_seed=1234)
+        contents.append(_contents(prob))
+    assert contents[0] == contents[1]
+    assert len(contents[0]) == 16
+    assert contents[0]['g000005.in'] == '5 {}\n'.format(
+        testgen.case_seed(1234, 5)).encode()
+
+
+def test_reference_computes_answers(make_problem, tmp_path):
+    generator = _write_executable(tmp_path / 'gen', 'echo "$1"\n')
+    reference = solution.ExecutableSolution(
+        _write_executable(tmp_path / 'ref', 'read n\necho $((n * 2))\n'),
+        tmp_path)
+    prob = make_problem()
+    assert testgen.generate_tests(prob, generator, 'g', 6, jobs=3,
+                                  master_seed=1, reference=reference)
+    contents = _contents(prob)
+    assert len(contents) == 12
+    for i in range(6):
+        assert contents['g{:06d}.ans'.format(i)] == b'%d\n' % (i * 2)
+
+
+def test_failed_generator_leaves_no_partial_case(make_problem, tmp_path):
+    generator = _write_executable(
+        tmp_path / 'gen', 'echo "$1"\n[ "$1" != 3 ]\n')
+    prob = make_problem()
+    assert not testgen.generate_tests(prob, generator, 'g', 6, jobs=2,
+                                      master_seed=1)
+    assert 'g000003' not in prob.get_test_ids()
+    assert not any(path.name.startswith('.')
+                   for path in prob.store.testcases_path.iterdir())
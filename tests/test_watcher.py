@@ -0,0 +1,51 @@
+import os
+import threading
+
+import pytest
+
+from pcu import watcher
+
+
+@pytest.fixture(params=['inotify', 'polling'])
+def make_watcher(request, monkeypatch):
+    if request.param == 'polling':
+        monkeypatch.setattr(watcher.FileWatcher, '_init_inotify',
+                            lambda self: None)
+    return watcher.FileWatcher
+
+
+def test_write_is_seen(make_watcher, tmp_path):
+    source_path = tmp_path / 'prob.py'
+    source_path.write_text('print(1)\n')
+    file_watcher = make_watcher(source_path)
+    assert not file_watcher.wait(0.3)
+    source_path.write_text('print(22)\n')
+    assert file_watcher.wait(5)
+
+
+def test_save_by_rename_is_seen(make_watcher, tmp_path):
+    # As editors that write a new file and rename it over the old one.
+    source_path = tmp_path / 'prob.py'
+    source_path.write_text('print(1)\n')
+    file_watcher = make_watcher(source_path)
+    temp_path = tmp_path / '.prob.py.swp'
+    temp_path.write_text('print(22)\n')
+    os.replace(temp_path, source_path)
+    assert file_watcher.wait(5)
+
+
+def test_other_files_are_ignored(make_watcher, tmp_path):
+    source_path = tmp_path / 'prob.py'
+    source_path.write_text('print(1)\n')
+    file_watcher = make_watcher(source_path)
+    (tmp_path / 'other.py').write_text('print(2)\n')
+    assert not file_watcher.wait(0.5)
+
+
+def test_watch_in_background_sets_event(tmp_path):
+    source_path = tmp_path / 'prob.py'
+    source_path.write_text('print(1)\n')
+    changed = threading.Event()
+    watcher.FileWatcher(source_path).watch_in_background(changed)
+    source_path.write_text('print(22)\n')
+    assert changed.wait(5)